@@ -18,7 +18,7 @@ from flask import Flask, request, jsonify, render_template, send_from_directory
 from flask_cors import CORS
 from flask_sqlalchemy import SQLAlchemy
 from werkzeug.security import generate_password_hash, check_password_hash
-import requests as http_requests
+import http_client
 import jwt
 from yield_prediction import predict_yield as ml_predict_yield
 
@@ -166,7 +166,7 @@ def get_nasa_power_data(state, days=30):
             'format': 'JSON'
         }
         
-        response = http_requests.get(NASA_POWER_BASE_URL, params=params, timeout=15)
+        response = http_client.get('nasa_power', NASA_POWER_BASE_URL, params=params)
         
         if response.status_code == 200:
             raw_data = response.json()
@@ -312,7 +312,7 @@ def get_yield_weather(state):
     city = STATE_CAPITALS.get(state, 'Delhi')
     try:
         url = f"https://api.openweathermap.org/data/2.5/weather?q={city},IN&appid={OPENWEATHER_API_KEY}&units=metric"
-        response = http_requests.get(url, timeout=10)
+        response = http_client.get('openweather', url)
         if response.status_code == 200:
             data = response.json()
             return jsonify({
@@ -418,7 +418,7 @@ def get_recommend_weather(state):
     city = STATE_CAPITALS.get(state, 'Delhi')
     try:
         url = f"https://api.openweathermap.org/data/2.5/weather?q={city},IN&appid={OPENWEATHER_API_KEY}&units=metric"
-        response = http_requests.get(url, timeout=10)
+        response = http_client.get('openweather', url)
         if response.status_code == 200:
             data = response.json()
             return jsonify({
@@ -478,7 +478,7 @@ def get_current_weather():
     city = request.args.get('city', 'Delhi')
     try:
         url = f"https://api.openweathermap.org/data/2.5/weather?q={city},IN&appid={OPENWEATHER_API_KEY}&units=metric"
-        response = http_requests.get(url, timeout=10)
+        response = http_client.get('openweather', url)
         if response.status_code == 200:
             data = response.json()
             return jsonify({
@@ -575,7 +575,7 @@ Focus on farming, crops, weather, and agricultural advice for Indian farmers."""
             'generationConfig': {'temperature': 0.7, 'maxOutputTokens': 500}
         }
         
-        response = http_requests.post(url, json=payload, timeout=30)
+        response = http_client.post('gemini', url, json=payload)
         
         if response.status_code == 200:
             result = response.json()
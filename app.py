@@ -64,6 +64,54 @@ app.register_blueprint(livekit_bp, url_prefix='/api/livekit')
 
 print("✅ All routes registered")
 
+# Per-request upstream time budget (seconds) by endpoint. Every upstream call
+# made while serving the request only uses what is left of it. Clients can ask
+# for a tighter budget with the X-Request-Deadline-Ms header.
+import http_client
+import upstream_metrics
+import time
+
+DEFAULT_REQUEST_DEADLINE = float(os.getenv('REQUEST_DEADLINE', 10))
+ML_TRAIN_DEADLINE = float(os.getenv('ML_TRAIN_DEADLINE', 300))
+ROUTE_DEADLINES = {
+    'yield.predict': float(os.getenv('YIELD_PREDICT_DEADLINE', 8)),
+    'voice_agent.chat': float(os.getenv('VOICE_CHAT_DEADLINE', 20)),
+    'recommendation.train_model_endpoint': ML_TRAIN_DEADLINE,
+    'recommendation.ml_predict_endpoint': ML_TRAIN_DEADLINE,
+    'recommendation.collect_training_data_endpoint': ML_TRAIN_DEADLINE,
+    'recommendation.generate_accuracy_report': ML_TRAIN_DEADLINE,
+}
+
+@app.before_request
+def start_request_deadline():
+    budget = ROUTE_DEADLINES.get(request.endpoint, DEFAULT_REQUEST_DEADLINE)
+    header = request.headers.get('X-Request-Deadline-Ms')
+    if header:
+        try:
+            budget = min(budget, max(0.0, float(header) / 1000))
+        except ValueError:
+            pass
+    request.environ['upstream_deadline_token'] = http_client.set_deadline(budget)
+    request.environ['upstream_metrics_token'] = upstream_metrics.begin_request()
+    request.environ['request_started_at'] = time.time()
+
+@app.after_request
+def record_request_metrics(response):
+    token = request.environ.pop('upstream_metrics_token', None)
+    if token is not None:
+        elapsed = time.time() - request.environ['request_started_at']
+        upstream_metrics.end_request(token, request.endpoint or 'unmatched', response.status_code, elapsed)
+    return response
+
+@app.teardown_request
+def clear_request_deadline(exc):
+    http_client.clear_deadline(request.environ.pop('upstream_deadline_token', None))
+
+# Keep weather and NASA POWER data for every known location warm in memory
+import prefetch
+if prefetch.PREFETCH_ENABLED:
+    prefetch.start()
+
 # Root route - Splash screen
 @app.route('/')
 def index():
@@ -166,6 +214,44 @@ def health():
         ]
     }), 200
 
+# Upstream health (circuit breakers, cache hit/miss and coalescing counters)
+@app.route('/api/health/upstream')
+def upstream_health():
+    import http_client
+    import nasa_archive
+    import upstream_cache
+    breakers = http_client.breaker_stats()
+    degraded = [provider for provider, stats in breakers.items() if stats['state'] != 'closed']
+    return jsonify({
+        'status': 'degraded' if degraded else 'healthy',
+        'degraded_providers': degraded,
+        'breakers': breakers,
+        'latency': http_client.retry_stats(),
+        'caches': upstream_cache.all_stats(),
+        'single_flight': upstream_cache.flight_stats(),
+        'nasa_archive': nasa_archive.nasa_archive.stats()
+    }), 200
+
+# Upstream latency/status/payload metrics per provider and endpoint, and
+# per-route timings split into upstream wait and our own processing time
+@app.route('/api/metrics')
+def metrics():
+    import upstream_cache
+    data = upstream_metrics.snapshot()
+    data['caches'] = upstream_cache.all_stats()
+    data['retries'] = http_client.retry_stats()
+    return jsonify(data), 200
+
+# Prefetch freshness per location
+@app.route('/api/health/prefetch')
+def prefetch_health():
+    import drought_indices
+    import nasa_regional
+    status = prefetch.status()
+    status['nasa_regional'] = nasa_regional.status()
+    status['drought_indices'] = drought_indices.status()
+    return jsonify(status), 200
+
 if __name__ == '__main__':
     host = os.getenv('FLASK_HOST', '0.0.0.0')
     port = int(os.getenv('FLASK_PORT', 5000))
@@ -0,0 +1,330 @@
+"""
+Drought and Anomaly Indices
+A daily batch job computes, for every state and city we serve, standardized
+precipitation indices (SPI-30, SPI-90) and a root-zone soil-moisture anomaly
+from the local NASA archive, comparing the latest window with the same
+calendar window in previous years. Results are written to a small SQLite
+table and served from an in-memory dict, so readers never touch history.
+
+SPI follows McKee et al. (1993): a gamma distribution is fitted to the
+climatology's non-zero window totals (Thom's maximum likelihood estimate),
+mixed with the share of dry windows, and the current total's probability is
+mapped to a standard normal quantile. Unlike ranking against ten years of
+history, the fit lets the index reach the extreme classes.
+"""
+import math
+import os
+import sqlite3
+import threading
+import time
+from collections import namedtuple
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+
+import numpy as np
+
+import nasa_archive
+from nasa_power import recent_window
+
+DROUGHT_DB = os.getenv('DROUGHT_DB', nasa_archive.NASA_ARCHIVE_DB)
+
+# Years of history each window is compared against, and the fewest usable
+# years before an index is reported at all
+DROUGHT_CLIMATOLOGY_YEARS = int(os.getenv('DROUGHT_CLIMATOLOGY_YEARS', 10))
+DROUGHT_MIN_YEARS = int(os.getenv('DROUGHT_MIN_YEARS', 5))
+
+# A window needs this share of valid days to count
+DROUGHT_MIN_COVERAGE = 0.8
+
+# Readers pick up a new batch from SQLite at most this often
+DROUGHT_RELOAD_SECONDS = float(os.getenv('DROUGHT_RELOAD_SECONDS', 600))
+
+SPI_WINDOWS = (30, 90)
+
+# SPI is clipped to +/- this (beyond any class boundary; probabilities this
+# far out of a ten-year fit are not meaningful)
+SPI_LIMIT = 3.09
+SOIL_WINDOW = 30
+
+# McKee et al. (1993) SPI classes, checked in order
+SPI_CATEGORIES = [
+    (-2.0, 'Extremely dry'),
+    (-1.5, 'Severely dry'),
+    (-1.0, 'Moderately dry'),
+    (1.0, 'Near normal'),
+    (1.5, 'Moderately wet'),
+    (2.0, 'Very wet'),
+]
+
+DroughtIndex = namedtuple('DroughtIndex', 'as_of spi_30 spi_90 soil_moisture_anomaly category')
+
+_table = {}
+_loaded_at = 0.0
+_reloading = False
+_lock = threading.Lock()
+
+
+def _norm_ppf(p):
+    """Standard normal quantile (Acklam's rational approximation, |error| < 1.2e-9)"""
+    a = (-3.969683028665376e+01, 2.209460984245205e+02, -2.759285104469687e+02,
+         1.383577518672690e+02, -3.066479806614716e+01, 2.506628277459239e+00)
+    b = (-5.447609879822406e+01, 1.615858368580409e+02, -1.556989798598866e+02,
+         6.680131188771972e+01, -1.328068155288572e+01)
+    c = (-7.784894002430293e-03, -3.223964580411365e-01, -2.400758277161838e+00,
+         -2.549732539343734e+00, 4.374664141464968e+00, 2.938163982698783e+00)
+    d = (7.784695709041462e-03, 3.224671290700398e-01, 2.445134137142996e+00, 3.754408661907416e+00)
+    if p < 0.02425:
+        q = math.sqrt(-2 * math.log(p))
+        return (((((c[0] * q + c[1]) * q + c[2]) * q + c[3]) * q + c[4]) * q + c[5]) / \
+               ((((d[0] * q + d[1]) * q + d[2]) * q + d[3]) * q + 1)
+    if p > 1 - 0.02425:
+        return -_norm_ppf(1 - p)
+    q = p - 0.5
+    r = q * q
+    return (((((a[0] * r + a[1]) * r + a[2]) * r + a[3]) * r + a[4]) * r + a[5]) * q / \
+           (((((b[0] * r + b[1]) * r + b[2]) * r + b[3]) * r + b[4]) * r + 1)
+
+
+def _gamma_p(a, x):
+    """Regularized lower incomplete gamma function P(a, x) (Numerical Recipes gser/gcf)"""
+    if x <= 0:
+        return 0.0
+    log_prefix = -x + a * math.log(x) - math.lgamma(a)
+    if x < a + 1:
+        # Series expansion
+        term = total = 1.0 / a
+        ap = a
+        for _ in range(500):
+            ap += 1
+            term *= x / ap
+            total += term
+            if abs(term) < abs(total) * 1e-12:
+                break
+        return total * math.exp(log_prefix)
+    # Continued fraction for Q(a, x) (modified Lentz)
+    tiny = 1e-300
+    b = x + 1 - a
+    c = 1 / tiny
+    d = 1 / b
+    h = d
+    for i in range(1, 500):
+        an = -i * (i - a)
+        b += 2
+        d = an * d + b
+        d = tiny if abs(d) < tiny else d
+        c = b + an / c
+        c = tiny if abs(c) < tiny else c
+        d = 1 / d
+        delta = d * c
+        h *= delta
+        if abs(delta - 1) < 1e-12:
+            break
+    return 1 - math.exp(log_prefix) * h
+
+
+def _dense_series(raw_data, parameter, start, end):
+    """Daily values on a gap-free calendar axis from start to end (NaN where missing)"""
+    first = np.datetime64(f'{start[:4]}-{start[4:6]}-{start[6:]}')
+    last = np.datetime64(f'{end[:4]}-{end[4:6]}-{end[6:]}')
+    series = np.full(int((last - first).astype(int)) + 1, np.nan)
+    values = raw_data.get(parameter, {})
+    if values:
+        days = np.array([f'{d[:4]}-{d[4:6]}-{d[6:]}' for d in values], dtype='datetime64[D]')
+        data = np.array([np.nan if v is None else v for v in values.values()], dtype=float)
+        series[(days - first).astype(int)] = data
+    series[series == nasa_archive.NASA_FILL_VALUE] = np.nan
+    return series
+
+
+def _window_samples(series, window, how):
+    """This year's trailing window and the same calendar window in earlier years
+
+    Returns (current, climatology) where invalid windows are NaN.
+    """
+    valid = ~np.isnan(series)
+    sums = np.concatenate([[0.0], np.cumsum(np.where(valid, series, 0.0))])
+    counts = np.concatenate([[0], np.cumsum(valid)])
+    ends = len(series) - 365 * np.arange(DROUGHT_CLIMATOLOGY_YEARS + 1)
+    ends = ends[ends - window >= 0]
+    totals = sums[ends] - sums[ends - window]
+    n = counts[ends] - counts[ends - window]
+    with np.errstate(invalid='ignore', divide='ignore'):
+        values = totals / n if how == 'mean' else totals * window / n  # gap-filled sum
+    values = np.where(n >= DROUGHT_MIN_COVERAGE * window, values, np.nan)
+    return values[0], values[1:]
+
+
+def gamma_spi(current, climatology):
+    """McKee SPI of the current total against a gamma fit to its climatology
+
+    Dry windows (zero totals) enter as the mixture weight q:
+    H(x) = q + (1 - q) * G(x).
+    """
+    climatology = climatology[~np.isnan(climatology)]
+    if np.isnan(current) or len(climatology) < DROUGHT_MIN_YEARS:
+        return None
+    positive = climatology[climatology > 0]
+    q = 1 - len(positive) / len(climatology)
+    if len(positive) < 2:
+        return None
+    mean = float(positive.mean())
+    A = math.log(mean) - float(np.log(positive).mean())
+    if A < 1e-3:
+        return None  # (nearly) identical totals every year: no spread to fit
+    alpha = (1 + math.sqrt(1 + 4 * A / 3)) / (4 * A)
+    beta = mean / alpha
+
+    p = q + (1 - q) * _gamma_p(alpha, max(float(current), 0.0) / beta)
+    p = min(max(p, 1e-12), 1 - 1e-12)
+    return round(max(-SPI_LIMIT, min(SPI_LIMIT, _norm_ppf(p))), 2)
+
+
+def standard_anomaly(current, climatology):
+    climatology = climatology[~np.isnan(climatology)]
+    if np.isnan(current) or len(climatology) < DROUGHT_MIN_YEARS:
+        return None
+    std = climatology.std()
+    if std == 0:
+        return 0.0
+    return round(float((current - climatology.mean()) / std), 2)
+
+
+def spi_category(spi):
+    if spi is None:
+        return None
+    for bound, label in SPI_CATEGORIES:
+        if spi <= bound:
+            return label
+    return 'Extremely wet'
+
+
+def compute_location(lat, lon):
+    """Drought indices for one location, syncing the archive's climatology first"""
+    end = recent_window()[1]
+    start = (datetime.strptime(end, '%Y%m%d') -
+             timedelta(days=365 * DROUGHT_CLIMATOLOGY_YEARS + max(SPI_WINDOWS))).strftime('%Y%m%d')
+    nasa_archive.nasa_archive.sync(lat, lon, start, end)
+    raw_data = nasa_archive.nasa_archive.load(lat, lon, start, end, ['PRECTOTCORR', 'GWETROOT'])
+    if not raw_data:
+        return None
+
+    # The newest archived day may lag the requested end
+    as_of = max(raw_data['PRECTOTCORR']) if raw_data['PRECTOTCORR'] else end
+    precip = _dense_series(raw_data, 'PRECTOTCORR', start, as_of)
+    wetness = _dense_series(raw_data, 'GWETROOT', start, as_of)
+
+    spi = {window: gamma_spi(*_window_samples(precip, window, 'sum')) for window in SPI_WINDOWS}
+    soil = standard_anomaly(*_window_samples(wetness, SOIL_WINDOW, 'mean'))
+    return DroughtIndex(as_of, spi[30], spi[90], soil, spi_category(spi[90]))
+
+
+@contextmanager
+def _connect():
+    conn = sqlite3.connect(DROUGHT_DB, timeout=5)
+    try:
+        conn.execute('PRAGMA journal_mode=WAL')
+        with conn:
+            yield conn
+    finally:
+        conn.close()
+
+
+def _init_db():
+    try:
+        with _connect() as conn:
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS drought_index ('
+                'kind TEXT NOT NULL, name TEXT NOT NULL, as_of TEXT, spi_30 REAL, spi_90 REAL, '
+                'soil_moisture_anomaly REAL, category TEXT, computed_at REAL NOT NULL, '
+                'PRIMARY KEY (kind, name))'
+            )
+    except sqlite3.Error as e:
+        print(f"[Drought] Index table unavailable: {e}")
+
+
+def _locations():
+    """(kind, name, lat, lon) for every state capital and every city"""
+    from yield_prediction import STATE_CITIES
+    from weather import INDIAN_CITIES
+    for state, data in STATE_CITIES.items():
+        yield 'state', state, data['lat'], data['lon']
+    for city, data in INDIAN_CITIES.items():
+        yield 'city', city, data['lat'], data['lon']
+
+
+def run_batch():
+    """Recompute every index and publish the new table (used by prefetch)"""
+    started = time.time()
+    by_point = {}
+    rows = []
+    for kind, name, lat, lon in _locations():
+        point = (round(lat, 4), round(lon, 4))
+        if point not in by_point:
+            try:
+                by_point[point] = compute_location(lat, lon)
+            except Exception as e:
+                print(f"[Drought] {kind} {name} failed: {e}")
+                by_point[point] = None
+        index = by_point[point]
+        if index is not None:
+            rows.append((kind, name, *index, started))
+
+    if not rows:
+        return None
+    with _connect() as conn:
+        conn.executemany(
+            'INSERT OR REPLACE INTO drought_index '
+            '(kind, name, as_of, spi_30, spi_90, soil_moisture_anomaly, category, computed_at) '
+            'VALUES (?, ?, ?, ?, ?, ?, ?, ?)', rows
+        )
+    reload()
+    print(f"[Drought] Indices for {len(rows)} locations in {time.time() - started:.1f}s")
+    return len(rows)
+
+
+def reload():
+    """Load the published table into memory"""
+    global _loaded_at, _reloading
+    try:
+        with _connect() as conn:
+            rows = conn.execute(
+                'SELECT kind, name, as_of, spi_30, spi_90, soil_moisture_anomaly, category FROM drought_index'
+            ).fetchall()
+    except sqlite3.Error as e:
+        print(f"[Drought] Could not load indices: {e}")
+        rows = None
+    with _lock:
+        if rows is not None:
+            _table.clear()
+            _table.update({(row[0], row[1]): DroughtIndex(*row[2:]) for row in rows})
+        _loaded_at = time.time()
+        _reloading = False
+
+
+def lookup(kind, name):
+    """Latest DroughtIndex for ('state' | 'city', name), or None
+
+    A stale table is refreshed on a background thread; the caller gets the
+    current entry without waiting on SQLite.
+    """
+    global _reloading
+    if time.time() - _loaded_at > DROUGHT_RELOAD_SECONDS:
+        with _lock:
+            start = not _reloading
+            _reloading = True
+        if start:
+            threading.Thread(target=reload, name='drought-reload', daemon=True).start()
+    return _table.get((kind, name))
+
+
+def status():
+    with _lock:
+        return {
+            'entries': len(_table),
+            'as_of': max((index.as_of for index in _table.values() if index.as_of), default=None),
+            'loaded_seconds_ago': round(time.time() - _loaded_at, 1) if _loaded_at else None,
+        }
+
+
+_init_db()
+reload()
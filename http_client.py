@@ -0,0 +1,576 @@
+"""
+Shared Outbound HTTP Client
+One pooled, keep-alive session per upstream provider (NASA POWER,
+OpenWeatherMap, data.gov.in, OpenRouter) with per-provider timeouts, jittered
+retries, optional request hedging and a circuit breaker that fails fast while a
+provider is degraded. Calls made while a request deadline is set only use the
+time left in that budget.
+"""
+import contextvars
+import os
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+import requests
+from requests.adapters import HTTPAdapter
+
+import upstream_metrics
+import upstream_replay
+
+
+def _env_int(name, default):
+    return int(os.getenv(name, default))
+
+
+def _env_float(name, default):
+    return float(os.getenv(name, default))
+
+
+def _env_bool(name, default):
+    return os.getenv(name, str(default)).lower() == 'true'
+
+
+# Per-provider policy: (connect, read) timeout, retry budget and base backoff,
+# pool sizing, the latency above which a call counts as slow for the circuit
+# breaker, and whether idempotent GETs are hedged.
+# Every value can be overridden with e.g. NASA_POWER_READ_TIMEOUT=45
+PROVIDERS = {
+    'nasa_power': {
+        'connect_timeout': _env_float('NASA_POWER_CONNECT_TIMEOUT', 5),
+        'read_timeout': _env_float('NASA_POWER_READ_TIMEOUT', 30),
+        'retries': _env_int('NASA_POWER_RETRIES', 2),
+        'backoff': _env_float('NASA_POWER_BACKOFF', 0.5),
+        'pool_maxsize': _env_int('NASA_POWER_POOL_SIZE', 10),
+        'slow_call_seconds': _env_float('NASA_POWER_SLOW_CALL_SECONDS', 10),
+        'hedge': _env_bool('NASA_POWER_HEDGE', False),
+    },
+    'openweather': {
+        'connect_timeout': _env_float('OPENWEATHER_CONNECT_TIMEOUT', 2),
+        'read_timeout': _env_float('OPENWEATHER_READ_TIMEOUT', 5),
+        'retries': _env_int('OPENWEATHER_RETRIES', 2),
+        'backoff': _env_float('OPENWEATHER_BACKOFF', 0.2),
+        'pool_maxsize': _env_int('OPENWEATHER_POOL_SIZE', 20),
+        'slow_call_seconds': _env_float('OPENWEATHER_SLOW_CALL_SECONDS', 2),
+        'hedge': _env_bool('OPENWEATHER_HEDGE', True),
+    },
+    'data_gov': {
+        'connect_timeout': _env_float('DATA_GOV_CONNECT_TIMEOUT', 5),
+        'read_timeout': _env_float('DATA_GOV_READ_TIMEOUT', 15),
+        'retries': _env_int('DATA_GOV_RETRIES', 2),
+        'backoff': _env_float('DATA_GOV_BACKOFF', 0.5),
+        'pool_maxsize': _env_int('DATA_GOV_POOL_SIZE', 10),
+        'slow_call_seconds': _env_float('DATA_GOV_SLOW_CALL_SECONDS', 8),
+        'hedge': _env_bool('DATA_GOV_HEDGE', False),
+    },
+    'openrouter': {
+        'connect_timeout': _env_float('OPENROUTER_CONNECT_TIMEOUT', 5),
+        'read_timeout': _env_float('OPENROUTER_READ_TIMEOUT', 20),
+        # Chat completions are POSTs and not idempotent - never retried
+        'retries': _env_int('OPENROUTER_RETRIES', 0),
+        'backoff': _env_float('OPENROUTER_BACKOFF', 0.5),
+        'pool_maxsize': _env_int('OPENROUTER_POOL_SIZE', 10),
+        'slow_call_seconds': _env_float('OPENROUTER_SLOW_CALL_SECONDS', 15),
+        'hedge': _env_bool('OPENROUTER_HEDGE', False),
+    },
+    'gemini': {
+        'connect_timeout': _env_float('GEMINI_CONNECT_TIMEOUT', 5),
+        'read_timeout': _env_float('GEMINI_READ_TIMEOUT', 30),
+        # generateContent is a POST - never retried
+        'retries': _env_int('GEMINI_RETRIES', 0),
+        'backoff': _env_float('GEMINI_BACKOFF', 0.5),
+        'pool_maxsize': _env_int('GEMINI_POOL_SIZE', 10),
+        'slow_call_seconds': _env_float('GEMINI_SLOW_CALL_SECONDS', 20),
+        'hedge': _env_bool('GEMINI_HEDGE', False),
+    },
+}
+
+# Number of distinct hosts each provider pool keeps connections for
+POOL_CONNECTIONS = _env_int('HTTP_POOL_CONNECTIONS', 4)
+
+# Circuit breaker: over the last BREAKER_WINDOW calls (once at least
+# BREAKER_MIN_CALLS were made), trip when the error rate or the slow-call rate
+# reaches its threshold. Stay open BREAKER_OPEN_SECONDS, then let
+# BREAKER_HALF_OPEN_PROBES trial calls through before closing again.
+BREAKER_WINDOW = _env_int('BREAKER_WINDOW', 20)
+BREAKER_MIN_CALLS = _env_int('BREAKER_MIN_CALLS', 5)
+BREAKER_ERROR_RATE = _env_float('BREAKER_ERROR_RATE', 0.5)
+BREAKER_SLOW_RATE = _env_float('BREAKER_SLOW_RATE', 0.5)
+BREAKER_OPEN_SECONDS = _env_float('BREAKER_OPEN_SECONDS', 30)
+BREAKER_HALF_OPEN_PROBES = _env_int('BREAKER_HALF_OPEN_PROBES', 1)
+
+# Retries (idempotent methods only) back off exponentially from the provider's
+# base backoff with full jitter, never sleeping longer than RETRY_BACKOFF_CAP
+IDEMPOTENT_METHODS = frozenset(['GET', 'HEAD'])
+RETRY_STATUSES = frozenset([429, 500, 502, 503, 504])
+RETRY_BACKOFF_CAP = _env_float('RETRY_BACKOFF_CAP', 4)
+
+# Hedging: if a hedged call has not answered after the provider's observed p95
+# latency, a backup request is sent and the first answer wins. Until
+# HEDGE_MIN_SAMPLES latencies are known HEDGE_DEFAULT_DELAY is used instead.
+HEDGE_MIN_SAMPLES = _env_int('HEDGE_MIN_SAMPLES', 20)
+HEDGE_DEFAULT_DELAY = _env_float('HEDGE_DEFAULT_DELAY', 1.0)
+HEDGE_MIN_DELAY = _env_float('HEDGE_MIN_DELAY', 0.05)
+HEDGE_MAX_CONCURRENT = _env_int('HEDGE_MAX_CONCURRENT', 8)
+
+# Below this many seconds of remaining budget an upstream call is not attempted
+MIN_CALL_BUDGET = _env_float('MIN_CALL_BUDGET', 0.05)
+
+# Bounded worker pool shared by every concurrent upstream fan-out
+UPSTREAM_WORKERS = _env_int('UPSTREAM_WORKERS', 16)
+
+_sessions = {}
+_sessions_lock = threading.Lock()
+_executor = ThreadPoolExecutor(max_workers=UPSTREAM_WORKERS, thread_name_prefix='upstream')
+
+# Hedged legs run on their own pool so they never queue behind fan-out work
+_hedge_executor = ThreadPoolExecutor(max_workers=2 * HEDGE_MAX_CONCURRENT + UPSTREAM_WORKERS,
+                                     thread_name_prefix='upstream-hedge')
+_hedge_slots = threading.BoundedSemaphore(HEDGE_MAX_CONCURRENT)
+
+# Absolute time.monotonic() by which the current request must be done, or None
+_deadline = contextvars.ContextVar('upstream_deadline', default=None)
+
+
+class DeadlineExceeded(requests.Timeout):
+    """Raised instead of calling a provider when the request budget is spent"""
+
+
+def set_deadline(seconds):
+    """Give the current request `seconds` of upstream budget; returns a reset token"""
+    return _deadline.set(time.monotonic() + seconds if seconds is not None else None)
+
+
+def clear_deadline(token=None):
+    if token is not None:
+        _deadline.reset(token)
+    else:
+        _deadline.set(None)
+
+
+def remaining_budget():
+    """Seconds left in the current request budget, or None when unbounded"""
+    deadline = _deadline.get()
+    if deadline is None:
+        return None
+    return max(0.0, deadline - time.monotonic())
+
+
+class CircuitOpenError(requests.RequestException):
+    """Raised instead of calling a provider whose circuit breaker is open"""
+
+
+class CircuitBreaker:
+    """Per-provider breaker tracking error and slow-call rates over a sliding window"""
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, provider, slow_call_seconds):
+        self.provider = provider
+        self.slow_call_seconds = slow_call_seconds
+        self.state = self.CLOSED
+        self._outcomes = deque(maxlen=BREAKER_WINDOW)  # (failed, slow) per call
+        self._opened_at = 0.0
+        self._probes = 0
+        self._lock = threading.Lock()
+        self._counters = {'rejected': 0, 'opened': 0, 'unrecorded': 0}
+
+    def before_call(self):
+        """Raise CircuitOpenError if the call must not reach the provider"""
+        with self._lock:
+            if self.state == self.OPEN:
+                if time.time() - self._opened_at < BREAKER_OPEN_SECONDS:
+                    self._counters['rejected'] += 1
+                    raise CircuitOpenError(f"{self.provider} circuit is open - failing fast")
+                self.state = self.HALF_OPEN
+                self._probes = 0
+            if self.state == self.HALF_OPEN:
+                if self._probes >= BREAKER_HALF_OPEN_PROBES:
+                    self._counters['rejected'] += 1
+                    raise CircuitOpenError(f"{self.provider} circuit is half-open - probe in progress")
+                self._probes += 1
+
+    def record(self, failed, elapsed):
+        slow = elapsed >= self.slow_call_seconds
+        with self._lock:
+            if self.state == self.HALF_OPEN:
+                if failed or slow:
+                    self._trip()
+                else:
+                    print(f"[Circuit] {self.provider} recovered - closing")
+                    self.state = self.CLOSED
+                    self._outcomes.clear()
+                return
+
+            self._outcomes.append((failed, slow))
+            calls = len(self._outcomes)
+            if self.state == self.CLOSED and calls >= BREAKER_MIN_CALLS:
+                error_rate = sum(1 for f, _ in self._outcomes if f) / calls
+                slow_rate = sum(1 for _, sl in self._outcomes if sl) / calls
+                if error_rate >= BREAKER_ERROR_RATE or slow_rate >= BREAKER_SLOW_RATE:
+                    self._trip()
+
+    def release(self):
+        """Close a call without an outcome (the caller's budget ended it, not the provider)"""
+        with self._lock:
+            self._counters['unrecorded'] += 1
+            if self.state == self.HALF_OPEN and self._probes > 0:
+                self._probes -= 1
+
+    def _trip(self):
+        print(f"[Circuit] {self.provider} degraded - opening for {BREAKER_OPEN_SECONDS}s")
+        self.state = self.OPEN
+        self._opened_at = time.time()
+        self._outcomes.clear()
+        self._counters['opened'] += 1
+
+    def stats(self):
+        with self._lock:
+            calls = len(self._outcomes)
+            return {
+                'state': self.state,
+                'window_calls': calls,
+                'error_rate': round(sum(1 for f, _ in self._outcomes if f) / calls, 3) if calls else 0.0,
+                'slow_rate': round(sum(1 for _, sl in self._outcomes if sl) / calls, 3) if calls else 0.0,
+                'slow_call_seconds': self.slow_call_seconds,
+                **self._counters
+            }
+
+
+BREAKERS = {
+    provider: CircuitBreaker(provider, policy['slow_call_seconds'])
+    for provider, policy in PROVIDERS.items()
+}
+
+
+def breaker_stats():
+    """Breaker state and counters per provider"""
+    return {provider: breaker.stats() for provider, breaker in BREAKERS.items()}
+
+
+class LatencyTracker:
+    """Recent successful-call latencies for one provider, for hedge delays"""
+
+    def __init__(self, size=200):
+        self._samples = deque(maxlen=size)
+        self._lock = threading.Lock()
+        self.counters = {'retries': 0, 'hedges_sent': 0, 'hedges_won': 0, 'hedges_capped': 0}
+
+    def record(self, seconds):
+        with self._lock:
+            self._samples.append(seconds)
+
+    def count(self, counter):
+        with self._lock:
+            self.counters[counter] += 1
+
+    def percentile(self, q):
+        with self._lock:
+            samples = sorted(self._samples)
+        if not samples:
+            return None
+        return samples[min(len(samples) - 1, int(q * len(samples)))]
+
+    def hedge_delay(self):
+        with self._lock:
+            enough = len(self._samples) >= HEDGE_MIN_SAMPLES
+        if not enough:
+            return HEDGE_DEFAULT_DELAY
+        return max(HEDGE_MIN_DELAY, self.percentile(0.95))
+
+    def stats(self):
+        p50, p95 = self.percentile(0.5), self.percentile(0.95)
+        with self._lock:
+            return {
+                'samples': len(self._samples),
+                'p50_ms': round(p50 * 1000, 1) if p50 is not None else None,
+                'p95_ms': round(p95 * 1000, 1) if p95 is not None else None,
+                **self.counters
+            }
+
+
+LATENCIES = {provider: LatencyTracker() for provider in PROVIDERS}
+
+
+def retry_stats():
+    """Latency percentiles, retry and hedge counters per provider"""
+    return {provider: tracker.stats() for provider, tracker in LATENCIES.items()}
+
+
+def _build_session(provider):
+    """Create a keep-alive session with a bounded connection pool for a provider"""
+    policy = PROVIDERS[provider]
+    pool_kwargs = {
+        'pool_connections': POOL_CONNECTIONS,
+        'pool_maxsize': policy['pool_maxsize'],
+        # Retries happen in request() so they can respect the request budget
+        'max_retries': 0,
+        'pool_block': True,
+    }
+    if upstream_replay.UPSTREAM_MODE in ('record', 'replay'):
+        adapter = upstream_replay.ReplayAdapter(provider, **pool_kwargs)
+    else:
+        adapter = HTTPAdapter(**pool_kwargs)
+    session = requests.Session()
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    return session
+
+
+def get_session(provider):
+    """Return the shared session for a provider, creating it on first use"""
+    if provider not in PROVIDERS:
+        raise ValueError(f"Unknown upstream provider: {provider}")
+    session = _sessions.get(provider)
+    if session is None:
+        with _sessions_lock:
+            session = _sessions.get(provider)
+            if session is None:
+                session = _build_session(provider)
+                _sessions[provider] = session
+    return session
+
+
+def get_timeout(provider):
+    """(connect, read) timeout tuple for a provider, capped by the request budget"""
+    policy = PROVIDERS[provider]
+    connect, read = policy['connect_timeout'], policy['read_timeout']
+    remaining = remaining_budget()
+    if remaining is not None:
+        if remaining < MIN_CALL_BUDGET:
+            raise DeadlineExceeded(f"No request budget left for {provider}")
+        connect, read = min(connect, remaining), min(read, remaining)
+    return (connect, read)
+
+
+def _budgeted_timeout(provider, timeout):
+    """Caller-supplied timeout (if any) capped by the remaining request budget
+
+    Returns (timeout, cut): cut is True when the budget made the timeout
+    shorter than the caller's or the provider's own.
+    """
+    if timeout is None:
+        policy = PROVIDERS[provider]
+        timeout = (policy['connect_timeout'], policy['read_timeout'])
+    elif not isinstance(timeout, tuple):
+        timeout = (timeout, timeout)
+    budget = get_timeout(provider)
+    capped = (min(timeout[0], budget[0]), min(timeout[1], budget[1]))
+    return capped, capped != timeout
+
+
+def _failed(response):
+    return response.status_code >= 500 or response.status_code == 429
+
+
+def _attempt(provider, method, url, kwargs):
+    """One HTTP exchange through the provider's pooled session
+
+    Attempts are metered individually; the circuit breaker sees the logical
+    call made by request() instead.
+    """
+    kwargs = dict(kwargs)
+    started = time.time()
+    try:
+        kwargs['timeout'], cut = _budgeted_timeout(provider, kwargs.get('timeout'))
+    except Exception as e:
+        upstream_metrics.record_call(provider, url, 0.0, error=e)
+        raise
+
+    try:
+        response = get_session(provider).request(method, url, **kwargs)
+    except Exception as e:
+        upstream_metrics.record_call(provider, url, time.time() - started, error=e)
+        if cut and isinstance(e, requests.Timeout):
+            e.cut_by_budget = True
+        raise
+    elapsed = time.time() - started
+    upstream_metrics.record_call(provider, url, elapsed, status=response.status_code,
+                                 payload_bytes=_payload_bytes(response, kwargs.get('stream')))
+    if not _failed(response):
+        LATENCIES[provider].record(elapsed)
+    return response
+
+
+def _payload_bytes(response, stream):
+    """Body size without consuming a streamed body"""
+    if stream:
+        length = response.headers.get('Content-Length')
+        return int(length) if length and length.isdigit() else None
+    return len(response.content)
+
+
+def _discard(future):
+    """Release the connection held by a hedge leg that lost the race"""
+    if not future.cancelled() and future.exception() is None:
+        future.result().close()
+
+
+def _hedged_attempt(provider, method, url, kwargs):
+    """Send the call; if it is slower than the provider's p95, race a backup"""
+    tracker = LATENCIES[provider]
+    primary = _hedge_executor.submit(contextvars.copy_context().run, _attempt, provider, method, url, kwargs)
+    done, _ = wait([primary], timeout=tracker.hedge_delay())
+    if done:
+        return primary.result()
+    if not _hedge_slots.acquire(blocking=False):
+        tracker.count('hedges_capped')
+        return primary.result()
+
+    tracker.count('hedges_sent')
+    backup = _hedge_executor.submit(contextvars.copy_context().run, _attempt, provider, method, url, kwargs)
+    backup.add_done_callback(lambda _: _hedge_slots.release())
+
+    pending = {primary, backup}
+    error = None
+    while pending:
+        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+        for future in done:
+            if future.exception() is None:
+                if future is backup:
+                    tracker.count('hedges_won')
+                for other in pending:
+                    other.add_done_callback(_discard)
+                return future.result()
+            error = future.exception()
+    raise error
+
+
+def request(provider, method, url, **kwargs):
+    """Send a request with the provider's retry and hedging policy
+
+    Idempotent methods are retried on connection errors, timeouts and
+    429/5xx with full-jitter exponential backoff, as long as the request
+    budget allows. Open circuits and spent budgets are never retried.
+    The circuit breaker is consulted once and records one outcome for the
+    whole call, however many attempts or hedge legs it took. Calls ended by
+    the request budget (DeadlineExceeded, or a timeout the budget cut below
+    the provider's own) record no outcome, so a client's tight deadline
+    cannot open the circuit for everyone else.
+    """
+    breaker = BREAKERS[provider]
+    try:
+        # A spent budget fails before taking a half-open probe slot
+        get_timeout(provider)
+        breaker.before_call()
+    except (CircuitOpenError, DeadlineExceeded) as e:
+        upstream_metrics.record_call(provider, url, 0.0, error=e)
+        raise
+
+    started = time.time()
+    failed = None
+    try:
+        response = _send_with_retries(provider, method, url, kwargs)
+        failed = _failed(response)
+        return response
+    except Exception as e:
+        # None: the request budget ended the call, so the provider gets no outcome
+        failed = None if isinstance(e, DeadlineExceeded) or getattr(e, 'cut_by_budget', False) else True
+        raise
+    finally:
+        if failed is None:
+            breaker.release()
+        else:
+            breaker.record(failed, time.time() - started)
+
+
+def _send_with_retries(provider, method, url, kwargs):
+    policy = PROVIDERS[provider]
+    idempotent = method.upper() in IDEMPOTENT_METHODS
+    retries = policy['retries'] if idempotent else 0
+    send = _hedged_attempt if idempotent and policy['hedge'] else _attempt
+
+    for attempt in range(retries + 1):
+        response, error = None, None
+        try:
+            response = send(provider, method, url, kwargs)
+            if response.status_code not in RETRY_STATUSES:
+                return response
+        except DeadlineExceeded:
+            raise
+        except requests.RequestException as e:
+            error = e
+        if attempt == retries:
+            break
+
+        sleep = random.uniform(0, min(RETRY_BACKOFF_CAP, policy['backoff'] * 2 ** attempt))
+        remaining = remaining_budget()
+        if remaining is not None and sleep + MIN_CALL_BUDGET >= remaining:
+            break
+        if response is not None:
+            response.close()
+        LATENCIES[provider].count('retries')
+        time.sleep(sleep)
+
+    if error is not None:
+        raise error
+    return response
+
+
+def get(provider, url, **kwargs):
+    """GET through the provider's pooled session"""
+    return request(provider, 'GET', url, **kwargs)
+
+
+def post(provider, url, **kwargs):
+    """POST through the provider's pooled session"""
+    return request(provider, 'POST', url, **kwargs)
+
+
+def submit(func, *args):
+    """Run func(*args) on the shared upstream pool without waiting for it"""
+    return _executor.submit(func, *args)
+
+
+def fan_out(calls, deadline):
+    """Run named upstream calls concurrently under one overall deadline (seconds)
+
+    calls maps a source name to (func, *args). Returns (results, skipped):
+    results holds the return value of every call that returned data in time,
+    skipped lists the sources that missed the deadline, raised or returned
+    None (the fetchers' way of reporting a failure they logged). Calls that
+    had not started by the deadline are cancelled so they free their pool
+    slot; calls already running finish in the background, unwaited for.
+    The deadline is capped by, and the calls inherit, the request budget.
+    """
+    remaining = remaining_budget()
+    if remaining is not None:
+        deadline = min(deadline, remaining)
+    futures = {
+        name: _executor.submit(contextvars.copy_context().run, call[0], *call[1:])
+        for name, call in calls.items()
+    }
+    _, pending = wait(futures.values(), timeout=deadline)
+    for future in pending:
+        future.cancel()
+
+    results = {}
+    skipped = []
+    for name, future in futures.items():
+        if not future.done():
+            print(f"[Upstream] {name} missed the {deadline:.2f}s deadline - skipping")
+            skipped.append(name)
+            continue
+        try:
+            result = future.result()
+        except Exception as e:
+            print(f"[Upstream] {name} failed: {e}")
+            skipped.append(name)
+            continue
+        if result is None:
+            skipped.append(name)
+            continue
+        results[name] = result
+    return results, skipped
+
+
+def close_all():
+    """Close every pooled session (used on worker shutdown and in tests)"""
+    with _sessions_lock:
+        for session in _sessions.values():
+            session.close()
+        _sessions.clear()
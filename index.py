@@ -93,7 +93,7 @@ def voice_agent_page():
 
 
 # ============= YIELD PREDICTION API =============
-import requests as http_requests
+import http_client
 
 CROP_DATA = {
     'rice': {'base_yield': 4500, 'water_need': 'high', 'season': ['Kharif']},
@@ -233,7 +233,7 @@ def get_current_weather():
     city = request.args.get('city', 'Delhi')
     try:
         url = f"https://api.openweathermap.org/data/2.5/weather?q={city},IN&appid={OPENWEATHER_API_KEY}&units=metric"
-        response = http_requests.get(url, timeout=10)
+        response = http_client.get('openweather', url)
         if response.status_code == 200:
             data = response.json()
             return jsonify({
@@ -325,7 +325,7 @@ Focus on farming, crops, weather, and agricultural advice for Indian farmers."""
             'generationConfig': {'temperature': 0.7, 'maxOutputTokens': 500}
         }
         
-        response = http_requests.post(url, json=payload, timeout=30)
+        response = http_client.post('gemini', url, json=payload)
         
         if response.status_code == 200:
             result = response.json()
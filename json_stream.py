@@ -0,0 +1,67 @@
+"""
+Incremental JSON Array Reader
+Yields the items of one top-level array (e.g. data.gov.in "records") from a
+streamed HTTP response without holding the whole body in memory
+"""
+import codecs
+import json
+import re
+
+STREAM_CHUNK_BYTES = 64 * 1024
+
+_decoder = json.JSONDecoder()
+_SEPARATOR = re.compile(r'[\s,]*')
+
+
+def _array_start(key):
+    return re.compile(r'(?<!\\)"' + re.escape(key) + r'"\s*:\s*\[')
+
+
+def iter_array_items(chunks, key):
+    """Yield each item of the array stored under `key` from text chunks
+
+    Only the current partial item is buffered. Items must be JSON objects or
+    arrays (a number split across chunks would be read early). Anything after
+    the closing bracket is ignored.
+    """
+    start = _array_start(key)
+    buf = ''
+    in_array = False
+
+    for chunk in chunks:
+        buf += chunk
+        if not in_array:
+            match = start.search(buf)
+            if not match:
+                # Keep enough tail to match a key split across chunks
+                buf = buf[-(len(key) + 64):]
+                continue
+            buf = buf[match.end():]
+            in_array = True
+
+        pos = 0
+        while True:
+            pos = _SEPARATOR.match(buf, pos).end()
+            if pos >= len(buf):
+                break
+            if buf[pos] == ']':
+                return
+            try:
+                item, pos = _decoder.raw_decode(buf, pos)
+            except ValueError:
+                break  # item continues in the next chunk
+            yield item
+        buf = buf[pos:]
+
+    if in_array and buf.strip():
+        raise ValueError(f"Truncated JSON array '{key}'")
+
+
+def iter_response_items(response, key, chunk_size=STREAM_CHUNK_BYTES):
+    """Yield items of `key` from a requests response opened with stream=True"""
+    decoder = codecs.getincrementaldecoder(response.encoding or 'utf-8')(errors='replace')
+    chunks = (decoder.decode(chunk) for chunk in response.iter_content(chunk_size))
+    try:
+        yield from iter_array_items(chunks, key)
+    finally:
+        response.close()
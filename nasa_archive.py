@@ -0,0 +1,308 @@
+"""
+NASA POWER Daily Archive
+Local store of daily agro-climate values per location. A refresh only
+downloads the days the archive does not have yet (plus a short trailing
+window NASA may still revise); every window summary is then read from
+SQLite, so long histories cost nothing per request
+"""
+import os
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+
+import http_client
+from nasa_power import NASA_AGRO_PARAMETERS, fetch_daily_parameters, nasa_flight, recent_window
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+NASA_ARCHIVE_DB = os.getenv('NASA_ARCHIVE_DB', os.path.join(BASE_DIR, 'database', 'nasa_archive.db'))
+
+# How much history the background sync keeps per location
+NASA_ARCHIVE_HISTORY_DAYS = int(os.getenv('NASA_ARCHIVE_HISTORY_DAYS', 365))
+
+# Days NASA has not published yet come back as -999; don't ask again for
+# the same missing span more often than this
+NASA_ARCHIVE_RECHECK_SECONDS = float(os.getenv('NASA_ARCHIVE_RECHECK_SECONDS', 6 * 3600))
+
+# NASA POWER revises its most recent near-real-time days; the latest this
+# many published days are downloaded again at most once per refresh interval
+NASA_ARCHIVE_REFRESH_DAYS = int(os.getenv('NASA_ARCHIVE_REFRESH_DAYS', 14))
+NASA_ARCHIVE_REFRESH_SECONDS = float(os.getenv('NASA_ARCHIVE_REFRESH_SECONDS', 86400))
+
+# Long windows requests need (climatology, GDD history) are synced on their
+# own pool, outside the request budget; at most this many at once
+NASA_ARCHIVE_SYNC_CONCURRENCY = int(os.getenv('NASA_ARCHIVE_SYNC_CONCURRENCY', 2))
+
+# NASA POWER's fill value for missing data
+NASA_FILL_VALUE = -999
+
+
+def _days(start, end):
+    """Every YYYYMMDD day from start to end inclusive, as ints"""
+    day = datetime.strptime(str(start), '%Y%m%d')
+    last = datetime.strptime(str(end), '%Y%m%d')
+    days = []
+    while day <= last:
+        days.append(int(day.strftime('%Y%m%d')))
+        day += timedelta(days=1)
+    return days
+
+
+class DailyArchive:
+    """One row per (location, day) with one REAL column per NASA parameter
+
+    A day is stored only once every parameter has a value. Recent days can
+    still be revised by NASA (near-real-time values are replaced by the
+    reanalysis later), so the trailing NASA_ARCHIVE_REFRESH_DAYS are
+    downloaded again and overwritten once per NASA_ARCHIVE_REFRESH_SECONDS.
+    If the database cannot be created (read-only filesystem) the archive is
+    bypassed and windows are fetched straight from NASA POWER.
+    """
+
+    def __init__(self, db_path=NASA_ARCHIVE_DB, parameters=NASA_AGRO_PARAMETERS):
+        self.db_path = db_path
+        self.parameters = list(parameters)
+        self._checked = {}
+        self._refreshed = {}
+        self._lock = threading.Lock()
+        self._counters = {'syncs': 0, 'days_fetched': 0, 'days_written': 0, 'fetch_errors': 0, 'reads': 0}
+        self.available = self._init_db()
+
+    @contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self.db_path, timeout=5)
+        try:
+            conn.execute('PRAGMA journal_mode=WAL')
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def _init_db(self):
+        columns = ', '.join(f'{param} REAL' for param in self.parameters)
+        try:
+            db_dir = os.path.dirname(self.db_path)
+            if db_dir and not os.path.exists(db_dir):
+                os.makedirs(db_dir, exist_ok=True)
+            with self._connect() as conn:
+                conn.execute(
+                    'CREATE TABLE IF NOT EXISTS nasa_daily ('
+                    'lat REAL NOT NULL, lon REAL NOT NULL, day INTEGER NOT NULL, '
+                    f'{columns}, PRIMARY KEY (lat, lon, day))'
+                )
+                # Parameters added to NASA_AGRO_PARAMETERS later get a new column
+                existing = {row[1] for row in conn.execute('PRAGMA table_info(nasa_daily)')}
+                for param in self.parameters:
+                    if param not in existing:
+                        conn.execute(f'ALTER TABLE nasa_daily ADD COLUMN {param} REAL')
+        except (sqlite3.Error, OSError) as e:
+            print(f"[NASA Archive] Archive unavailable, fetching windows directly: {e}")
+            return False
+        return True
+
+    def _count(self, counter, n=1):
+        with self._lock:
+            self._counters[counter] += n
+
+    @staticmethod
+    def _key(lat, lon):
+        return round(lat, 4), round(lon, 4)
+
+    def stored_days(self, lat, lon, start, end):
+        lat, lon = self._key(lat, lon)
+        with self._connect() as conn:
+            rows = conn.execute(
+                'SELECT day FROM nasa_daily WHERE lat = ? AND lon = ? AND day BETWEEN ? AND ?',
+                (lat, lon, int(start), int(end))
+            ).fetchall()
+        return {row[0] for row in rows}
+
+    def missing_span(self, lat, lon, start, end):
+        """(first, last) YYYYMMDD of the days not archived yet, or None"""
+        stored = self.stored_days(lat, lon, start, end)
+        missing = [day for day in _days(start, end) if day not in stored]
+        if not missing:
+            return None
+        return str(missing[0]), str(missing[-1])
+
+    def _refresh_span(self, key, start, end):
+        """Trailing revision window within [start, end] if it is due, else None"""
+        with self._lock:
+            refreshed_at = self._refreshed.get(key)
+        if refreshed_at and time.time() - refreshed_at < NASA_ARCHIVE_REFRESH_SECONDS:
+            return None
+        first, last = recent_window(NASA_ARCHIVE_REFRESH_DAYS - 1)
+        first, last = max(first, str(start)), min(last, str(end))
+        return (first, last) if first <= last else None
+
+    def sync(self, lat, lon, start, end):
+        """Download whatever part of [start, end] is not archived yet, plus the
+        trailing revision window when it is due
+
+        Returns the number of days written. Spans that were just asked for
+        and came back unpublished are not requested again until the recheck
+        interval has passed.
+        """
+        if not self.available:
+            return 0
+        key = self._key(lat, lon)
+        span = self.missing_span(lat, lon, start, end)
+        if span is not None:
+            # Keyed by the last missing day so a span that shrank after a fetch
+            # (only the unpublished tail left) is not requested again right away
+            with self._lock:
+                checked_at = self._checked.get(key + (span[1],))
+            if checked_at and time.time() - checked_at < NASA_ARCHIVE_RECHECK_SECONDS:
+                span = None
+        refresh = self._refresh_span(key, start, end)
+        if refresh is not None:
+            span = (min(span[0], refresh[0]), max(span[1], refresh[1])) if span else refresh
+        if span is None:
+            return 0
+
+        self._count('syncs')
+        flight_key = ('archive',) + key + span
+        try:
+            raw = nasa_flight.do(flight_key, lambda: fetch_daily_parameters(lat, lon, *span, self.parameters))
+        except Exception:
+            self._count('fetch_errors')
+            raise
+        now = time.time()
+        with self._lock:
+            self._checked[key + (span[1],)] = now
+            if refresh is not None:
+                self._refreshed[key] = now
+        if not raw:
+            self._count('fetch_errors')
+            return 0
+
+        written = self.append(lat, lon, raw)
+        self._count('days_fetched', len(_days(*span)))
+        print(f"[NASA Archive] ({key[0]}, {key[1]}) {span[0]}-{span[1]}: {written} days written")
+        return written
+
+    def append(self, lat, lon, raw):
+        """Write days from a raw {param: {YYYYMMDD: value}} payload; returns days written
+
+        Days where any parameter is missing or still the fill value are
+        skipped so they are fetched again once NASA publishes them. Stored
+        days are overwritten, which is how revised values land.
+        """
+        lat, lon = self._key(lat, lon)
+        days = sorted({day for values in raw.values() if isinstance(values, dict) for day in values})
+        rows = []
+        for day in days:
+            values = [raw.get(param, {}).get(day) for param in self.parameters]
+            if all(v is not None and v != NASA_FILL_VALUE for v in values):
+                rows.append((lat, lon, int(day), *values))
+        if not rows:
+            return 0
+
+        placeholders = ', '.join('?' * (3 + len(self.parameters)))
+        columns = ', '.join(self.parameters)
+        with self._connect() as conn:
+            before = conn.total_changes
+            conn.executemany(
+                f'INSERT OR REPLACE INTO nasa_daily (lat, lon, day, {columns}) VALUES ({placeholders})',
+                rows
+            )
+            written = conn.total_changes - before
+        self._count('days_written', written)
+        return written
+
+    def load(self, lat, lon, start, end, parameters=None):
+        """Archived days in [start, end] as a NASA-style {param: {YYYYMMDD: value}} dict"""
+        if not self.available:
+            return None
+        parameters = list(parameters or self.parameters)
+        lat, lon = self._key(lat, lon)
+        with self._connect() as conn:
+            rows = conn.execute(
+                f"SELECT day, {', '.join(parameters)} FROM nasa_daily "
+                'WHERE lat = ? AND lon = ? AND day BETWEEN ? AND ? ORDER BY day',
+                (lat, lon, int(start), int(end))
+            ).fetchall()
+        self._count('reads')
+
+        data = {param: {} for param in parameters}
+        for row in rows:
+            day = str(row[0])
+            for param, value in zip(parameters, row[1:]):
+                data[param][day] = NASA_FILL_VALUE if value is None else value
+        return data if rows else None
+
+    def get_window(self, lat, lon, start, end, parameters=None):
+        """Sync the missing days of the window, then read it from the archive"""
+        if not self.available:
+            key = ('direct',) + self._key(lat, lon) + (str(start), str(end))
+            try:
+                raw = nasa_flight.do(key, lambda: fetch_daily_parameters(
+                    lat, lon, start, end, list(parameters or self.parameters)))
+            except Exception as e:
+                print(f"[NASA Archive] Fetch failed for ({lat}, {lon}): {e}")
+                return None
+            return raw or None
+        try:
+            self.sync(lat, lon, start, end)
+        except Exception as e:
+            # Serve whatever is archived; the next sync fills the gap
+            print(f"[NASA Archive] Sync failed for ({lat}, {lon}): {e}")
+        return self.load(lat, lon, start, end, parameters)
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._counters)
+        if not self.available:
+            stats['error'] = 'archive unavailable'
+            return stats
+        try:
+            with self._connect() as conn:
+                row = conn.execute(
+                    'SELECT COUNT(*), COUNT(DISTINCT lat || \',\' || lon), MIN(day), MAX(day) FROM nasa_daily'
+                ).fetchone()
+            stats.update({'rows': row[0], 'locations': row[1], 'first_day': row[2], 'last_day': row[3]})
+        except sqlite3.Error as e:
+            stats['error'] = str(e)
+        return stats
+
+
+nasa_archive = DailyArchive()
+
+
+_sync_executor = ThreadPoolExecutor(max_workers=NASA_ARCHIVE_SYNC_CONCURRENCY, thread_name_prefix='nasa-archive-sync')
+_syncs = {}
+_syncs_lock = threading.Lock()
+
+
+def sync_within_budget(lat, lon, start, end):
+    """Sync [start, end] for a location in the background, waiting only while the request budget lasts
+
+    One sync per location runs at a time. A sync that outlives the budget
+    keeps filling the archive for later requests; callers read whatever is
+    archived once this returns.
+    """
+    key = nasa_archive._key(lat, lon)
+    with _syncs_lock:
+        future = _syncs.get(key)
+        if future is None or future.done():
+            future = _sync_executor.submit(nasa_archive.sync, lat, lon, start, end)
+            _syncs[key] = future
+    try:
+        future.result(timeout=http_client.remaining_budget())
+    except FutureTimeout:
+        print(f"[NASA Archive] ({lat}, {lon}) {start}-{end} still syncing - serving what is archived")
+    except Exception as e:
+        print(f"[NASA Archive] Sync failed for ({lat}, {lon}): {e}")
+
+
+def sync_history(lat, lon, days=NASA_ARCHIVE_HISTORY_DAYS):
+    """Bring a location's archive up to date for the last `days` published days (used by prefetch)"""
+    return nasa_archive.sync(lat, lon, *recent_window(days))
+
+
+def get_window(lat, lon, days=14, parameters=None):
+    """Daily values for the latest `days` published days, served from the archive"""
+    return nasa_archive.get_window(lat, lon, *recent_window(days), parameters)
@@ -0,0 +1,60 @@
+"""
+NASA POWER Client
+Daily agro-climate point data (FREE - No API key needed). Windows are kept
+in the local daily archive (nasa_archive); concurrent identical fetches are
+coalesced into one request
+"""
+import os
+from datetime import datetime, timedelta
+
+import http_client
+from upstream_cache import SingleFlight
+
+# NASA POWER API Base URL (FREE - No API key needed!)
+NASA_POWER_BASE_URL = os.getenv('NASA_POWER_BASE_URL', "https://power.larc.nasa.gov/api/temporal/daily/point")
+
+# NASA POWER Parameters for Agriculture
+NASA_AGRO_PARAMETERS = [
+    'T2M',              # Temperature at 2 meters (°C)
+    'T2M_MAX',          # Maximum Temperature (°C)
+    'T2M_MIN',          # Minimum Temperature (°C)
+    'RH2M',             # Relative Humidity (%)
+    'PRECTOTCORR',      # Precipitation (mm/day)
+    'ALLSKY_SFC_SW_DWN', # Solar Radiation (MJ/m²/day)
+    'GWETROOT',         # Root Zone Soil Wetness (0-1)
+    'GWETPROF',         # Profile Soil Wetness (0-1)
+    'EVPTRNS',          # Evapotranspiration (mm/day)
+    'WS2M',             # Wind Speed (m/s)
+]
+
+nasa_flight = SingleFlight('nasa_power')
+
+# NASA POWER daily values lag real time by several days
+NASA_DATA_LAG_DAYS = 7
+
+
+def recent_window(days=14):
+    """(start, end) YYYYMMDD strings for the latest `days` days NASA has published"""
+    end_date = (datetime.now() - timedelta(days=NASA_DATA_LAG_DAYS)).strftime('%Y%m%d')
+    start_date = (datetime.now() - timedelta(days=days + NASA_DATA_LAG_DAYS)).strftime('%Y%m%d')
+    return start_date, end_date
+
+
+def fetch_daily_parameters(lat, lon, start, end, parameters=None):
+    """Fetch raw daily values {param: {YYYYMMDD: value}} from NASA POWER (uncached)"""
+    params = {
+        'parameters': ','.join(parameters or NASA_AGRO_PARAMETERS),
+        'community': 'AG',
+        'longitude': lon,
+        'latitude': lat,
+        'start': start,
+        'end': end,
+        'format': 'JSON'
+    }
+    response = http_client.get('nasa_power', NASA_POWER_BASE_URL, params=params)
+    if response.status_code == 200:
+        data = response.json()
+        return data.get('properties', {}).get('parameter', {})
+    print(f"[NASA POWER] HTTP {response.status_code} for ({lat}, {lon}) {start}-{end}")
+    return None
+
@@ -0,0 +1,180 @@
+"""
+Regional NASA POWER Summaries
+Instead of letting one capital city stand for a whole state, a grid of points
+inside each state's bounding box (keeping the points that fall in the state
+itself) is sampled from the daily archive, and the points are combined with
+cos(latitude) area weights. Summaries are computed in the background (see
+prefetch) so the predict path only reads memory.
+"""
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+
+import numpy as np
+
+import nasa_archive
+import nasa_stats
+from nasa_power import NASA_AGRO_PARAMETERS
+
+# Grid points per side (N x N points per state)
+REGIONAL_GRID_SIZE = int(os.getenv('NASA_REGIONAL_GRID_SIZE', 3))
+
+# Window summarised, in days (matches get_nasa_power_data's default)
+REGIONAL_WINDOW_DAYS = int(os.getenv('NASA_REGIONAL_WINDOW_DAYS', 14))
+
+# Upper bound on one state's parallel grid fetch
+REGIONAL_FETCH_DEADLINE = float(os.getenv('NASA_REGIONAL_FETCH_DEADLINE', 120))
+
+# Grid points fetched at once; a pool of its own so background grid syncs
+# never occupy the upstream pool request handlers fan out on
+REGIONAL_CONCURRENCY = int(os.getenv('NASA_REGIONAL_CONCURRENCY', 3))
+
+# A state summary needs at least this share of its grid points to be published
+REGIONAL_MIN_COVERAGE = float(os.getenv('NASA_REGIONAL_MIN_COVERAGE', 0.5))
+
+# Approximate bounding boxes (lat_min, lat_max, lon_min, lon_max) per state
+STATE_BOUNDS = {
+    'Punjab': (29.5, 32.5, 73.9, 76.9),
+    'Haryana': (27.6, 30.9, 74.4, 77.6),
+    'Uttar Pradesh': (23.9, 30.4, 77.1, 84.6),
+    'West Bengal': (21.5, 27.2, 85.8, 89.9),
+    'Andhra Pradesh': (12.6, 19.9, 76.8, 84.8),
+    'Tamil Nadu': (8.1, 13.6, 76.2, 80.3),
+    'Karnataka': (11.6, 18.5, 74.1, 78.6),
+    'Maharashtra': (15.6, 22.0, 72.6, 80.9),
+    'Madhya Pradesh': (21.1, 26.9, 74.0, 82.8),
+    'Gujarat': (20.1, 24.7, 68.2, 74.5),
+    'Rajasthan': (23.0, 30.2, 69.5, 78.3),
+    'Bihar': (24.3, 27.5, 83.3, 88.3),
+    'Odisha': (17.8, 22.6, 81.4, 87.5),
+    'Assam': (24.1, 28.0, 89.7, 96.1),
+    'Jharkhand': (21.9, 25.3, 83.3, 87.9),
+    'Chhattisgarh': (17.8, 24.1, 80.2, 84.4),
+    'Kerala': (8.2, 12.8, 74.9, 77.4),
+    'Telangana': (15.8, 19.9, 77.2, 81.3),
+}
+
+_summaries = {}
+_lock = threading.Lock()
+_executor = ThreadPoolExecutor(max_workers=REGIONAL_CONCURRENCY, thread_name_prefix='nasa-regional')
+
+
+def grid_points(state, size=REGIONAL_GRID_SIZE):
+    """Cell-centre (lat, lon) points of a size x size grid over the state's bounds"""
+    lat_min, lat_max, lon_min, lon_max = STATE_BOUNDS[state]
+    lat_step = (lat_max - lat_min) / size
+    lon_step = (lon_max - lon_min) / size
+    lats = lat_min + lat_step * (np.arange(size) + 0.5)
+    lons = lon_min + lon_step * (np.arange(size) + 0.5)
+    lat_grid, lon_grid = np.meshgrid(lats, lons, indexing='ij')
+    return [(round(float(lat), 4), round(float(lon), 4)) for lat, lon in zip(lat_grid.ravel(), lon_grid.ravel())]
+
+
+def state_grid_points(state, size=REGIONAL_GRID_SIZE):
+    """grid_points that lie in the state itself rather than a neighbour sharing its box"""
+    import spatial_index
+    return [point for point in grid_points(state, size) if spatial_index.state_for(*point) == state]
+
+
+def fetch_grid(points, days):
+    """Archive window per point, fetched on the regional pool; points that fail
+    or miss REGIONAL_FETCH_DEADLINE are left out"""
+    futures = {_executor.submit(nasa_archive.get_window, lat, lon, days): (lat, lon) for lat, lon in points}
+    done, pending = wait(futures, timeout=REGIONAL_FETCH_DEADLINE)
+    for future in pending:
+        future.cancel()
+    results = {}
+    for future in done:
+        try:
+            raw_data = future.result()
+        except Exception as e:
+            print(f"[NASA Regional] {futures[future]} failed: {e}")
+            continue
+        if raw_data:
+            results[futures[future]] = raw_data
+    return results
+
+
+def area_weights(points):
+    """Relative area of equal-degree grid cells: proportional to cos(latitude)"""
+    lats = np.radians([lat for lat, _ in points])
+    weights = np.cos(lats)
+    return weights / weights.sum()
+
+
+def weighted_daily(cube, weights):
+    """Area-weighted mean over points (axis 0) per day and parameter, skipping missing points"""
+    valid = ~np.isnan(cube)
+    w = weights[:, None, None] * valid
+    total = w.sum(axis=0)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return np.where(total > 0, np.nansum(cube * weights[:, None, None], axis=0) / total, np.nan)
+
+
+def compute_summary(state, days=REGIONAL_WINDOW_DAYS, parameters=NASA_AGRO_PARAMETERS):
+    """Fetch the state's grid from the archive in parallel and aggregate it"""
+    points = state_grid_points(state)
+    results = fetch_grid(points, days)
+
+    sampled = [(point, results[point]) for point in points if point in results]
+    if len(sampled) < REGIONAL_MIN_COVERAGE * len(points):
+        print(f"[NASA Regional] {state}: only {len(sampled)}/{len(points)} grid points available")
+        return None
+
+    sampled_points = [point for point, _ in sampled]
+    weights = area_weights(sampled_points)
+    day_keys, cube = nasa_stats.to_cube([raw for _, raw in sampled], parameters)
+    daily = weighted_daily(cube, weights)
+
+    summary = nasa_stats.summarize_matrix(daily, list(parameters))
+
+    # Spread of soil wetness across the grid (per-point window means)
+    spread = {}
+    point_means = nasa_stats.aggregate(cube, percentiles=None, rolling_window=None)['average']
+    for param in ('GWETROOT', 'GWETPROF'):
+        if param in parameters:
+            column = point_means[:, parameters.index(param)]
+            if not np.all(np.isnan(column)):
+                spread[param] = {'min': round(float(np.nanmin(column)), 3),
+                                 'max': round(float(np.nanmax(column)), 3)}
+
+    return {
+        'state': state,
+        'parameters': summary,
+        'spread': spread,
+        'points': [{'lat': lat, 'lon': lon, 'weight': round(float(w), 4)}
+                   for (lat, lon), w in zip(sampled_points, weights)],
+        'points_sampled': len(sampled_points),
+        'points_total': len(points),
+        'window': [day_keys[0], day_keys[-1]] if day_keys else None,
+        'computed_at': time.time(),
+    }
+
+
+def refresh_summary(state):
+    """Recompute and publish a state's regional summary (used by prefetch)"""
+    summary = compute_summary(state)
+    if summary is not None:
+        with _lock:
+            _summaries[state] = summary
+    return summary
+
+
+def get_summary(state):
+    """The latest precomputed regional summary for a state, or None"""
+    with _lock:
+        return _summaries.get(state)
+
+
+def status():
+    with _lock:
+        return {
+            state: {
+                'points_sampled': summary['points_sampled'],
+                'points_total': summary['points_total'],
+                'window': summary['window'],
+                'age_seconds': round(time.time() - summary['computed_at'], 1),
+            }
+            for state, summary in _summaries.items()
+        }
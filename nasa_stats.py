@@ -0,0 +1,115 @@
+"""
+NASA POWER Aggregation
+Decodes daily {param: {YYYYMMDD: value}} payloads into a days x parameters
+float matrix with the -999 fill values masked as NaN, and computes every
+summary statistic for all parameters in one vectorized pass. Functions work
+on the last two axes, so a stack of points (points x days x params) is
+summarised in the same call.
+"""
+import warnings
+
+import numpy as np
+
+# NASA POWER's fill value for missing data
+NASA_FILL_VALUE = -999
+
+DEFAULT_PERCENTILES = (10, 50, 90)
+
+
+def to_matrix(raw_data, parameters=None):
+    """(days, parameters, matrix) from a raw payload; missing values are NaN"""
+    if parameters is None:
+        parameters = [param for param, values in raw_data.items() if isinstance(values, dict)]
+    days = sorted({day for param in parameters for day in raw_data.get(param, {})})
+    day_index = {day: i for i, day in enumerate(days)}
+
+    matrix = np.full((len(days), len(parameters)), np.nan)
+    for j, param in enumerate(parameters):
+        values = raw_data.get(param, {})
+        if values:
+            rows = np.fromiter((day_index[day] for day in values), dtype=np.intp, count=len(values))
+            matrix[rows, j] = np.fromiter(
+                (np.nan if v is None else v for v in values.values()), dtype=float, count=len(values)
+            )
+    matrix[matrix == NASA_FILL_VALUE] = np.nan
+    return days, list(parameters), matrix
+
+
+def to_cube(raw_payloads, parameters):
+    """Stack several payloads into (points, days, parameters) on a shared day axis"""
+    days = sorted({day for raw in raw_payloads for param in parameters for day in raw.get(param, {})})
+    cube = np.full((len(raw_payloads), len(days), len(parameters)), np.nan)
+    for i, raw in enumerate(raw_payloads):
+        point_days, _, matrix = to_matrix(raw, parameters)
+        if point_days:
+            cube[i, np.searchsorted(days, point_days)] = matrix
+    return days, cube
+
+
+def rolling_mean(matrix, window):
+    """Trailing `window`-day mean along the day axis, ignoring missing days
+
+    Rows before a full window has accumulated are NaN, as are windows with
+    no valid values.
+    """
+    valid = ~np.isnan(matrix)
+    pad = [(0, 0)] * matrix.ndim
+    pad[-2] = (1, 0)
+    sums = np.pad(np.cumsum(np.where(valid, matrix, 0.0), axis=-2), pad)
+    counts = np.pad(np.cumsum(valid, axis=-2), pad)
+
+    window_sums = sums[..., window:, :] - sums[..., :-window, :]
+    window_counts = counts[..., window:, :] - counts[..., :-window, :]
+    with np.errstate(invalid='ignore', divide='ignore'):
+        means = np.where(window_counts > 0, window_sums / window_counts, np.nan)
+
+    head = np.full(matrix.shape[:-2] + (min(window - 1, matrix.shape[-2]),) + matrix.shape[-1:], np.nan)
+    return np.concatenate([head, means], axis=-2)
+
+
+def aggregate(matrix, percentiles=DEFAULT_PERCENTILES, rolling_window=7):
+    """Per-parameter statistics over the day axis as arrays (NaN where no data)"""
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore', RuntimeWarning)  # all-missing parameters
+        stats = {
+            'days': np.sum(~np.isnan(matrix), axis=-2),
+            'average': np.nanmean(matrix, axis=-2),
+            'min': np.nanmin(matrix, axis=-2),
+            'max': np.nanmax(matrix, axis=-2),
+            'std': np.nanstd(matrix, axis=-2),
+        }
+        if percentiles:
+            values = np.nanpercentile(matrix, percentiles, axis=-2)
+            for q, value in zip(percentiles, values):
+                stats[f'p{q}'] = value
+        if rolling_window and matrix.shape[-2] >= rolling_window:
+            rolling = rolling_mean(matrix, rolling_window)
+            stats[f'rolling_{rolling_window}d_min'] = np.nanmin(rolling, axis=-2)
+            stats[f'rolling_{rolling_window}d_max'] = np.nanmax(rolling, axis=-2)
+            stats[f'rolling_{rolling_window}d_last'] = rolling[..., -1, :]
+    return stats
+
+
+def summarize(raw_data, parameters=None, percentiles=DEFAULT_PERCENTILES, rolling_window=7, decimals=2):
+    """{param: {'average', 'min', 'max', ...}} for every parameter with data"""
+    _, parameters, matrix = to_matrix(raw_data, parameters)
+    return summarize_matrix(matrix, parameters, percentiles, rolling_window, decimals)
+
+
+def summarize_matrix(matrix, parameters, percentiles=DEFAULT_PERCENTILES, rolling_window=7, decimals=2):
+    """summarize() for an already decoded days x parameters matrix"""
+    if not parameters:
+        return {}
+    stats = aggregate(matrix, percentiles, rolling_window)
+    rounded = {name: np.round(values, decimals) for name, values in stats.items()}
+
+    summary = {}
+    for j, param in enumerate(parameters):
+        if stats['days'][j] == 0:
+            continue
+        summary[param] = {
+            name: (int(values[j]) if name == 'days' else
+                   None if np.isnan(values[j]) else float(values[j]))
+            for name, values in rounded.items()
+        }
+    return summary
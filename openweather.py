@@ -0,0 +1,69 @@
+"""
+OpenWeatherMap Client
+Shared current-weather lookup for every blueprint, cached by coordinates
+"""
+import os
+
+import http_client
+from upstream_cache import TTLCache, SingleFlight
+
+# OpenWeatherMap API key
+OPENWEATHER_API_KEY = os.getenv('OPENWEATHER_API_KEY', 'b576d8a952bf4c45c7ef5bddb148e76b')
+
+OPENWEATHER_URL = os.getenv('OPENWEATHER_URL', "https://api.openweathermap.org/data/2.5/weather")
+
+# Observations are fresh for WEATHER_CACHE_TTL seconds and may then be served
+# stale for WEATHER_CACHE_STALE_TTL more while a background refresh runs
+WEATHER_CACHE_TTL = float(os.getenv('WEATHER_CACHE_TTL', 600))
+WEATHER_CACHE_STALE_TTL = float(os.getenv('WEATHER_CACHE_STALE_TTL', 1800))
+
+weather_cache = TTLCache('openweather', WEATHER_CACHE_TTL, WEATHER_CACHE_STALE_TTL)
+weather_flight = SingleFlight('openweather')
+
+
+def fetch_current_weather(lat, lon):
+    """Fetch the raw current-weather payload from OpenWeatherMap (uncached)"""
+    params = {
+        'lat': lat,
+        'lon': lon,
+        'appid': OPENWEATHER_API_KEY,
+        'units': 'metric'
+    }
+    response = http_client.get('openweather', OPENWEATHER_URL, params=params)
+    if response.status_code == 200:
+        return response.json()
+    print(f"[OpenWeather] HTTP {response.status_code} for ({lat}, {lon})")
+    return None
+
+
+def get_current_weather(lat, lon):
+    """Raw current-weather payload for a coordinate, served from cache when possible"""
+    key = (round(lat, 4), round(lon, 4))
+    return weather_cache.get_or_load(key, lambda: weather_flight.do(key, lambda: fetch_current_weather(lat, lon)))
+
+
+def refresh_current_weather(lat, lon):
+    """Fetch a coordinate's observation now and store it in the cache (used by prefetch)"""
+    key = (round(lat, 4), round(lon, 4))
+    data = weather_flight.do(key, lambda: fetch_current_weather(lat, lon))
+    if data is not None:
+        weather_cache.set(key, data)
+    return data
+
+
+def get_live_weather(city_data):
+    """Summarised live weather for a {'city', 'lat', 'lon'} location"""
+    try:
+        data = get_current_weather(city_data['lat'], city_data['lon'])
+        if data:
+            return {
+                'temperature': data['main']['temp'],
+                'humidity': data['main']['humidity'],
+                'condition': data['weather'][0]['main'],
+                'description': data['weather'][0]['description'],
+                'city': city_data['city'],
+                'source': 'live'
+            }
+    except Exception as e:
+        print(f"Weather API error: {e}")
+    return None
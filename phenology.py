@@ -0,0 +1,142 @@
+"""
+Crop Phenology
+Growing degree days (GDD) from NASA POWER daily T2M_MAX/T2M_MIN, crop stage
+estimation and stage-specific heat and cold penalties.
+
+A GDDTable holds cumulative sums over a location's archived history for one
+base temperature: GDD, heat-stress days and cold-stress days. Any sowing
+date is then answered with a few index lookups instead of a pass over the
+season, and many sowing dates (fields) are answered in one vectorized call.
+"""
+import os
+
+import numpy as np
+
+import nasa_archive
+import nasa_stats
+from nasa_power import recent_window
+from upstream_cache import TTLCache
+
+# Stages as the share of the crop's GDD-to-maturity at which each one ends,
+# and how sensitive yield is to temperature stress during it
+STAGES = ['emergence', 'vegetative', 'flowering', 'grain_fill', 'maturity']
+STAGE_END_FRACTIONS = np.array([0.08, 0.45, 0.65, 0.92, 1.0])
+STAGE_SENSITIVITY = np.array([0.4, 0.5, 1.0, 0.7, 0.2])
+
+# Daily maximum above which a day counts as heat stress
+HEAT_STRESS_TEMP = float(os.getenv('HEAT_STRESS_TEMP', 35))
+
+# A day counts as cold stress when the minimum is this far below the base temperature
+COLD_STRESS_MARGIN = float(os.getenv('COLD_STRESS_MARGIN', 2))
+
+# Yield penalty per stress day at full sensitivity, and the total cap
+STRESS_PENALTY_PER_DAY = 0.01
+MAX_TEMPERATURE_PENALTY = 0.4
+
+# Tables are rebuilt at most this often per location and base temperature
+GDD_TABLE_TTL = float(os.getenv('GDD_TABLE_TTL', 3600))
+
+gdd_tables = TTLCache('phenology', GDD_TABLE_TTL)
+
+
+class GDDTable:
+    """Cumulative GDD and stress-day counts for one location and base temperature"""
+
+    def __init__(self, days, tmax, tmin, base_temp, heat_temp=HEAT_STRESS_TEMP, cold_margin=COLD_STRESS_MARGIN):
+        self.days = np.asarray(days)
+        self.base_temp = base_temp
+        mean = (tmax + tmin) / 2
+        gdd = np.where(np.isnan(mean), 0.0, np.maximum(mean - base_temp, 0.0))
+        heat = np.nan_to_num(tmax) > heat_temp
+        cold = np.where(np.isnan(tmin), False, tmin < base_temp - cold_margin)
+        # Leading zero so the sum over days [a, b) is cum[b] - cum[a]
+        self.gdd = np.concatenate([[0.0], np.cumsum(gdd)])
+        self.heat = np.concatenate([[0], np.cumsum(heat)])
+        self.cold = np.concatenate([[0], np.cumsum(cold)])
+
+    def index_of(self, day):
+        """Position of a YYYYMMDD day (or array of days) in the table"""
+        return np.searchsorted(self.days, day)
+
+    def evaluate(self, sowing_index, gdd_to_maturity):
+        """Stage and temperature penalties for fields sown at sowing_index (scalar or array)
+
+        Everything is computed from the cumulative arrays, so the cost per
+        field does not depend on the season length.
+        """
+        sowing = np.atleast_1d(np.asarray(sowing_index, dtype=np.int64))
+        now = len(self.days)
+        accumulated = self.gdd[now] - self.gdd[sowing]
+        progress = np.minimum(accumulated / gdd_to_maturity, 1.0)
+        stage = np.minimum(np.searchsorted(STAGE_END_FRACTIONS, progress, side='left'), len(STAGES) - 1)
+
+        # Day index at which each stage ends (clipped to today for future stages)
+        targets = self.gdd[sowing][:, None] + STAGE_END_FRACTIONS[None, :] * gdd_to_maturity
+        ends = np.minimum(np.searchsorted(self.gdd, targets, side='left'), now)
+        starts = np.concatenate([sowing[:, None], ends[:, :-1]], axis=1)
+
+        heat_days = self.heat[ends] - self.heat[starts]
+        cold_days = self.cold[ends] - self.cold[starts]
+        penalty = ((heat_days + cold_days) * STAGE_SENSITIVITY[None, :]).sum(axis=1) * STRESS_PENALTY_PER_DAY
+        penalty = np.minimum(penalty, MAX_TEMPERATURE_PENALTY)
+
+        return {
+            'gdd': accumulated,
+            'progress': progress,
+            'stage_index': stage,
+            'heat_days': heat_days,
+            'cold_days': cold_days,
+            'temperature_factor': 1.0 - penalty,
+        }
+
+
+def build_table(raw_data, base_temp):
+    """GDDTable from a NASA daily payload containing T2M_MAX and T2M_MIN"""
+    days, _, matrix = nasa_stats.to_matrix(raw_data, ['T2M_MAX', 'T2M_MIN'])
+    return GDDTable(np.array(days, dtype=np.int64), matrix[:, 0], matrix[:, 1], base_temp)
+
+
+def get_table(lat, lon, base_temp, days=nasa_archive.NASA_ARCHIVE_HISTORY_DAYS):
+    """GDD table over a location's archived history, rebuilt at most every GDD_TABLE_TTL seconds
+
+    A history the archive lacks is synced in the background; the request
+    waits for it only while its budget lasts and otherwise reads what is
+    archived.
+    """
+    key = (round(lat, 4), round(lon, 4), base_temp)
+
+    def load():
+        start, end = recent_window(days)
+        nasa_archive.sync_within_budget(lat, lon, start, end)
+        raw_data = nasa_archive.nasa_archive.load(lat, lon, start, end, ['T2M_MAX', 'T2M_MIN'])
+        return build_table(raw_data, base_temp) if raw_data else None
+
+    return gdd_tables.get_or_load(key, load)
+
+
+def crop_phenology(lat, lon, crop_data, sowing_date):
+    """Stage and stage-weighted temperature stress for one field, or None
+
+    sowing_date is YYYYMMDD; crop_data needs base_temp and gdd_maturity.
+    """
+    table = get_table(lat, lon, crop_data['base_temp'])
+    if table is None or not len(table.days) or int(sowing_date) < table.days[0]:
+        return None
+    sowing_index = table.index_of(int(sowing_date))
+    if sowing_index >= len(table.days):
+        return None
+
+    result = table.evaluate(sowing_index, crop_data['gdd_maturity'])
+    stage = int(result['stage_index'][0])
+    return {
+        'sowing_date': str(sowing_date),
+        'as_of': str(table.days[-1]),
+        'base_temp': crop_data['base_temp'],
+        'gdd': round(float(result['gdd'][0]), 1),
+        'gdd_maturity': crop_data['gdd_maturity'],
+        'progress': round(float(result['progress'][0]), 3),
+        'stage': STAGES[stage],
+        'heat_stress_days': {name: int(n) for name, n in zip(STAGES[:stage + 1], result['heat_days'][0])},
+        'cold_stress_days': {name: int(n) for name, n in zip(STAGES[:stage + 1], result['cold_days'][0])},
+        'temperature_factor': round(float(result['temperature_factor'][0]), 3),
+    }
@@ -0,0 +1,276 @@
+"""
+Background Prefetch Scheduler
+Every location we serve is known in advance (STATE_CITIES and INDIAN_CITIES),
+so their OpenWeatherMap observations are refreshed and their NASA POWER daily
+archives are topped up on a fixed cadence in the background, and request
+handlers only read local data.
+
+Under a multi-worker server every worker imports the app, so the workers
+elect one leader through an exclusive lock on PREFETCH_LOCK_FILE; only the
+leader runs the jobs, and a follower takes over if the leader exits.
+"""
+try:
+    import fcntl
+except ImportError:  # Windows: no flock, every process runs its own scheduler
+    fcntl = None
+import heapq
+import itertools
+import os
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import openweather
+import drought_indices
+import nasa_archive
+import nasa_regional
+
+PREFETCH_ENABLED = os.getenv('PREFETCH_ENABLED', 'true').lower() == 'true'
+
+# Refresh cadence in seconds; weather must stay below WEATHER_CACHE_TTL
+WEATHER_PREFETCH_INTERVAL = float(os.getenv('WEATHER_PREFETCH_INTERVAL', 300))
+NASA_PREFETCH_INTERVAL = float(os.getenv('NASA_PREFETCH_INTERVAL', 86400))
+
+# Each run is shifted by up to +/- this fraction of its interval so the
+# locations do not all hit a provider in the same second
+PREFETCH_JITTER = float(os.getenv('PREFETCH_JITTER', 0.1))
+
+# A failed refresh is retried after this many seconds instead of a full interval
+PREFETCH_RETRY_SECONDS = float(os.getenv('PREFETCH_RETRY_SECONDS', 300))
+
+# Maximum concurrent prefetch requests per provider
+PREFETCH_CONCURRENCY = {
+    'openweather': int(os.getenv('PREFETCH_OPENWEATHER_CONCURRENCY', 4)),
+    'nasa_power': int(os.getenv('PREFETCH_NASA_CONCURRENCY', 2)),
+    # Each regional job fetches its grid points on nasa_regional's own pool
+    'nasa_regional': int(os.getenv('PREFETCH_NASA_REGIONAL_CONCURRENCY', 1)),
+    'drought': 1,
+}
+
+# Drought/anomaly indices are recomputed once a day
+DROUGHT_JOB_INTERVAL = float(os.getenv('DROUGHT_JOB_INTERVAL', 86400))
+
+# Lock file shared by the server's workers, and how often followers retry it
+PREFETCH_LOCK_FILE = os.getenv('PREFETCH_LOCK_FILE', os.path.join(
+    os.path.dirname(nasa_archive.NASA_ARCHIVE_DB), 'prefetch.lock'))
+PREFETCH_LEADER_RETRY = float(os.getenv('PREFETCH_LEADER_RETRY', 60))
+
+
+class PrefetchScheduler:
+    """Runs periodic refresh jobs on per-provider bounded pools"""
+
+    def __init__(self):
+        self._jobs = {}
+        self._queue = []
+        self._seq = itertools.count()
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stopped = threading.Event()
+        self._thread = None
+        self._executors = {
+            provider: ThreadPoolExecutor(max_workers=limit, thread_name_prefix=f'prefetch-{provider}')
+            for provider, limit in PREFETCH_CONCURRENCY.items()
+        }
+
+    def add_job(self, job_id, provider, interval, func, *args, **info):
+        """Register func(*args) to run every `interval` seconds (first run staggered)"""
+        with self._lock:
+            if job_id in self._jobs:
+                return
+            self._jobs[job_id] = {
+                'id': job_id,
+                'provider': provider,
+                'interval': interval,
+                'func': func,
+                'args': args,
+                'info': info,
+                'running': False,
+                'last_attempt': None,
+                'last_success': None,
+                'last_error': None,
+                'last_duration': None,
+                'next_run': None,
+            }
+            first_run = time.time() + random.uniform(0, min(interval, 30))
+            self._schedule(job_id, first_run)
+        self._wake.set()
+
+    def _schedule(self, job_id, when):
+        self._jobs[job_id]['next_run'] = when
+        heapq.heappush(self._queue, (when, next(self._seq), job_id))
+
+    def _next_delay(self, interval):
+        return interval * (1 + random.uniform(-PREFETCH_JITTER, PREFETCH_JITTER))
+
+    def start(self):
+        if self._thread and self._thread.is_alive():
+            return
+        self._stopped.clear()
+        self._thread = threading.Thread(target=self._loop, name='prefetch-scheduler', daemon=True)
+        self._thread.start()
+        print(f"✅ Prefetch scheduler started ({len(self._jobs)} jobs)")
+
+    def stop(self):
+        self._stopped.set()
+        self._wake.set()
+
+    def _loop(self):
+        while not self._stopped.is_set():
+            with self._lock:
+                now = time.time()
+                while self._queue and self._queue[0][0] <= now:
+                    when, _, job_id = heapq.heappop(self._queue)
+                    job = self._jobs[job_id]
+                    if when != job['next_run']:
+                        continue  # superseded by an earlier retry
+                    self._schedule(job_id, now + self._next_delay(job['interval']))
+                    if not job['running']:
+                        job['running'] = True
+                        self._executors[job['provider']].submit(self._execute, job)
+                timeout = self._queue[0][0] - now if self._queue else None
+            self._wake.wait(timeout)
+            self._wake.clear()
+
+    def _execute(self, job):
+        started = time.time()
+        job['last_attempt'] = started
+        try:
+            if job['func'](*job['args']) is None:
+                raise RuntimeError('no data returned')
+            job['last_success'] = time.time()
+            job['last_error'] = None
+        except Exception as e:
+            job['last_error'] = str(e)
+            print(f"[Prefetch] {job['id']} failed: {e}")
+            retry_at = time.time() + min(job['interval'], PREFETCH_RETRY_SECONDS)
+            with self._lock:
+                if retry_at < job['next_run']:
+                    self._schedule(job['id'], retry_at)
+            self._wake.set()
+        finally:
+            job['last_duration'] = round(time.time() - started, 3)
+            job['running'] = False
+
+    def status(self):
+        """Freshness per job: age of the last successful refresh vs its interval"""
+        now = time.time()
+        jobs = []
+        with self._lock:
+            for job in self._jobs.values():
+                age = now - job['last_success'] if job['last_success'] else None
+                jobs.append({
+                    'id': job['id'],
+                    'provider': job['provider'],
+                    **job['info'],
+                    'interval_seconds': job['interval'],
+                    'age_seconds': round(age, 1) if age is not None else None,
+                    'fresh': age is not None and age <= job['interval'] * (1 + PREFETCH_JITTER),
+                    'last_error': job['last_error'],
+                    'last_duration': job['last_duration'],
+                    'next_run_in': round(max(0, job['next_run'] - now), 1),
+                })
+        jobs.sort(key=lambda j: j['id'])
+        return {
+            'running': bool(self._thread and self._thread.is_alive()),
+            'total': len(jobs),
+            'fresh': sum(1 for j in jobs if j['fresh']),
+            'jobs': jobs,
+        }
+
+
+scheduler = PrefetchScheduler()
+
+_leader_lock = None  # open lock file while this process is the leader
+_follower = None
+
+
+def _acquire_leadership():
+    """Take the prefetch lock without blocking; True if this process holds it"""
+    global _leader_lock
+    if _leader_lock is not None:
+        return True
+    if fcntl is None:
+        return True
+    try:
+        os.makedirs(os.path.dirname(PREFETCH_LOCK_FILE) or '.', exist_ok=True)
+        handle = open(PREFETCH_LOCK_FILE, 'a')
+    except OSError as e:
+        # Read-only filesystem (e.g. serverless): no shared workers to coordinate
+        print(f"[Prefetch] Lock file unavailable ({e}), running as leader")
+        return True
+    try:
+        fcntl.flock(handle, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        handle.close()
+        return False
+    _leader_lock = handle  # held until the process exits
+    return True
+
+
+def _wait_for_leadership():
+    while not _acquire_leadership():
+        time.sleep(PREFETCH_LEADER_RETRY)
+    print(f"[Prefetch] Worker {os.getpid()} took over as prefetch leader")
+    scheduler.start()
+
+
+def register_default_jobs():
+    """Weather for every state capital and city, the NASA POWER archive for every
+    state capital, a regional NASA summary for every state and the daily
+    drought index batch"""
+    from yield_prediction import STATE_CITIES
+    from weather import INDIAN_CITIES
+
+    weather_points = {}
+    for state, data in STATE_CITIES.items():
+        weather_points.setdefault((data['lat'], data['lon']), data['city'])
+    for city, data in INDIAN_CITIES.items():
+        weather_points.setdefault((data['lat'], data['lon']), city)
+
+    for (lat, lon), name in weather_points.items():
+        scheduler.add_job(f'openweather:{name}', 'openweather', WEATHER_PREFETCH_INTERVAL,
+                          openweather.refresh_current_weather, lat, lon,
+                          location=name, lat=lat, lon=lon)
+
+    nasa_points = {}
+    for state, data in STATE_CITIES.items():
+        nasa_points.setdefault((data['lat'], data['lon']), []).append(state)
+
+    for (lat, lon), states in nasa_points.items():
+        scheduler.add_job(f"nasa_power:{'/'.join(states)}", 'nasa_power', NASA_PREFETCH_INTERVAL,
+                          nasa_archive.sync_history, lat, lon,
+                          location=', '.join(states), lat=lat, lon=lon)
+
+    for state in STATE_CITIES:
+        if state in nasa_regional.STATE_BOUNDS:
+            scheduler.add_job(f'nasa_regional:{state}', 'nasa_regional', NASA_PREFETCH_INTERVAL,
+                              nasa_regional.refresh_summary, state, location=state)
+
+    scheduler.add_job('drought:all', 'drought', DROUGHT_JOB_INTERVAL, drought_indices.run_batch,
+                      location='all states and cities')
+
+
+def start():
+    """Register the default jobs and start the scheduler thread in the leader
+
+    Followers keep retrying the lock in the background so a recycled or
+    crashed leader is replaced.
+    """
+    global _follower
+    register_default_jobs()
+    if _acquire_leadership():
+        scheduler.start()
+        return
+    if _follower is None:
+        print(f"[Prefetch] Worker {os.getpid()} is a follower - another worker runs the jobs")
+        _follower = threading.Thread(target=_wait_for_leadership, name='prefetch-follower', daemon=True)
+        _follower.start()
+
+
+def status():
+    """Scheduler status as seen by this worker (followers report running=False)"""
+    data = scheduler.status()
+    data['leader'] = data['running']
+    data['pid'] = os.getpid()
+    return data
@@ -0,0 +1,191 @@
+"""
+Spatial Index
+Resolves arbitrary field coordinates to the nearest NASA POWER point we keep
+an archive for, the nearest weather observation point and the state the
+field lies in. Points are bucketed into a uniform lat/lon grid so a nearest
+lookup only looks at a few cells, even with tens of thousands of points.
+"""
+import math
+import os
+import threading
+
+import numpy as np
+
+EARTH_RADIUS_KM = 6371.0
+KM_PER_DEGREE = math.pi * EARTH_RADIUS_KM / 180
+
+# Grid cell size in degrees; roughly the spacing of the densest point set
+INDEX_CELL_DEGREES = 0.5
+
+# Points outside every state's bounding box are still served when they lie
+# this close to a state capital; anything farther is outside coverage
+LOCATE_MAX_KM = float(os.getenv('LOCATE_MAX_KM', 150))
+
+
+def haversine_km(lat, lon, lats, lons):
+    """Great-circle distance from one point to arrays of points"""
+    lat, lon = math.radians(lat), math.radians(lon)
+    lats, lons = np.radians(lats), np.radians(lons)
+    a = (np.sin((lats - lat) / 2) ** 2 +
+         math.cos(lat) * np.cos(lats) * np.sin((lons - lon) / 2) ** 2)
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+
+
+class GridIndex:
+    """Nearest-neighbour lookup over fixed points using a uniform degree grid
+
+    Points are sorted by cell so every cell is one contiguous slice. A query
+    scans rings of cells around the query cell and stops once no unvisited
+    ring can hold anything closer than the best match so far.
+    """
+
+    def __init__(self, points, cell_degrees=INDEX_CELL_DEGREES):
+        """points: list of (lat, lon, payload)"""
+        self.cell = cell_degrees
+        lats = np.array([p[0] for p in points], dtype=float)
+        lons = np.array([p[1] for p in points], dtype=float)
+        rows = np.floor(lats / self.cell).astype(np.int64)
+        cols = np.floor(lons / self.cell).astype(np.int64)
+
+        order = np.lexsort((cols, rows))
+        self.lats = lats[order]
+        self.lons = lons[order]
+        self.payloads = [points[i][2] for i in order]
+        self._cells = {}
+        if len(order):
+            keys = np.stack([rows[order], cols[order]], axis=1)
+            starts = np.flatnonzero(np.any(np.diff(keys, axis=0) != 0, axis=1)) + 1
+            bounds = np.concatenate([[0], starts, [len(order)]])
+            for start, end in zip(bounds[:-1], bounds[1:]):
+                self._cells[(int(keys[start, 0]), int(keys[start, 1]))] = (int(start), int(end))
+            self._extent = (int(rows.min()), int(rows.max()), int(cols.min()), int(cols.max()))
+
+    def __len__(self):
+        return len(self.payloads)
+
+    def _ring(self, row, col, r):
+        if r == 0:
+            yield row, col
+            return
+        for dc in range(-r, r + 1):
+            yield row - r, col + dc
+            yield row + r, col + dc
+        for dr in range(-r + 1, r):
+            yield row + dr, col - r
+            yield row + dr, col + r
+
+    def nearest(self, lat, lon, max_km=None):
+        """(payload, distance_km) of the closest point, or (None, None)"""
+        if not self._cells:
+            return None, None
+        row, col = math.floor(lat / self.cell), math.floor(lon / self.cell)
+        best_i, best_km = None, math.inf
+
+        row_min, row_max, col_min, col_max = self._extent
+        last_ring = max(abs(row - row_min), abs(row - row_max), abs(col - col_min), abs(col - col_max))
+
+        for r in range(last_ring + 1):
+            # Anything in ring r is at least (r - 1) cells away; longitude
+            # cells shrink with latitude, so use the widest latitude reached
+            edge_lat = min(89.9, abs(lat) + r * self.cell)
+            min_km = max(0, r - 1) * self.cell * KM_PER_DEGREE * math.cos(math.radians(edge_lat))
+            if best_i is not None and min_km > best_km:
+                break
+            if max_km is not None and min_km > max_km:
+                break
+
+            slices = [self._cells[key] for key in self._ring(row, col, r) if key in self._cells]
+            if not slices:
+                continue
+            idx = np.concatenate([np.arange(start, end) for start, end in slices])
+            distances = haversine_km(lat, lon, self.lats[idx], self.lons[idx])
+            k = int(np.argmin(distances))
+            if distances[k] < best_km:
+                best_i, best_km = int(idx[k]), float(distances[k])
+
+        if best_i is None or (max_km is not None and best_km > max_km):
+            return None, None
+        return self.payloads[best_i], round(best_km, 2)
+
+
+_indexes = {}
+_lock = threading.Lock()
+
+
+def _build_indexes():
+    """Index the archived NASA points, weather points and state capitals"""
+    import nasa_regional
+    from yield_prediction import STATE_CITIES
+    from weather import INDIAN_CITIES
+
+    nasa_points = {}
+    for state, data in STATE_CITIES.items():
+        nasa_points.setdefault((round(data['lat'], 4), round(data['lon'], 4)), data['city'])
+    for state in nasa_regional.STATE_BOUNDS:
+        for lat, lon in nasa_regional.state_grid_points(state):
+            nasa_points.setdefault((lat, lon), f'{state} grid')
+
+    weather_points = {}
+    for state, data in STATE_CITIES.items():
+        weather_points.setdefault((data['lat'], data['lon']), data['city'])
+    for city, data in INDIAN_CITIES.items():
+        weather_points.setdefault((data['lat'], data['lon']), city)
+
+    return {
+        'nasa': GridIndex([(lat, lon, {'name': name, 'lat': lat, 'lon': lon})
+                           for (lat, lon), name in nasa_points.items()]),
+        'weather': GridIndex([(lat, lon, {'city': name, 'lat': lat, 'lon': lon})
+                              for (lat, lon), name in weather_points.items()]),
+        'capitals': GridIndex([(data['lat'], data['lon'], state) for state, data in STATE_CITIES.items()]),
+    }
+
+
+def _index(name):
+    if not _indexes:
+        with _lock:
+            if not _indexes:
+                _indexes.update(_build_indexes())
+    return _indexes[name]
+
+
+def state_for(lat, lon):
+    """State containing the point (by bounding box; nearest capital breaks ties and
+    gaps), or None when the point is outside coverage"""
+    import nasa_regional
+    candidates = [state for state, (lat_min, lat_max, lon_min, lon_max) in nasa_regional.STATE_BOUNDS.items()
+                  if lat_min <= lat <= lat_max and lon_min <= lon <= lon_max]
+    if len(candidates) == 1:
+        return candidates[0]
+    if candidates:
+        # Resolved without the index: grid points are classified while it is built
+        from yield_prediction import STATE_CITIES
+        distances = {s: float(haversine_km(lat, lon, STATE_CITIES[s]['lat'], STATE_CITIES[s]['lon']))
+                     for s in candidates}
+        return min(distances, key=distances.get)
+    state, _ = _index('capitals').nearest(lat, lon, max_km=LOCATE_MAX_KM)
+    return state
+
+
+def nearest_nasa_point(lat, lon):
+    return _index('nasa').nearest(lat, lon)
+
+
+def nearest_weather_point(lat, lon):
+    return _index('weather').nearest(lat, lon)
+
+
+def locate(lat, lon):
+    """State, nearest NASA point and nearest weather point for a field, or None
+    when the field is outside the supported region"""
+    state = state_for(lat, lon)
+    if state is None:
+        return None
+    nasa_point, nasa_km = nearest_nasa_point(lat, lon)
+    weather_point, weather_km = nearest_weather_point(lat, lon)
+    return {
+        'lat': lat,
+        'lon': lon,
+        'state': state,
+        'nasa_point': dict(nasa_point, distance_km=nasa_km) if nasa_point else None,
+        'weather_point': dict(weather_point, distance_km=weather_km) if weather_point else None,
+    }
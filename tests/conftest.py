@@ -0,0 +1,34 @@
+"""
+Test setup: every SQLite store and lock file goes to a temporary directory,
+background prefetch is off and upstream URLs point at a closed local port,
+so no test touches the network or the app's database directory.
+"""
+import os
+import sys
+import tempfile
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+_tmp = tempfile.mkdtemp(prefix='cropai-tests-')
+os.environ.update({
+    'PREFETCH_ENABLED': 'false',
+    'NASA_ARCHIVE_DB': os.path.join(_tmp, 'nasa_archive.db'),
+    'DROUGHT_DB': os.path.join(_tmp, 'drought.db'),
+    'PREFETCH_LOCK_FILE': os.path.join(_tmp, 'prefetch.lock'),
+    'NASA_POWER_BASE_URL': 'http://127.0.0.1:9/nasa',
+    'OPENWEATHER_URL': 'http://127.0.0.1:9/weather',
+})
+
+
+@pytest.fixture
+def yield_client():
+    """Test client for the yield blueprint alone (app.py also pulls in LiveKit)"""
+    from flask import Flask
+    import yield_prediction
+
+    app = Flask(__name__)
+    app.register_blueprint(yield_prediction.yield_bp, url_prefix='/api/yield')
+    return app.test_client()
@@ -0,0 +1,57 @@
+import math
+
+import numpy as np
+import pytest
+
+import drought_indices
+from drought_indices import _gamma_p, _norm_ppf, gamma_spi
+
+
+@pytest.mark.parametrize('x', [0.1, 1.0, 3.0, 10.0])
+def test_incomplete_gamma_matches_closed_forms(x):
+    # P(1, x) is the exponential CDF; P(2, x) = 1 - (1 + x) e^-x
+    assert _gamma_p(1.0, x) == pytest.approx(1 - math.exp(-x), abs=1e-10)
+    assert _gamma_p(2.0, x) == pytest.approx(1 - (1 + x) * math.exp(-x), abs=1e-10)
+
+
+def test_norm_ppf_is_symmetric_and_accurate():
+    assert _norm_ppf(0.5) == pytest.approx(0.0, abs=1e-9)
+    assert _norm_ppf(0.975) == pytest.approx(1.959964, abs=1e-6)
+    assert _norm_ppf(0.001) == pytest.approx(-_norm_ppf(0.999), abs=1e-9)
+
+
+def test_gamma_spi_is_centred_and_monotonic():
+    climatology = np.random.default_rng(1).gamma(2.0, 50.0, 10)
+    values = [gamma_spi(np.float64(total), climatology) for total in (5, 50, 100, 200, 400)]
+    assert values == sorted(values)
+    assert abs(gamma_spi(np.float64(np.median(climatology)), climatology)) < 0.5
+
+
+def test_gamma_spi_reaches_the_extreme_classes():
+    # Ranking against ten years capped |SPI| near 1.64; the fit does not
+    climatology = np.array([80.0, 95, 100, 105, 110, 120, 90, 100, 115, 85])
+    assert gamma_spi(np.float64(10.0), climatology) <= -2.0
+    assert gamma_spi(np.float64(300.0), climatology) >= 2.0
+    assert drought_indices.spi_category(gamma_spi(np.float64(10.0), climatology)) == 'Extremely dry'
+
+
+def test_gamma_spi_needs_enough_years_and_spread():
+    assert gamma_spi(np.float64(50.0), np.array([50.0, 60, 70])) is None
+    assert gamma_spi(np.float64(np.nan), np.full(10, 50.0) + np.arange(10)) is None
+    assert gamma_spi(np.float64(50.0), np.full(10, 50.0)) is None
+
+
+def test_dry_years_shift_zero_rainfall_upwards():
+    climatology = np.array([0.0, 0, 0, 20, 40, 60, 80, 100, 120, 140])
+    assert gamma_spi(np.float64(0.0), climatology) == pytest.approx(round(_norm_ppf(0.3), 2))
+
+
+def test_stale_lookup_does_not_block_on_reload(monkeypatch):
+    started = []
+    monkeypatch.setattr(drought_indices, '_loaded_at', 0.0)
+    monkeypatch.setattr(drought_indices, '_reloading', False)
+    monkeypatch.setattr(drought_indices.threading, 'Thread',
+                        lambda target, **kwargs: type('T', (), {'start': lambda self: started.append(target)})())
+    drought_indices.lookup('state', 'Punjab')
+    drought_indices.lookup('state', 'Punjab')
+    assert started == [drought_indices.reload]
@@ -0,0 +1,160 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+import requests
+
+import http_client
+import upstream_metrics
+from http_client import CircuitBreaker, CircuitOpenError, DeadlineExceeded
+
+URL = 'http://upstream.test/data'
+
+
+class FakeSession:
+    """Stands in for a provider session: replays a list of outcomes"""
+
+    def __init__(self, *outcomes):
+        self.outcomes = list(outcomes)
+        self.calls = 0
+
+    def request(self, method, url, **kwargs):
+        self.calls += 1
+        outcome = self.outcomes[min(self.calls, len(self.outcomes)) - 1]
+        if isinstance(outcome, Exception):
+            raise outcome
+        response = requests.Response()
+        response.status_code = outcome
+        response._content = b'{}'
+        return response
+
+
+@pytest.fixture
+def provider(monkeypatch):
+    """nasa_power with a fresh breaker, no hedging, no backoff sleeps and a fake session"""
+    monkeypatch.setitem(http_client.BREAKERS, 'nasa_power', CircuitBreaker('nasa_power', 10.0))
+    monkeypatch.setitem(http_client.PROVIDERS, 'nasa_power',
+                        dict(http_client.PROVIDERS['nasa_power'], retries=2, hedge=False))
+    monkeypatch.setattr(http_client.time, 'sleep', lambda seconds: None)
+
+    def use(*outcomes):
+        session = FakeSession(*outcomes)
+        monkeypatch.setattr(http_client, 'get_session', lambda name: session)
+        return session
+    return use
+
+
+def test_retried_call_counts_once_in_the_breaker(provider):
+    session = provider(requests.ConnectionError('down'))
+    with pytest.raises(requests.ConnectionError):
+        http_client.get('nasa_power', URL)
+    assert session.calls == 3
+    stats = http_client.BREAKERS['nasa_power'].stats()
+    assert stats['window_calls'] == 1
+    assert stats['state'] == CircuitBreaker.CLOSED
+
+
+def test_recovered_retry_is_recorded_as_success(provider):
+    session = provider(503, 200)
+    assert http_client.get('nasa_power', URL).status_code == 200
+    assert session.calls == 2
+    assert http_client.BREAKERS['nasa_power'].stats()['error_rate'] == 0.0
+
+
+def test_breaker_opens_after_failing_calls_and_fails_fast(provider):
+    session = provider(500)
+    for _ in range(http_client.BREAKER_MIN_CALLS):
+        http_client.get('nasa_power', URL)
+    assert http_client.BREAKERS['nasa_power'].state == CircuitBreaker.OPEN
+    calls = session.calls
+    with pytest.raises(CircuitOpenError):
+        http_client.get('nasa_power', URL)
+    assert session.calls == calls
+
+
+def test_spent_budget_never_reaches_the_provider(provider):
+    session = provider(200)
+    token = http_client.set_deadline(0)
+    try:
+        with pytest.raises(DeadlineExceeded):
+            http_client.get('nasa_power', URL)
+    finally:
+        http_client.clear_deadline(token)
+    assert session.calls == 0
+    assert http_client.BREAKERS['nasa_power'].stats()['window_calls'] == 0
+    endpoint = upstream_metrics.snapshot()['upstream']['nasa_power']['upstream.test/data']
+    assert endpoint['deadline'] >= 1
+
+
+
+def test_timeouts_cut_short_by_the_request_budget_are_not_held_against_the_provider(provider):
+    session = provider(requests.ReadTimeout('budget'))
+    breaker = http_client.BREAKERS['nasa_power']
+    token = http_client.set_deadline(1.0)
+    try:
+        for _ in range(http_client.BREAKER_MIN_CALLS):
+            with pytest.raises(requests.ReadTimeout):
+                http_client.get('nasa_power', URL)
+    finally:
+        http_client.clear_deadline(token)
+    assert session.calls >= http_client.BREAKER_MIN_CALLS
+    stats = breaker.stats()
+    assert stats['state'] == CircuitBreaker.CLOSED
+    assert stats['window_calls'] == 0
+    assert stats['unrecorded'] == http_client.BREAKER_MIN_CALLS
+
+
+def test_timeouts_within_the_providers_own_limit_still_count(provider):
+    provider(requests.ReadTimeout('slow upstream'))
+    with pytest.raises(requests.ReadTimeout):
+        http_client.get('nasa_power', URL)
+    stats = http_client.BREAKERS['nasa_power'].stats()
+    assert stats['window_calls'] == 1 and stats['error_rate'] == 1.0
+
+
+def test_budget_cut_probe_gives_its_half_open_slot_back(provider):
+    provider(requests.ReadTimeout('budget'))
+    breaker = http_client.BREAKERS['nasa_power']
+    breaker.state = CircuitBreaker.HALF_OPEN
+    token = http_client.set_deadline(1.0)
+    try:
+        with pytest.raises(requests.ReadTimeout):
+            http_client.get('nasa_power', URL)
+    finally:
+        http_client.clear_deadline(token)
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    assert breaker._probes == 0
+
+def test_fan_out_skips_failures_none_and_late_calls():
+    def boom():
+        raise RuntimeError('boom')
+
+    results, skipped = http_client.fan_out({
+        'ok': (lambda: 'data',),
+        'none': (lambda: None,),
+        'error': (boom,),
+        'late': (time.sleep, 1),
+    }, 0.3)
+    assert results == {'ok': 'data'}
+    assert sorted(skipped) == ['error', 'late', 'none']
+
+
+def test_fan_out_cancels_calls_that_never_started(monkeypatch):
+    monkeypatch.setattr(http_client, '_executor', ThreadPoolExecutor(max_workers=1))
+    started = []
+    results, skipped = http_client.fan_out({
+        'slow': (time.sleep, 0.5),
+        'queued': (started.append, 'queued'),
+    }, 0.1)
+    assert results == {} and sorted(skipped) == ['queued', 'slow']
+    time.sleep(0.6)
+    assert started == []
+
+
+def test_own_latency_subtracts_overlapping_upstream_time_once():
+    token = upstream_metrics.begin_request()
+    upstream_metrics.record_call('openweather', 'http://a.test/x', 1.0)
+    upstream_metrics.record_call('nasa_power', 'http://b.test/y', 1.0)
+    upstream_metrics.end_request(token, 'test_overlap', 200, 1.5)
+    route = upstream_metrics.snapshot()['routes']['test_overlap']
+    assert route['own_latency']['sum_seconds'] == pytest.approx(0.5, abs=0.01)
@@ -0,0 +1,50 @@
+import threading
+import time
+from datetime import datetime, timedelta
+
+import http_client
+import nasa_archive
+import phenology
+import yield_prediction
+
+NASA_DATA = {'soil_moisture_index': 0.5, 'T2M': {'average': 25.0}, 'ALLSKY_SFC_SW_DWN': {'average': 18.0}}
+NO_STRESS = {'stage': 'vegetative', 'gdd': 400, 'gdd_maturity': 1600, 'temperature_factor': 1.0,
+             'heat_stress_days': {'emergence': 0, 'vegetative': 0},
+             'cold_stress_days': {'emergence': 0, 'vegetative': 0}}
+
+
+def test_stress_free_season_leaves_the_nasa_factor_and_yield_alone():
+    without, _ = yield_prediction.calculate_nasa_yield_factor(NASA_DATA, 'wheat')
+    with_stage, insights = yield_prediction.calculate_nasa_yield_factor(NASA_DATA, 'wheat', NO_STRESS)
+    assert with_stage == without
+    assert any('Crop stage' in line for line in insights)
+
+    args = ('wheat', 'Punjab', 100, 40, 40, 6.5, 700, 33, 65, 1, without)
+    plain = yield_prediction.predict_yield(*args)[0]['predicted_yield']
+    assert yield_prediction.predict_yield(*args, None, 1.0)[0]['predicted_yield'] == plain
+    assert yield_prediction.predict_yield(*args, None, 0.8)[0]['predicted_yield'] < plain
+
+
+def test_gdd_table_never_waits_past_the_request_budget(monkeypatch):
+    release = threading.Event()
+
+    def slow_fetch(lat, lon, start, end, parameters):
+        release.wait(5)
+        first = datetime.strptime(start, '%Y%m%d')
+        days = [(first + timedelta(days=i)).strftime('%Y%m%d')
+                for i in range((datetime.strptime(end, '%Y%m%d') - first).days + 1)]
+        return {param: {day: 30.0 if param == 'T2M_MAX' else 18.0 for day in days} for param in parameters}
+    monkeypatch.setattr(nasa_archive, 'fetch_daily_parameters', slow_fetch)
+
+    token = http_client.set_deadline(0.2)
+    try:
+        started = time.time()
+        assert phenology.get_table(24.5, 80.5, 10.0) is None
+        assert time.time() - started < 1.0
+    finally:
+        http_client.clear_deadline(token)
+
+    # The sync kept running outside the request and fills the archive for the next one
+    release.set()
+    table = phenology.get_table(24.5, 80.5, 10.0)
+    assert table is not None and len(table.days) > 300
@@ -0,0 +1,45 @@
+import numpy as np
+import pytest
+
+import spatial_index
+from spatial_index import GridIndex, haversine_km
+
+
+def test_grid_index_matches_brute_force():
+    rng = np.random.default_rng(7)
+    lats = rng.uniform(6, 36, 2000)
+    lons = rng.uniform(68, 97, 2000)
+    index = GridIndex([(lat, lon, i) for i, (lat, lon) in enumerate(zip(lats, lons))])
+    for lat, lon in rng.uniform((0, 60), (40, 100), (200, 2)):
+        payload, km = index.nearest(lat, lon)
+        distances = haversine_km(lat, lon, lats, lons)
+        assert km == pytest.approx(distances.min(), abs=0.01)
+        assert distances[payload] == pytest.approx(distances.min(), abs=1e-9)
+
+
+def test_grid_index_respects_max_km_and_empty_index():
+    index = GridIndex([(20.0, 78.0, 'centre')])
+    assert index.nearest(20.5, 78.0, max_km=100)[0] == 'centre'
+    assert index.nearest(25.0, 78.0, max_km=100) == (None, None)
+    assert GridIndex([]).nearest(20.0, 78.0) == (None, None)
+
+
+def test_locate_resolves_state_and_nearest_points():
+    location = spatial_index.locate(30.9, 75.85)  # Ludhiana
+    assert location['state'] == 'Punjab'
+    assert location['nasa_point']['distance_km'] < 150
+    assert location['weather_point']['distance_km'] < 150
+
+
+@pytest.mark.parametrize('lat, lon', [(48.85, 2.35), (6.9, 79.8), (-33.9, 151.2)])
+def test_points_outside_coverage_are_rejected(lat, lon):
+    assert spatial_index.state_for(lat, lon) is None
+    assert spatial_index.locate(lat, lon) is None
+
+
+def test_regional_grid_keeps_only_in_state_cells():
+    import nasa_regional
+    for state in nasa_regional.STATE_BOUNDS:
+        points = nasa_regional.state_grid_points(state)
+        assert points
+        assert all(spatial_index.state_for(lat, lon) == state for lat, lon in points)
@@ -0,0 +1,78 @@
+import threading
+import time
+
+import upstream_cache
+from upstream_cache import SingleFlight, TTLCache
+
+
+def test_ttl_cache_serves_fresh_values_without_reloading():
+    cache = TTLCache('test_fresh', ttl=60)
+    calls = []
+    loader = lambda: calls.append(1) or 'value'
+    assert cache.get_or_load('k', loader) == 'value'
+    assert cache.get_or_load('k', loader) == 'value'
+    assert len(calls) == 1
+    assert cache.stats()['hits'] == 1
+
+
+def test_ttl_cache_does_not_cache_failed_loads():
+    cache = TTLCache('test_none', ttl=60)
+    calls = []
+    assert cache.get_or_load('k', lambda: calls.append(1)) is None
+    assert cache.get_or_load('k', lambda: calls.append(1)) is None
+    assert len(calls) == 2
+
+
+def test_ttl_cache_reloads_after_expiry(monkeypatch):
+    cache = TTLCache('test_expiry', ttl=10)
+    now = [1000.0]
+    monkeypatch.setattr(upstream_cache.time, 'time', lambda: now[0])
+    assert cache.get_or_load('k', lambda: 'old') == 'old'
+    now[0] += 11
+    assert cache.get_or_load('k', lambda: 'new') == 'new'
+
+
+def test_single_flight_coalesces_concurrent_calls():
+    flight = SingleFlight('test_flight')
+    started = threading.Event()
+    release = threading.Event()
+    calls = []
+
+    def slow():
+        calls.append(1)
+        started.set()
+        release.wait(5)
+        return 'shared'
+
+    results = []
+    leader = threading.Thread(target=lambda: results.append(flight.do('k', slow)))
+    leader.start()
+    started.wait(5)
+    followers = [threading.Thread(target=lambda: results.append(flight.do('k', slow))) for _ in range(3)]
+    for thread in followers:
+        thread.start()
+    deadline = time.time() + 5
+    while flight.stats()['coalesced'] < 3 and time.time() < deadline:
+        time.sleep(0.01)
+    release.set()
+    for thread in [leader] + followers:
+        thread.join(5)
+
+    assert results == ['shared'] * 4
+    assert len(calls) == 1
+    assert flight.stats()['coalesced'] == 3
+
+
+def test_single_flight_shares_errors_and_forgets_finished_calls():
+    flight = SingleFlight('test_flight_errors')
+
+    def fail():
+        raise ValueError('boom')
+
+    for _ in range(2):
+        try:
+            flight.do('k', fail)
+        except ValueError:
+            pass
+    assert flight.stats()['executed'] == 2
+    assert flight.do('k', lambda: 'ok') == 'ok'
@@ -0,0 +1,65 @@
+from datetime import datetime, timedelta
+
+import numpy as np
+import pytest
+
+import water_balance
+from water_balance import simulate
+
+
+def _payload(precip, demand, wetness, start='20260101'):
+    first = datetime.strptime(start, '%Y%m%d')
+    days = [(first + timedelta(days=i)).strftime('%Y%m%d') for i in range(len(precip))]
+    return {
+        'PRECTOTCORR': dict(zip(days, precip)),
+        'EVPTRNS': dict(zip(days, demand)),
+        'GWETROOT': dict(zip(days, wetness)),
+    }
+
+
+def test_no_demand_means_no_stress():
+    result = simulate(np.full((1, 30), 2.0), np.zeros((1, 30)), 100)
+    assert result['water_stress_index'][0] == 0
+    assert result['stressed_days'][0] == 0
+
+
+def test_empty_bucket_without_rain_is_fully_stressed():
+    result = simulate(np.zeros((1, 10)), np.full((1, 10), 5.0), 100, initial_fraction=0.0)
+    assert result['water_stress_index'][0] == pytest.approx(1.0)
+    assert result['deficit_mm'][0] == pytest.approx(50.0)
+
+
+def test_storage_spills_above_capacity():
+    result = simulate(np.array([[150.0]]), np.zeros((1, 1)), 100, initial_fraction=0.0)
+    assert result['final_storage_mm'][0] == pytest.approx(100.0)
+    assert result['drainage_mm'][0] == pytest.approx(50.0)
+
+
+def test_fields_are_simulated_independently():
+    precip = np.array([[0.0] * 20, [6.0] * 20])
+    demand = np.full((2, 20), 5.0)
+    both = simulate(precip, demand, [80, 120])
+    for i, capacity in enumerate([80, 120]):
+        single = simulate(precip[i:i + 1], demand[i:i + 1], capacity)
+        assert both['water_stress_index'][i] == pytest.approx(single['water_stress_index'][0])
+
+
+def test_simulate_payloads_matches_single_field_path():
+    rng = np.random.default_rng(3)
+    payloads = [_payload(rng.uniform(0, 10, 40).round(2), rng.uniform(2, 6, 40).round(2),
+                         rng.uniform(0.2, 0.8, 40).round(2)) for _ in range(3)]
+    capacities = np.array([60.0, 100.0, 150.0])
+    batch = water_balance.simulate_payloads(payloads, capacities)
+    for i, payload in enumerate(payloads):
+        precip, demand, initial = water_balance.inputs_from_payload(payload)
+        single = simulate(precip[None, :], demand[None, :], capacities[i], initial)
+        assert batch['water_stress_index'][i] == pytest.approx(single['water_stress_index'][0])
+
+
+def test_season_window_is_bounded():
+    latest = datetime.strptime(water_balance.recent_window()[1], '%Y%m%d')
+    start, end = water_balance.season_window(latest - timedelta(days=100))
+    assert end == latest.strftime('%Y%m%d')
+    assert water_balance.season_window(latest + timedelta(days=5)) is None
+    with pytest.raises(ValueError):
+        water_balance.season_window(latest - timedelta(days=water_balance.WATER_BALANCE_MAX_DAYS + 30))
@@ -0,0 +1,190 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+import nasa_archive
+import water_balance
+
+# Upstream lookups off: these tests only exercise request validation and the local model
+OFFLINE = {'use_live_weather': False, 'use_nasa_data': False}
+
+
+@pytest.mark.parametrize('body', [
+    {'columns': {'crop': 'wheat', 'state': ['Punjab']}},
+    {'columns': {'crop': ['wheat'], 'state': 'Punjab'}},
+    {'columns': ['wheat']},
+    {'fields': 'wheat'},
+    {'fields': ['wheat']},
+    {'columns': {'crop': ['wheat', 'rice'], 'state': ['Punjab']}},
+])
+def test_batch_rejects_malformed_columns(yield_client, body):
+    response = yield_client.post('/api/yield/predict/batch', json=dict(body, **OFFLINE))
+    assert response.status_code == 400
+
+
+def test_batch_accepts_columns_and_fields_alike(yield_client):
+    columns = yield_client.post('/api/yield/predict/batch', json=dict(
+        {'columns': {'crop': ['wheat', 'rice'], 'state': ['Punjab', 'Kerala'], 'nitrogen': [120, None]}},
+        **OFFLINE)).get_json()
+    fields = yield_client.post('/api/yield/predict/batch', json=dict(
+        {'fields': [{'crop': 'wheat', 'state': 'Punjab', 'nitrogen': 120}, {'crop': 'rice', 'state': 'Kerala'}]},
+        **OFFLINE)).get_json()
+    assert columns['results'] == fields['results']
+    assert columns['failed'] == 0
+
+
+SWEEP = dict({'crop': 'wheat', 'state': 'Punjab'}, **OFFLINE)
+
+
+@pytest.mark.parametrize('ranges', [
+    {'nitrogen': {'min': 0, 'max': 100, 'steps': 10 ** 12}},
+    {'nitrogen': {'min': 0, 'max': 100, 'steps': 2000}, 'ph': {'min': 5, 'max': 8, 'steps': 2000}},
+    {'nitrogen': {'min': 0, 'max': 100, 'steps': 2.5}},
+    {'nitrogen': {'min': 0, 'max': 100, 'steps': '5'}},
+    {'nitrogen': {'min': 0, 'max': 100, 'steps': 0}},
+    {'nitrogen': {'max': 100}},
+    {'nitrogen': []},
+    {'area': [1, 2]},
+])
+def test_sweep_rejects_invalid_or_oversized_grids(yield_client, ranges):
+    response = yield_client.post('/api/yield/sweep', json=dict(SWEEP, ranges=ranges))
+    assert response.status_code == 400
+
+
+def test_sweep_broadcasts_axes(yield_client):
+    data = yield_client.post('/api/yield/sweep', json=dict(
+        SWEEP, ranges={'nitrogen': {'min': 0, 'max': 200, 'steps': 5}, 'ph': [5.5, 6.5, 7.5]})).get_json()
+    assert data['shape'] == [5, 3]
+    assert len(data['predicted_yield']) == 5 and len(data['predicted_yield'][0]) == 3
+
+
+@pytest.mark.parametrize('extra', [
+    {'step': 0},
+    {'step': -2.5},
+    {'step': 1e-9},
+    {'caps': {'nitrogen': 1e300}},
+    {'caps': {'nitrogen': -1}},
+    {'objective': 'profit'},
+])
+def test_fertilizer_rejects_invalid_or_oversized_searches(yield_client, extra):
+    response = yield_client.post('/api/yield/fertilizer/optimize', json=dict(SWEEP, **extra))
+    assert response.status_code == 400
+
+
+def test_fertilizer_optimum_stays_within_caps_and_budget(yield_client):
+    data = yield_client.post('/api/yield/fertilizer/optimize', json=dict(
+        SWEEP, step=5, budget=2000, caps={'nitrogen': 100, 'phosphorus': 50, 'potassium': 50})).get_json()
+    best = data['optimum']
+    assert best['fertilizer_cost_per_ha'] <= 2000
+    assert best['dose']['nitrogen'] <= 100 and best['dose']['phosphorus'] <= 50
+
+
+def test_fertilizer_doses_never_pass_a_cap_off_the_step_grid(yield_client):
+    data = yield_client.post('/api/yield/fertilizer/optimize', json=dict(
+        SWEEP, step=4, caps={'nitrogen': 10, 'phosphorus': 10, 'potassium': 10})).get_json()
+    assert all(dose <= 10 for dose in data['optimum']['dose'].values())
+    assert data['marginal_returns']['nitrogen']['dose'] == [0.0, 4.0, 8.0]
+    assert data['search']['candidates'] == 27
+
+
+@pytest.mark.parametrize('sowing_date', [20260701, '2026/07/01', '2026-13-01', ['2026-07-01']])
+def test_predict_rejects_malformed_sowing_dates(yield_client, sowing_date):
+    for nasa in (True, False):
+        response = yield_client.post('/api/yield/predict', json={
+            'crop': 'wheat', 'state': 'Punjab', 'probabilistic': True, 'sowing_date': sowing_date,
+            'use_live_weather': False, 'use_nasa_data': nasa})
+        assert response.status_code == 400
+
+
+def test_predict_rejects_seasons_longer_than_the_water_balance_bound(yield_client):
+    response = yield_client.post('/api/yield/predict', json={
+        'crop': 'wheat', 'state': 'Punjab', 'sowing_date': '1990-01-01', 'use_live_weather': False})
+    assert response.status_code == 400
+
+
+def test_sampled_weather_moves_the_season_terms():
+    import numpy as np
+    import yield_uncertainty
+    import yield_vector
+
+    climate = yield_uncertainty.SeasonClimate('seasonal', 10, np.array([600.0, 27.0, 65.0]),
+                                              np.diag([150.0 ** 2, 2.0 ** 2, 25.0]), '20260101')
+    rainfall, temperature, humidity = yield_uncertainty.sample_weather(climate, 5000, seed=1)
+    stress = yield_uncertainty.perturb_water_stress(climate, rainfall, 800.0, 0.3)
+    assert stress.std() > 0.01 and 0 <= stress.min() and stress.max() <= 1
+    # Drier draws are more stressed
+    assert stress[rainfall < 450].mean() > stress[rainfall > 750].mean()
+    # The phenology factor scales the sampled temperatures' factor instead of replacing it
+    weather = yield_vector.weather_factor(rainfall, temperature, humidity, 800.0, stress, 0.9)
+    assert weather[temperature > 31].mean() < weather[(temperature > 24) & (temperature < 29)].mean()
+
+
+def test_coordinates_outside_india_are_rejected(yield_client):
+    paris = {'lat': 48.85, 'lon': 2.35}
+    assert yield_client.get('/api/yield/locate', query_string=paris).status_code == 400
+    response = yield_client.post('/api/yield/predict', json=dict({'crop': 'wheat'}, **paris, **OFFLINE))
+    assert response.status_code == 400
+    assert 'outside' in response.get_json()['error']
+    response = yield_client.post('/api/yield/compare', json=dict({'crops': ['wheat', 'rice']}, **paris, **OFFLINE))
+    assert response.status_code == 400
+
+
+def test_locate_resolves_an_indian_field(yield_client):
+    response = yield_client.get('/api/yield/locate', query_string={'lat': 30.9, 'lon': 75.85})
+    assert response.status_code == 200
+    assert response.get_json()['location']['state'] == 'Punjab'
+
+
+@pytest.fixture
+def dry_season(monkeypatch):
+    """NASA fetches return a rainless, high-demand season; yields a sowing_date 40 days back"""
+    def fetch(lat, lon, start, end, parameters):
+        first = datetime.strptime(start, '%Y%m%d')
+        days = [(first + timedelta(days=i)).strftime('%Y%m%d')
+                for i in range((datetime.strptime(end, '%Y%m%d') - first).days + 1)]
+        values = {'PRECTOTCORR': 0.0, 'EVPTRNS': 6.0, 'GWETROOT': 0.3, 'T2M': 25.0, 'RH2M': 65.0}
+        return {param: {day: values.get(param, 1.0) for day in days} for param in parameters}
+    monkeypatch.setattr(nasa_archive, 'fetch_daily_parameters', fetch)
+    latest = datetime.strptime(water_balance.recent_window()[1], '%Y%m%d')
+    return (latest - timedelta(days=40)).strftime('%Y-%m-%d')
+
+
+def test_rainfall_input_counts_without_a_sowing_date(yield_client, dry_season):
+    field = {'crop': 'wheat', 'state': 'Punjab', 'use_live_weather': False}
+    dry, wet = (yield_client.post('/api/yield/predict', json=dict(field, rainfall=rainfall)).get_json()
+                for rainfall in (300, 900))
+    assert 'water_balance' not in dry
+    assert dry['prediction']['predicted_yield'] < wet['prediction']['predicted_yield']
+
+
+def test_every_endpoint_applies_the_same_water_stress(yield_client, dry_season):
+    field = {'state': 'Punjab', 'use_live_weather': False, 'sowing_date': dry_season}
+    stress = yield_client.post('/api/yield/predict', json=dict(field, crop='wheat')).get_json()[
+        'water_balance']['water_stress_index']
+    assert stress > 0.5
+
+    ranking = yield_client.post('/api/yield/compare', json=dict(field, crops=['wheat', 'rice'])).get_json()['ranking']
+    assert [row['factors']['water_stress_index'] for row in ranking if row['crop'] == 'Wheat'] == [stress]
+    sweep = yield_client.post('/api/yield/sweep', json=dict(field, crop='wheat', ranges={'nitrogen': [60, 120]}))
+    assert sweep.get_json()['factors']['water_stress_index'] == stress
+    optimum = yield_client.post('/api/yield/fertilizer/optimize', json=dict(field, crop='wheat', step=20))
+    assert optimum.get_json()['factors']['water_stress_index'] == stress
+    batch = yield_client.post('/api/yield/predict/batch', json=dict(
+        fields=[{'crop': 'wheat', 'state': 'Punjab'}], use_live_weather=False, sowing_date=dry_season)).get_json()
+    assert batch['results'][0]['factors']['water_stress_index'] == stress
+
+    rainfall_sweep = yield_client.post('/api/yield/sweep', json=dict(field, crop='wheat', ranges={'rainfall': [300, 900]}))
+    assert rainfall_sweep.status_code == 400
+
+
+@pytest.mark.parametrize('crops', [5, 'wheat', [], ['wheat', 3], [''], {'wheat': 1}])
+def test_compare_rejects_malformed_crop_lists(yield_client, crops):
+    response = yield_client.post('/api/yield/compare', json=dict({'state': 'Punjab', 'crops': crops}, **OFFLINE))
+    assert response.status_code == 400
+    assert 'crops' in response.get_json()['error']
+
+
+def test_compare_ranks_the_requested_crops(yield_client):
+    data = yield_client.post('/api/yield/compare', json=dict({'state': 'Punjab', 'crops': ['Wheat', 'rice']},
+                                                             **OFFLINE)).get_json()
+    assert sorted(row['crop'] for row in data['ranking']) == ['Rice', 'Wheat']
@@ -0,0 +1,57 @@
+from datetime import datetime, timedelta
+
+import numpy as np
+
+import nasa_archive
+import yield_uncertainty
+
+
+def synthetic_history(calls):
+    """fetch_daily_parameters stand-in: seasonal daily weather with a wet/dry signal per year"""
+    def fetch(lat, lon, start, end, parameters):
+        calls.append((start, end))
+        day = datetime.strptime(start, '%Y%m%d')
+        last = datetime.strptime(end, '%Y%m%d')
+        rng = np.random.default_rng(int(start))
+        raw = {param: {} for param in parameters}
+        while day <= last:
+            wet = 1.0 + 0.4 * np.sin(day.year)
+            season = np.sin(2 * np.pi * day.timetuple().tm_yday / 365)
+            values = {'PRECTOTCORR': max(0.0, 4 * wet * (1 + season) + rng.normal(0, 1)),
+                      'T2M': 26 + 6 * season - 2 * (wet - 1) + rng.normal(0, 1),
+                      'RH2M': 60 + 15 * season + rng.normal(0, 3)}
+            key = day.strftime('%Y%m%d')
+            for param in parameters:
+                raw[param][key] = round(float(values.get(param, 1.0)), 2)
+            day += timedelta(days=1)
+        return raw
+    return fetch
+
+
+def test_seasonal_climate_is_fit_from_history_synced_into_the_archive(monkeypatch):
+    calls = []
+    monkeypatch.setattr(nasa_archive, 'fetch_daily_parameters', synthetic_history(calls))
+    climate = yield_uncertainty.season_climate(21.25, 78.5, '0615', 120)
+    assert climate is not None and climate.method == 'seasonal'
+    assert climate.years >= yield_uncertainty.MC_MIN_YEARS
+    assert len(calls) == 1
+    # Wet years run cooler in the synthetic history
+    assert climate.cov[0, 1] < 0
+
+    # A second season at the same point reads the archive without downloading again
+    assert yield_uncertainty.season_climate(21.25, 78.5, '1101', 90).method == 'seasonal'
+    assert len(calls) == 1
+
+
+def test_short_history_yields_no_climate(monkeypatch):
+    monkeypatch.setattr(nasa_archive, 'fetch_daily_parameters', lambda *args: None)
+    assert yield_uncertainty.season_climate(22.75, 79.5, '0615', 120) is None
+
+
+def test_predict_reports_an_unavailable_climatology(yield_client, monkeypatch):
+    monkeypatch.setattr(nasa_archive, 'fetch_daily_parameters', lambda *args: None)
+    data = yield_client.post('/api/yield/predict', json={
+        'crop': 'rice', 'state': 'Kerala', 'probabilistic': True,
+        'use_live_weather': False, 'use_nasa_data': False}).get_json()
+    assert data['success']
+    assert data['distribution']['method'] == 'unavailable'
@@ -0,0 +1,64 @@
+import numpy as np
+import pytest
+
+import yield_prediction
+from yield_prediction import CROP_REGISTRY, STATE_FACTORS, _score_vector, predict_yield
+
+FIELDS = 500
+
+
+@pytest.fixture(scope='module')
+def fields():
+    rng = np.random.default_rng(11)
+    crops = rng.choice(CROP_REGISTRY.names, FIELDS)
+    states = rng.choice(list(STATE_FACTORS), FIELDS)
+    inputs = {
+        'nitrogen': rng.uniform(0, 250, FIELDS).round(1),
+        'phosphorus': rng.uniform(0, 120, FIELDS).round(1),
+        'potassium': rng.uniform(0, 120, FIELDS).round(1),
+        'ph': rng.uniform(4, 9, FIELDS).round(2),
+        'rainfall': rng.uniform(0, 3000, FIELDS).round(0),
+        'temperature': rng.uniform(5, 45, FIELDS).round(1),
+        'humidity': rng.uniform(10, 100, FIELDS).round(0),
+        'area': rng.uniform(0.5, 10, FIELDS).round(1),
+    }
+    water_stress = np.where(rng.random(FIELDS) < 0.5, np.nan, rng.uniform(0, 1, FIELDS).round(3))
+    phenology = np.where(rng.random(FIELDS) < 0.5, np.nan, rng.uniform(0.6, 1, FIELDS).round(3))
+    nasa_factor = np.where(rng.random(FIELDS) < 0.5, 1.0, rng.uniform(0.85, 1.1, FIELDS).round(3))
+    return crops, states, inputs, water_stress, phenology, nasa_factor
+
+
+def test_vectorized_model_matches_scalar_predict_yield(fields):
+    crops, states, inputs, water_stress, phenology, nasa_factor = fields
+    state_factor = np.array([STATE_FACTORS[state] for state in states])
+    vector = _score_vector(CROP_REGISTRY.lookup(crops), inputs, state_factor, nasa_factor, water_stress, phenology)
+
+    for i in range(FIELDS):
+        scalar, error = predict_yield(
+            crops[i], states[i], *(float(inputs[key][i]) for key in
+                                   ('nitrogen', 'phosphorus', 'potassium', 'ph', 'rainfall', 'temperature',
+                                    'humidity', 'area')),
+            float(nasa_factor[i]),
+            None if np.isnan(water_stress[i]) else float(water_stress[i]),
+            None if np.isnan(phenology[i]) else float(phenology[i]))
+        assert error is None
+        # np.round and round() may differ in the last digit of a half-way value
+        assert vector['predicted_yield'][i] == pytest.approx(scalar['predicted_yield'], abs=0.011)
+        assert vector['total_yield'][i] == pytest.approx(scalar['total_yield'], abs=0.011)
+        assert vector['confidence'][i] == pytest.approx(scalar['confidence'], abs=0.11)
+        assert vector['category'][i] == scalar['category']
+        assert vector['soil_factor'][i] == pytest.approx(scalar['factors']['soil_factor'], abs=0.011)
+        assert vector['weather_factor'][i] == pytest.approx(scalar['factors']['weather_factor'], abs=0.011)
+
+
+def test_registry_lookup_is_case_insensitive_and_marks_unknown_crops():
+    codes = CROP_REGISTRY.lookup(['Wheat', 'RICE', 'dragonfruit'])
+    assert codes.tolist() == [CROP_REGISTRY.index['wheat'], CROP_REGISTRY.index['rice'], -1]
+    assert np.isnan(CROP_REGISTRY.avg_yield[-1])
+
+
+def test_registry_rows_mirror_the_crop_table():
+    for name, data in yield_prediction.CROP_YIELD_DATA.items():
+        row = CROP_REGISTRY.row(name)
+        assert row.avg_yield == data['avg_yield']
+        assert (row.ph_min, row.ph_max) == tuple(data['optimal_ph'])
@@ -0,0 +1,180 @@
+"""
+Upstream Response Caches
+In-memory caches and single-flight groups for third-party API results, with
+hit/miss counters. Data that must survive restarts (NASA POWER daily
+values) lives in the nasa_archive SQLite store instead.
+"""
+import threading
+import time
+
+import http_client
+
+# Every cache and single-flight group registers itself here so stats can be
+# reported in one place
+CACHES = {}
+FLIGHTS = {}
+
+
+class TTLCache:
+    """Thread-safe TTL cache with stale-while-revalidate
+
+    Entries younger than ttl are served as fresh hits. Entries older than ttl
+    but younger than ttl + stale_ttl are served immediately while a single
+    background refresh replaces them. Anything older is a miss and is loaded
+    inline. Loaders returning None are treated as failures and not cached.
+    """
+
+    def __init__(self, name, ttl, stale_ttl=0):
+        self.name = name
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self._data = {}
+        self._refreshing = set()
+        self._lock = threading.Lock()
+        self._counters = {'hits': 0, 'stale_hits': 0, 'misses': 0, 'refreshes': 0, 'refresh_errors': 0}
+        CACHES[name] = self
+
+    def _count(self, counter):
+        with self._lock:
+            self._counters[counter] += 1
+
+    def get(self, key):
+        """Return a fresh cached value or None"""
+        entry = self._data.get(key)
+        if entry and time.time() - entry[1] < self.ttl:
+            return entry[0]
+        return None
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = (value, time.time())
+
+    def get_or_load(self, key, loader):
+        """Return the cached value for key, calling loader() on a miss"""
+        entry = self._data.get(key)
+        if entry:
+            age = time.time() - entry[1]
+            if age < self.ttl:
+                self._count('hits')
+                return entry[0]
+            if age < self.ttl + self.stale_ttl:
+                self._count('stale_hits')
+                self._refresh_in_background(key, loader)
+                return entry[0]
+
+        self._count('misses')
+        value = loader()
+        if value is not None:
+            self.set(key, value)
+        return value
+
+    def _refresh_in_background(self, key, loader):
+        with self._lock:
+            if key in self._refreshing:
+                return
+            self._refreshing.add(key)
+        http_client.submit(self._refresh, key, loader)
+
+    def _refresh(self, key, loader):
+        try:
+            value = loader()
+            if value is not None:
+                self.set(key, value)
+                self._count('refreshes')
+            else:
+                self._count('refresh_errors')
+        except Exception as e:
+            print(f"[Cache:{self.name}] Background refresh failed for {key}: {e}")
+            self._count('refresh_errors')
+        finally:
+            with self._lock:
+                self._refreshing.discard(key)
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._counters)
+            stats['entries'] = len(self._data)
+        lookups = stats['hits'] + stats['stale_hits'] + stats['misses']
+        stats['hit_rate'] = round((stats['hits'] + stats['stale_hits']) / lookups, 3) if lookups else 0.0
+        stats['ttl'] = self.ttl
+        stats['stale_ttl'] = self.stale_ttl
+        return stats
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+class _Call:
+    """One in-flight upstream call that followers can wait on"""
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """Coalesce concurrent identical upstream calls into one
+
+    The first caller for a key runs the function; callers arriving while it
+    is still in flight wait for and share its result (or its exception).
+    Nothing is remembered once the call completes - pair with a cache for that.
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self._calls = {}
+        self._lock = threading.Lock()
+        self._counters = {'executed': 0, 'coalesced': 0, 'errors': 0}
+        FLIGHTS[name] = self
+
+    def do(self, key, func):
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = _Call()
+                self._calls[key] = call
+                self._counters['executed'] += 1
+            else:
+                self._counters['coalesced'] += 1
+
+        if not leader:
+            # Followers only wait as long as their own request budget allows
+            if not call.event.wait(http_client.remaining_budget()):
+                raise http_client.DeadlineExceeded(f"Gave up waiting on in-flight {self.name} call")
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = func()
+            return call.result
+        except Exception as e:
+            call.error = e
+            with self._lock:
+                self._counters['errors'] += 1
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.event.set()
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._counters)
+            stats['in_flight'] = len(self._calls)
+        total = stats['executed'] + stats['coalesced']
+        stats['coalesce_rate'] = round(stats['coalesced'] / total, 3) if total else 0.0
+        return stats
+
+
+def all_stats():
+    """Stats for every registered cache, keyed by cache name"""
+    return {name: cache.stats() for name, cache in CACHES.items()}
+
+
+def flight_stats():
+    """Coalescing counters for every single-flight group, keyed by group name"""
+    return {name: flight.stats() for name, flight in FLIGHTS.items()}
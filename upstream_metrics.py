@@ -0,0 +1,213 @@
+"""
+Upstream Metrics
+Latency histograms, status codes, timeouts and payload sizes for every
+outbound call (per provider and endpoint), plus per-route timings that split
+each request into time spent waiting on upstreams and time spent in our code.
+
+Calls refused before reaching the provider (open circuit, spent request
+budget) are counted under their own outcome and kept out of the latency
+histograms.
+"""
+import contextvars
+import os
+import threading
+import time
+from urllib.parse import urlsplit
+
+import requests
+
+# Histogram bucket upper bounds in seconds; the last bucket is +Inf
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+# Requests slower than this are logged with their upstream breakdown
+SLOW_REQUEST_SECONDS = float(os.getenv('SLOW_REQUEST_SECONDS', 5))
+
+# Upstream seconds per provider and (start, end) intervals of the upstream
+# calls made while serving the current request
+_request_upstream = contextvars.ContextVar('request_upstream', default=None)
+
+_lock = threading.Lock()
+_upstream = {}
+_routes = {}
+_started_at = time.time()
+
+
+class Histogram:
+    """Fixed-bucket latency histogram (not thread-safe; guarded by _lock)"""
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, seconds):
+        for i, bound in enumerate(self.buckets):
+            if seconds <= bound:
+                self.counts[i] += 1
+                break
+        else:
+            self.counts[-1] += 1
+        self.count += 1
+        self.sum += seconds
+        self.max = max(self.max, seconds)
+
+    def quantile(self, q):
+        """Upper bound of the bucket holding the q-th observation"""
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        for i, n in enumerate(self.counts):
+            seen += n
+            if seen >= rank:
+                return self.buckets[i] if i < len(self.buckets) else self.max
+        return self.max
+
+    def snapshot(self):
+        bounds = [str(b) for b in self.buckets] + ['+Inf']
+        return {
+            'count': self.count,
+            'sum_seconds': round(self.sum, 3),
+            'mean_ms': round(self.sum / self.count * 1000, 1) if self.count else None,
+            'max_ms': round(self.max * 1000, 1),
+            'p50_le_ms': _ms(self.quantile(0.5)),
+            'p95_le_ms': _ms(self.quantile(0.95)),
+            'p99_le_ms': _ms(self.quantile(0.99)),
+            'buckets': dict(zip(bounds, self.counts)),
+        }
+
+
+def _ms(seconds):
+    return round(seconds * 1000, 1) if seconds is not None else None
+
+
+def _endpoint(url):
+    parts = urlsplit(url)
+    return f"{parts.netloc}{parts.path}"
+
+
+# Outcomes of calls that never reached the provider
+_REFUSED = ('circuit_open', 'deadline')
+
+
+def _outcome(error):
+    if error is None:
+        return 'ok'
+    if type(error).__name__ == 'CircuitOpenError':
+        return 'circuit_open'
+    if type(error).__name__ == 'DeadlineExceeded':
+        return 'deadline'
+    if isinstance(error, requests.Timeout):
+        return 'timeout'
+    return 'error'
+
+
+def _union_seconds(intervals):
+    """Total time covered by possibly overlapping (start, end) intervals"""
+    total = 0.0
+    covered_until = None
+    for start, end in sorted(intervals):
+        if covered_until is None or start > covered_until:
+            total += end - start
+            covered_until = end
+        elif end > covered_until:
+            total += end - covered_until
+            covered_until = end
+    return total
+
+
+def record_call(provider, url, elapsed, status=None, payload_bytes=None, error=None):
+    """Record one outbound call; error is the exception raised, if any"""
+    key = (provider, _endpoint(url))
+    outcome = _outcome(error)
+    ended = time.time()
+    with _lock:
+        stats = _upstream.get(key)
+        if stats is None:
+            stats = _upstream[key] = {
+                'calls': 0, 'ok': 0, 'timeout': 0, 'error': 0, 'circuit_open': 0, 'deadline': 0,
+                'status_codes': {}, 'payload_bytes': 0, 'latency': Histogram(),
+            }
+        stats['calls'] += 1
+        stats[outcome] += 1
+        if status is not None:
+            stats['status_codes'][str(status)] = stats['status_codes'].get(str(status), 0) + 1
+        if payload_bytes:
+            stats['payload_bytes'] += payload_bytes
+        if outcome not in _REFUSED:
+            stats['latency'].observe(elapsed)
+
+    per_request = _request_upstream.get()
+    if per_request is not None and outcome not in _REFUSED:
+        with _lock:
+            per_request['seconds'][provider] = per_request['seconds'].get(provider, 0.0) + elapsed
+            per_request['intervals'].append((ended - elapsed, ended))
+
+
+def begin_request():
+    """Start attributing upstream time to the current request; returns a reset token"""
+    return _request_upstream.set({'seconds': {}, 'intervals': []})
+
+
+def end_request(token, route, status, elapsed):
+    """Record a finished request and how much of it was spent on upstream calls"""
+    per_request = _request_upstream.get() or {'seconds': {}, 'intervals': []}
+    _request_upstream.reset(token)
+    with _lock:
+        intervals = list(per_request['intervals'])
+    per_request = per_request['seconds']
+    # Fan-out calls overlap, so only wall time covered by some upstream call counts
+    upstream = _union_seconds(intervals)
+
+    with _lock:
+        stats = _routes.get(route)
+        if stats is None:
+            stats = _routes[route] = {
+                'requests': 0, 'status_codes': {}, 'upstream_seconds': {},
+                'latency': Histogram(), 'own_latency': Histogram(),
+            }
+        stats['requests'] += 1
+        stats['status_codes'][str(status)] = stats['status_codes'].get(str(status), 0) + 1
+        for provider, seconds in per_request.items():
+            stats['upstream_seconds'][provider] = stats['upstream_seconds'].get(provider, 0.0) + seconds
+        stats['latency'].observe(elapsed)
+        stats['own_latency'].observe(max(0.0, elapsed - upstream))
+
+    if elapsed >= SLOW_REQUEST_SECONDS:
+        breakdown = ', '.join(f"{p} {s:.2f}s" for p, s in sorted(per_request.items())) or 'none'
+        print(f"[Metrics] Slow request {route} took {elapsed:.2f}s (upstream: {breakdown})")
+
+
+def snapshot():
+    """Metrics for every provider/endpoint and route seen since startup"""
+    with _lock:
+        upstream = {}
+        for (provider, endpoint), stats in sorted(_upstream.items()):
+            entry = {k: v for k, v in stats.items() if k not in ('latency', 'status_codes')}
+            entry['status_codes'] = dict(stats['status_codes'])
+            entry['latency'] = stats['latency'].snapshot()
+            upstream.setdefault(provider, {})[endpoint] = entry
+
+        routes = {}
+        for route, stats in sorted(_routes.items()):
+            routes[route] = {
+                'requests': stats['requests'],
+                'status_codes': dict(stats['status_codes']),
+                'upstream_seconds': {p: round(s, 3) for p, s in stats['upstream_seconds'].items()},
+                'latency': stats['latency'].snapshot(),
+                'own_latency': stats['own_latency'].snapshot(),
+            }
+
+    return {
+        'uptime_seconds': round(time.time() - _started_at, 1),
+        'upstream': upstream,
+        'routes': routes,
+    }
+
+
+def reset():
+    with _lock:
+        _upstream.clear()
+        _routes.clear()
@@ -0,0 +1,133 @@
+"""
+Upstream Record/Replay Transport
+A requests transport adapter that records real upstream responses to fixture
+files and replays them offline with configurable latency, jitter and errors,
+so performance tests are repeatable without touching the network.
+
+UPSTREAM_MODE=live    normal network access (default)
+UPSTREAM_MODE=record  call the real provider and save every response
+UPSTREAM_MODE=replay  serve saved responses only; no network
+"""
+import hashlib
+import io
+import json
+import os
+import random
+import time
+from urllib.parse import parse_qsl, urlencode, urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+from requests.structures import CaseInsensitiveDict
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+UPSTREAM_MODE = os.getenv('UPSTREAM_MODE', 'live').lower()
+UPSTREAM_FIXTURES_DIR = os.getenv('UPSTREAM_FIXTURES_DIR', os.path.join(BASE_DIR, 'fixtures', 'upstream'))
+
+# Replay shaping; each can be overridden per provider, e.g. NASA_POWER_REPLAY_LATENCY_MS
+REPLAY_LATENCY_MS = float(os.getenv('UPSTREAM_REPLAY_LATENCY_MS', 0))
+REPLAY_JITTER_MS = float(os.getenv('UPSTREAM_REPLAY_JITTER_MS', 0))
+REPLAY_ERROR_RATE = float(os.getenv('UPSTREAM_REPLAY_ERROR_RATE', 0))
+# 'exception' raises a connection error, 'status' returns HTTP 503
+REPLAY_ERROR_MODE = os.getenv('UPSTREAM_REPLAY_ERROR_MODE', 'exception')
+
+# Query parameters that carry credentials - never part of a fixture key or file
+SECRET_PARAMS = {'appid', 'api-key', 'api_key', 'apikey', 'key', 'token'}
+
+
+def _provider_setting(provider, name, default):
+    return os.getenv(f'{provider.upper()}_{name}', default)
+
+
+def _canonical_request(request):
+    """Method, URL without credentials and a body digest - stable across runs"""
+    parts = urlsplit(request.url)
+    query = sorted((k, v) for k, v in parse_qsl(parts.query, keep_blank_values=True) if k.lower() not in SECRET_PARAMS)
+    url = f"{parts.scheme}://{parts.netloc}{parts.path}"
+    if query:
+        url += '?' + urlencode(query)
+    body = request.body or b''
+    if isinstance(body, str):
+        body = body.encode('utf-8')
+    return {
+        'method': request.method,
+        'url': url,
+        'body_sha1': hashlib.sha1(body).hexdigest() if body else None,
+    }
+
+
+def fixture_path(provider, request):
+    canonical = _canonical_request(request)
+    digest = hashlib.sha1(json.dumps(canonical, sort_keys=True).encode('utf-8')).hexdigest()[:16]
+    return os.path.join(UPSTREAM_FIXTURES_DIR, provider, f'{digest}.json'), canonical
+
+
+class ReplayAdapter(HTTPAdapter):
+    """Transport adapter that records to or replays from fixture files"""
+
+    def __init__(self, provider, mode=UPSTREAM_MODE, **kwargs):
+        self.provider = provider
+        self.mode = mode
+        self.latency_ms = float(_provider_setting(provider, 'REPLAY_LATENCY_MS', REPLAY_LATENCY_MS))
+        self.jitter_ms = float(_provider_setting(provider, 'REPLAY_JITTER_MS', REPLAY_JITTER_MS))
+        self.error_rate = float(_provider_setting(provider, 'REPLAY_ERROR_RATE', REPLAY_ERROR_RATE))
+        self.error_mode = _provider_setting(provider, 'REPLAY_ERROR_MODE', REPLAY_ERROR_MODE)
+        super().__init__(**kwargs)
+
+    def send(self, request, **kwargs):
+        if self.mode == 'record':
+            response = super().send(request, **kwargs)
+            self._record(request, response)
+            return response
+        return self._replay(request, kwargs.get('timeout'))
+
+    def _record(self, request, response):
+        path, canonical = fixture_path(self.provider, request)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fixture = {
+            'request': canonical,
+            'status': response.status_code,
+            'headers': {'Content-Type': response.headers.get('Content-Type', 'application/json')},
+            'body': response.text,
+            'recorded_at': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        }
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(fixture, f, ensure_ascii=False)
+
+    def _delay(self, timeout):
+        delay = max(0.0, self.latency_ms + random.uniform(-self.jitter_ms, self.jitter_ms)) / 1000
+        read_timeout = timeout[1] if isinstance(timeout, tuple) else timeout
+        if read_timeout is not None and delay > read_timeout:
+            time.sleep(read_timeout)
+            raise requests.exceptions.ReadTimeout(f"[Replay] {self.provider} read timed out ({read_timeout}s)")
+        time.sleep(delay)
+
+    def _replay(self, request, timeout):
+        self._delay(timeout)
+
+        if self.error_rate and random.random() < self.error_rate:
+            if self.error_mode == 'status':
+                return self._build(request, 503, {'Content-Type': 'text/plain'}, 'Injected upstream error')
+            raise requests.exceptions.ConnectionError(f"[Replay] Injected {self.provider} connection error")
+
+        path, canonical = fixture_path(self.provider, request)
+        if not os.path.exists(path):
+            raise requests.exceptions.ConnectionError(
+                f"[Replay] No fixture for {canonical['method']} {canonical['url']} ({path})"
+            )
+        with open(path, encoding='utf-8') as f:
+            fixture = json.load(f)
+        return self._build(request, fixture['status'], fixture.get('headers', {}), fixture['body'])
+
+    def _build(self, request, status, headers, body):
+        response = requests.Response()
+        response.status_code = status
+        response.headers = CaseInsensitiveDict(headers)
+        # Served from raw like a real urllib3 body, so iter_content works with stream=True
+        response.raw = io.BytesIO(body.encode('utf-8'))
+        response.encoding = 'utf-8'
+        response.url = request.url
+        response.request = request
+        response.reason = 'Replayed'
+        return response
@@ -3,16 +3,18 @@ AI Voice Agent Routes - Agricultural AI Assistant powered by Google Gemini
 Multi-Language Support: Hindi, English, Marathi, Telugu, Tamil, Kannada, Bengali, Gujarati, Punjabi
 """
 from flask import Blueprint, request, jsonify
-import requests as http_requests
 import random
 import os
 
+import http_client
+
 
 voice_agent_bp = Blueprint('voice_agent', __name__)
 
 # OpenRouter API Key - Load from environment variable
 OPENROUTER_API_KEY = os.getenv('OPENROUTER_API_KEY', '')
 OPENROUTER_MODEL = os.getenv('OPENROUTER_MODEL', 'openai/gpt-3.5-turbo')
+OPENROUTER_URL = os.getenv('OPENROUTER_URL', 'https://openrouter.ai/api/v1/chat/completions')
 
 # Supported Languages with their codes and names
 SUPPORTED_LANGUAGES = {
@@ -385,7 +387,7 @@ def generate_response(message, language='en'):
         ]
     }
     try:
-        resp = http_requests.post('https://openrouter.ai/api/v1/chat/completions', headers=headers, json=data, timeout=20)
+        resp = http_client.post('openrouter', OPENROUTER_URL, headers=headers, json=data)
         if resp.status_code == 200:
             result = resp.json()
             return result['choices'][0]['message']['content'].strip()
@@ -0,0 +1,135 @@
+"""
+Soil Water Balance
+A daily root-zone bucket model driven by NASA POWER precipitation and
+evapotranspiration. State is a vector over fields and only the day loop runs
+in Python, so thousands of fields are simulated in one call.
+
+Each day: the bucket gains precipitation, loses evapotranspiration scaled by
+a FAO-56 style stress coefficient once depletion passes a crop threshold,
+and spills anything above the crop's root-zone capacity. The water-stress
+index is the share of evapotranspiration demand the crop could not meet.
+"""
+import os
+
+import numpy as np
+
+import nasa_archive
+import nasa_stats
+from nasa_power import recent_window
+
+# Fraction of root-zone capacity a crop can use before evapotranspiration
+# is limited (FAO-56 'p'); 0.5 suits most field crops
+DEPLETION_FRACTION = 0.5
+
+# Starting storage as a fraction of capacity when no GWETROOT is archived
+DEFAULT_INITIAL_FRACTION = 0.5
+
+WATER_BALANCE_PARAMETERS = ['PRECTOTCORR', 'EVPTRNS', 'GWETROOT']
+
+# Longest season simulated (sowing date to the latest published day)
+WATER_BALANCE_MAX_DAYS = int(os.getenv('WATER_BALANCE_MAX_DAYS', 366))
+
+
+def simulate(precip, demand, capacity, initial_fraction=DEFAULT_INITIAL_FRACTION,
+             depletion_fraction=DEPLETION_FRACTION):
+    """Run the bucket model for fields x days inputs (mm/day)
+
+    precip, demand: (fields, days) arrays; NaN days count as zero.
+    capacity: root-zone capacity in mm per field (scalar or (fields,)).
+    initial_fraction: starting storage as a fraction of capacity.
+    Returns per-field arrays: water_stress_index (0 = no stress, 1 = no
+    water at all), stressed_days, final_storage_mm, deficit_mm, drainage_mm.
+    """
+    precip = np.nan_to_num(np.atleast_2d(np.asarray(precip, dtype=float)))
+    demand = np.nan_to_num(np.atleast_2d(np.asarray(demand, dtype=float)))
+    fields, days = precip.shape
+    capacity = np.broadcast_to(np.asarray(capacity, dtype=float), (fields,))
+    storage = np.clip(np.broadcast_to(np.asarray(initial_fraction, dtype=float), (fields,)), 0, 1) * capacity
+    readily_available = depletion_fraction * capacity
+    stress_threshold = capacity - readily_available
+
+    actual_total = np.zeros(fields)
+    demand_total = np.zeros(fields)
+    drainage = np.zeros(fields)
+    stressed_days = np.zeros(fields, dtype=np.int64)
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        for day in range(days):
+            storage = storage + precip[:, day]
+            overflow = np.maximum(storage - capacity, 0)
+            drainage += overflow
+            storage -= overflow
+
+            # Full rate above the threshold, falling linearly to zero when empty
+            ks = np.where(storage >= stress_threshold, 1.0,
+                          np.where(stress_threshold > 0, storage / stress_threshold, 0.0))
+            actual = np.minimum(demand[:, day] * ks, storage)
+            storage -= actual
+
+            actual_total += actual
+            demand_total += demand[:, day]
+            stressed_days += actual < demand[:, day] * 0.999
+
+        stress = np.where(demand_total > 0, 1 - actual_total / demand_total, 0.0)
+
+    return {
+        'water_stress_index': np.clip(stress, 0, 1),
+        'stressed_days': stressed_days,
+        'final_storage_mm': storage,
+        'deficit_mm': demand_total - actual_total,
+        'drainage_mm': drainage,
+    }
+
+
+def inputs_from_payload(raw_data):
+    """(precip, demand, initial_fraction) for one field from a NASA daily payload"""
+    _, _, matrix = nasa_stats.to_matrix(raw_data, WATER_BALANCE_PARAMETERS)
+    wetness = matrix[:, 2]
+    valid = wetness[~np.isnan(wetness)]
+    initial = float(valid[0]) if len(valid) else DEFAULT_INITIAL_FRACTION
+    return matrix[:, 0], matrix[:, 1], initial
+
+
+def simulate_payloads(raw_payloads, capacities):
+    """Batch-simulate several fields' NASA payloads on a shared day axis"""
+    _, cube = nasa_stats.to_cube(raw_payloads, WATER_BALANCE_PARAMETERS)
+    wetness = cube[:, :, 2]
+    first_valid = np.argmax(~np.isnan(wetness), axis=1)
+    initial = wetness[np.arange(len(raw_payloads)), first_valid]
+    initial = np.where(np.isnan(initial), DEFAULT_INITIAL_FRACTION, initial)
+    return simulate(cube[:, :, 0], cube[:, :, 1], capacities, initial)
+
+
+def season_window(sowing_date):
+    """(start, end) YYYYMMDD from a sowing datetime to the latest published day
+
+    None if the crop is sown after the latest published day; ValueError if
+    the season would be longer than WATER_BALANCE_MAX_DAYS.
+    """
+    start = sowing_date.strftime('%Y%m%d')
+    end = recent_window()[1]
+    if start > end:
+        return None
+    if start < recent_window(WATER_BALANCE_MAX_DAYS - 1)[0]:
+        raise ValueError(f'sowing_date must be within {WATER_BALANCE_MAX_DAYS} days of the latest NASA POWER day')
+    return start, end
+
+
+def field_water_balance(lat, lon, capacity, start, end):
+    """Water balance for one field from the archived NASA series, or None"""
+    raw_data = nasa_archive.nasa_archive.get_window(lat, lon, start, end, WATER_BALANCE_PARAMETERS)
+    if not raw_data:
+        return None
+    precip, demand, initial = inputs_from_payload(raw_data)
+    result = simulate(precip[None, :], demand[None, :], capacity, initial)
+    return {
+        'water_stress_index': round(float(result['water_stress_index'][0]), 3),
+        'stressed_days': int(result['stressed_days'][0]),
+        'final_storage_mm': round(float(result['final_storage_mm'][0]), 1),
+        'deficit_mm': round(float(result['deficit_mm'][0]), 1),
+        'drainage_mm': round(float(result['drainage_mm'][0]), 1),
+        'capacity_mm': capacity,
+        'initial_fraction': round(initial, 3),
+        'window': [start, end],
+        'days': len(precip),
+    }
@@ -7,10 +7,10 @@ import os
 import random
 from datetime import datetime, timedelta
 
-weather_bp = Blueprint('weather', __name__)
+import drought_indices
+from openweather import OPENWEATHER_API_KEY, get_current_weather as get_owm_weather
 
-# OpenWeatherMap API key
-OPENWEATHER_API_KEY = 'b576d8a952bf4c45c7ef5bddb148e76b'
+weather_bp = Blueprint('weather', __name__)
 
 # Major Indian cities with coordinates
 INDIAN_CITIES = {
@@ -246,18 +246,9 @@ def get_current_weather():
     # Try real API if key available
     if OPENWEATHER_API_KEY:
         try:
-            import requests
-            url = "https://api.openweathermap.org/data/2.5/weather"
-            params = {
-                'lat': city_data['lat'],
-                'lon': city_data['lon'],
-                'appid': OPENWEATHER_API_KEY,
-                'units': 'metric'
-            }
-            response = requests.get(url, params=params, timeout=5)
+            data = get_owm_weather(city_data['lat'], city_data['lon'])
             
-            if response.status_code == 200:
-                data = response.json()
+            if data:
                 weather = {
                     'temperature': data['main']['temp'],
                     'feels_like': data['main']['feels_like'],
@@ -377,6 +368,33 @@ def get_weather_alerts():
             'message': 'Winds may damage crops. Support tall plants.',
         })
     
+    # Drought / wet-spell indices precomputed nightly from the NASA archive
+    drought = drought_indices.lookup('city', city)
+    if drought and drought.spi_90 is not None:
+        if drought.spi_90 <= -1.0:
+            alerts.append({
+                'severity': 'danger' if drought.spi_90 <= -1.5 else 'warning',
+                'icon': '🏜️',
+                'title': 'Drought Alert',
+                'message': f"{drought.category} conditions over the last 90 days (SPI {drought.spi_90:+.1f}). "
+                           f"Plan irrigation and prefer drought-tolerant varieties.",
+            })
+        elif drought.spi_90 >= 1.5:
+            alerts.append({
+                'severity': 'warning',
+                'icon': '🌊',
+                'title': 'Wet Spell Alert',
+                'message': f"{drought.category} conditions over the last 90 days (SPI {drought.spi_90:+.1f}). "
+                           f"Watch for waterlogging and root diseases.",
+            })
+    if drought and drought.soil_moisture_anomaly is not None and drought.soil_moisture_anomaly <= -1.5:
+        alerts.append({
+            'severity': 'warning',
+            'icon': '🛰️',
+            'title': 'Low Soil Moisture',
+            'message': f"Root-zone soil moisture is {abs(drought.soil_moisture_anomaly):.1f} SD below normal for this time of year.",
+        })
+    
     if not alerts:
         alerts.append({
             'severity': 'success',
@@ -1,7 +1,7 @@
 from flask import Blueprint, request, jsonify
 import json
+import math
 import os
-import requests
 from datetime import datetime, timedelta
 import pandas as pd
 from sklearn.model_selection import train_test_split
@@ -9,27 +9,59 @@ from sklearn.ensemble import RandomForestRegressor
 from sklearn.metrics import mean_squared_error
 import pickle
 
+import numpy as np
+
+import http_client
+import openweather
+import spatial_index
+import water_balance
+import drought_indices
+import nasa_archive
+import nasa_regional
+import nasa_stats
+import phenology
+import yield_uncertainty
+import yield_vector
+from nasa_power import recent_window
+
 yield_bp = Blueprint('yield', __name__)
 
-# OpenWeatherMap API key
-OPENWEATHER_API_KEY = 'b576d8a952bf4c45c7ef5bddb148e76b'
-
-# NASA POWER API Base URL (FREE - No API key needed!)
-NASA_POWER_BASE_URL = "https://power.larc.nasa.gov/api/temporal/daily/point"
-
-# NASA POWER Parameters for Agriculture
-NASA_AGRO_PARAMETERS = [
-    'T2M',              # Temperature at 2 meters (°C)
-    'T2M_MAX',          # Maximum Temperature (°C)
-    'T2M_MIN',          # Minimum Temperature (°C)
-    'RH2M',             # Relative Humidity (%)
-    'PRECTOTCORR',      # Precipitation (mm/day)
-    'ALLSKY_SFC_SW_DWN', # Solar Radiation (MJ/m²/day)
-    'GWETROOT',         # Root Zone Soil Wetness (0-1)
-    'GWETPROF',         # Profile Soil Wetness (0-1)
-    'EVPTRNS',          # Evapotranspiration (mm/day)
-    'WS2M',             # Wind Speed (m/s)
-]
+# Upper bound (seconds) on the /predict upstream fan-out; the request deadline
+# set in app.py caps it further - slower sources are skipped
+PREDICT_DEADLINE = float(os.getenv('YIELD_PREDICT_DEADLINE', 8))
+
+# 'point' samples the state capital; 'regional' uses the area-weighted grid
+# summaries precomputed by nasa_regional
+NASA_DEFAULT_MODE = os.getenv('NASA_DEFAULT_MODE', 'point')
+
+# Largest number of fields accepted by /predict/batch in one request
+BATCH_MAX_FIELDS = int(os.getenv('YIELD_BATCH_MAX_FIELDS', 200000))
+
+# Largest grid /sweep evaluates in one request (product of the axis lengths)
+SWEEP_MAX_POINTS = int(os.getenv('YIELD_SWEEP_MAX_POINTS', 1000000))
+
+# Default number of steps for a {min, max} sweep range
+SWEEP_DEFAULT_STEPS = 21
+
+# Fertilizer prices in ₹ per kg of nutrient (subsidised urea, DAP and MOP
+# retail prices converted to N, P2O5 and K2O); requests may override them
+FERTILIZER_PRICES = {
+    'nitrogen': float(os.getenv('FERTILIZER_PRICE_N', 13)),
+    'phosphorus': float(os.getenv('FERTILIZER_PRICE_P', 59)),
+    'potassium': float(os.getenv('FERTILIZER_PRICE_K', 57)),
+}
+
+# Default dose cap per nutrient as a multiple of the crop's optimal level,
+# the dose grid step (kg/ha) and the most candidates one request may score
+FERTILIZER_CAP_MULTIPLE = 1.5
+FERTILIZER_DOSE_STEP = float(os.getenv('FERTILIZER_DOSE_STEP', 2.5))
+FERTILIZER_MAX_CANDIDATES = int(os.getenv('FERTILIZER_MAX_CANDIDATES', 2000000))
+
+# Per-field inputs of /predict/batch and /sweep and their defaults (same as /predict)
+BATCH_DEFAULTS = {
+    'nitrogen': 80, 'phosphorus': 40, 'potassium': 40, 'ph': 6.5,
+    'rainfall': 800, 'temperature': 25, 'humidity': 70, 'area': 1,
+}
 
 # State capital cities for weather lookup
 STATE_CITIES = {
@@ -56,31 +88,39 @@ STATE_CITIES = {
 
 # ============= NASA POWER FUNCTIONS =============
 
-def get_nasa_power_data(state, days=14):
-    """Fetch agricultural data from NASA POWER API (FREE - No API key needed)"""
+def get_nasa_power_data(state, days=14, mode=None):
+    """Fetch agricultural data from NASA POWER API (FREE - No API key needed)
+
+    mode='regional' uses the precomputed area-weighted grid summary for the
+    state when one is ready, and falls back to the capital city otherwise.
+    """
     if state not in STATE_CITIES:
         return None
     
     coords = STATE_CITIES[state]
-    end_date = (datetime.now() - timedelta(days=7)).strftime('%Y%m%d')
-    start_date = (datetime.now() - timedelta(days=days+7)).strftime('%Y%m%d')
-    
-    params = {
-        'parameters': ','.join(NASA_AGRO_PARAMETERS),
-        'community': 'AG',
-        'longitude': coords['lon'],
-        'latitude': coords['lat'],
-        'start': start_date,
-        'end': end_date,
-        'format': 'JSON'
-    }
+    
+    if (mode or NASA_DEFAULT_MODE) == 'regional' and days == nasa_regional.REGIONAL_WINDOW_DAYS:
+        regional = nasa_regional.get_summary(state)
+        if regional:
+            processed = {
+                'state': state,
+                'coordinates': coords,
+                'source': 'NASA POWER (regional)',
+                'mode': 'regional',
+                'region': {
+                    'points_sampled': regional['points_sampled'],
+                    'points_total': regional['points_total'],
+                    'soil_wetness_spread': regional['spread']
+                }
+            }
+            processed.update(regional['parameters'])
+            return classify_soil_moisture(processed)
     
     try:
         print(f"[NASA POWER] Fetching data for {state}...")
-        response = requests.get(NASA_POWER_BASE_URL, params=params, timeout=30)
-        if response.status_code == 200:
-            data = response.json()
-            raw_data = data.get('properties', {}).get('parameter', {})
+        # Only days missing from the local archive are downloaded
+        raw_data = nasa_archive.get_window(coords['lat'], coords['lon'], days)
+        if raw_data:
             processed = process_nasa_data(raw_data, state, coords)
             print(f"[NASA POWER] Success! Got data for {state}")
             return processed
@@ -89,6 +129,44 @@ def get_nasa_power_data(state, days=14):
     return None
 
 
+def get_nasa_power_data_at(point, state, days=14):
+    """NASA POWER summary for an indexed archive point (see spatial_index)"""
+    coords = {'city': point['name'], 'lat': point['lat'], 'lon': point['lon']}
+    try:
+        raw_data = nasa_archive.get_window(point['lat'], point['lon'], days)
+        if raw_data:
+            processed = process_nasa_data(raw_data, state, coords)
+            processed['distance_km'] = point.get('distance_km')
+            return processed
+    except Exception as e:
+        print(f"[NASA POWER] Error at ({point['lat']}, {point['lon']}): {e}")
+    return None
+
+
+def get_phenology(crop, lat, lon, sowing_date):
+    """Growing degree days, crop stage and temperature stress since sowing (YYYYMMDD)"""
+    crop_data = CROP_YIELD_DATA.get(crop.lower())
+    if not crop_data:
+        return None
+    try:
+        return phenology.crop_phenology(lat, lon, crop_data, sowing_date)
+    except Exception as e:
+        print(f"[Phenology] Error at ({lat}, {lon}): {e}")
+    return None
+
+
+def get_water_balance(crop, lat, lon, start, end):
+    """Simulated root-zone water balance for a crop at a point over [start, end]"""
+    crop_data = CROP_YIELD_DATA.get(crop.lower())
+    if not crop_data:
+        return None
+    try:
+        return water_balance.field_water_balance(lat, lon, crop_data['root_zone_mm'], start, end)
+    except Exception as e:
+        print(f"[Water Balance] Error at ({lat}, {lon}): {e}")
+    return None
+
+
 def process_nasa_data(raw_data, state, coords):
     """Process NASA POWER data into usable format"""
     processed = {
@@ -97,16 +175,15 @@ def process_nasa_data(raw_data, state, coords):
         'source': 'NASA POWER'
     }
     
-    for param, values in raw_data.items():
-        if isinstance(values, dict):
-            valid = [v for v in values.values() if v != -999 and v is not None]
-            if valid:
-                processed[param] = {
-                    'average': round(sum(valid) / len(valid), 2),
-                    'min': round(min(valid), 2),
-                    'max': round(max(valid), 2)
-                }
-    
+    # average/min/max, percentiles and 7-day rolling means for every
+    # parameter in one vectorized pass (-999 fill values are ignored)
+    processed.update(nasa_stats.summarize(raw_data))
+    processed['mode'] = 'point'
+    return classify_soil_moisture(processed)
+
+
+def classify_soil_moisture(processed):
+    """Add the soil moisture index and condition to a processed NASA summary"""
     # Calculate soil moisture index (0-1 scale)
     root_wet = processed.get('GWETROOT', {}).get('average', 0.5)
     prof_wet = processed.get('GWETPROF', {}).get('average', 0.5)
@@ -128,8 +205,12 @@ def process_nasa_data(raw_data, state, coords):
     return processed
 
 
-def calculate_nasa_yield_factor(nasa_data, crop):
-    """Calculate yield adjustment factor based on NASA data"""
+def calculate_nasa_yield_factor(nasa_data, crop, phenology_data=None):
+    """Calculate yield adjustment factor based on NASA data
+
+    phenology_data only adds insights; its stage-weighted temperature factor
+    is applied in calculate_weather_factor.
+    """
     if not nasa_data:
         return 1.0, []
     
@@ -162,6 +243,14 @@ def calculate_nasa_yield_factor(nasa_data, crop):
         temp_factor = 0.95
     factors.append(temp_factor)
     
+    if phenology_data:
+        insights.append(f"🌱 Crop stage: {phenology_data['stage'].replace('_', ' ')} "
+                        f"({phenology_data['gdd']:.0f}/{phenology_data['gdd_maturity']} GDD)")
+        heat_days = sum(phenology_data['heat_stress_days'].values())
+        cold_days = sum(phenology_data['cold_stress_days'].values())
+        if heat_days or cold_days:
+            insights.append(f"🌡️ {heat_days} heat-stress and {cold_days} cold-stress days since sowing")
+    
     # Solar radiation factor
     solar = nasa_data.get('ALLSKY_SFC_SW_DWN', {}).get('average', 18)
     if 15 <= solar <= 22:
@@ -173,56 +262,57 @@ def calculate_nasa_yield_factor(nasa_data, crop):
         solar_factor = 1.0
     factors.append(solar_factor)
     
-    combined_factor = sum(factors) / len(factors)
+    # Drought factor from the nightly precomputed indices (constant-time lookup)
+    drought = drought_indices.lookup('state', nasa_data.get('state'))
+    drought_factor = 1.0
+    if drought and drought.spi_90 is not None:
+        if drought.spi_90 <= -1.5:
+            drought_factor = 0.8
+            insights.append(f"🏜️ NASA: {drought.category} season so far (SPI-90 {drought.spi_90:+.1f})")
+        elif drought.spi_90 <= -1.0:
+            drought_factor = 0.9
+            insights.append(f"🏜️ NASA: {drought.category} season so far (SPI-90 {drought.spi_90:+.1f})")
+        elif drought.spi_90 >= 1.5:
+            drought_factor = 0.95
+            insights.append(f"🌊 NASA: {drought.category} season so far (SPI-90 {drought.spi_90:+.1f})")
+        if drought.soil_moisture_anomaly is not None and drought.soil_moisture_anomaly <= -1.5:
+            insights.append(f"🛰️ NASA: Root-zone soil moisture well below normal "
+                            f"({drought.soil_moisture_anomaly:+.1f} SD)")
+    
+    combined_factor = sum(factors) / len(factors) * drought_factor
     return round(combined_factor, 3), insights
 
 def get_live_weather(state):
-    """Fetch live weather data for a state"""
+    """Fetch live weather data for a state (cached by coordinates)"""
     if state not in STATE_CITIES:
         return None
-    
-    city_data = STATE_CITIES[state]
-    try:
-        url = "https://api.openweathermap.org/data/2.5/weather"
-        params = {
-            'lat': city_data['lat'],
-            'lon': city_data['lon'],
-            'appid': OPENWEATHER_API_KEY,
-            'units': 'metric'
-        }
-        response = requests.get(url, params=params, timeout=5)
-        if response.status_code == 200:
-            data = response.json()
-            return {
-                'temperature': data['main']['temp'],
-                'humidity': data['main']['humidity'],
-                'condition': data['weather'][0]['main'],
-                'description': data['weather'][0]['description'],
-                'city': city_data['city'],
-                'source': 'live'
-            }
-    except Exception as e:
-        print(f"Weather API error: {e}")
-    return None
+    return openweather.get_live_weather(STATE_CITIES[state])
 
 # Crop yield data (average yields in kg/hectare for India)
+# root_zone_mm: plant-available water the root zone holds at field capacity
+# base_temp: °C below which the crop does not develop; gdd_maturity: growing
+# degree days above base_temp from sowing to maturity
 CROP_YIELD_DATA = {
-    'rice': {'avg_yield': 2500, 'optimal_n': 120, 'optimal_p': 60, 'optimal_k': 40, 'optimal_ph': (5.5, 7.0), 'water_need': 'High'},
-    'wheat': {'avg_yield': 3200, 'optimal_n': 120, 'optimal_p': 60, 'optimal_k': 40, 'optimal_ph': (6.0, 7.5), 'water_need': 'Medium'},
-    'maize': {'avg_yield': 2800, 'optimal_n': 150, 'optimal_p': 75, 'optimal_k': 50, 'optimal_ph': (5.8, 7.0), 'water_need': 'Medium'},
-    'cotton': {'avg_yield': 500, 'optimal_n': 100, 'optimal_p': 50, 'optimal_k': 50, 'optimal_ph': (6.0, 8.0), 'water_need': 'Medium'},
-    'sugarcane': {'avg_yield': 70000, 'optimal_n': 250, 'optimal_p': 100, 'optimal_k': 120, 'optimal_ph': (6.0, 7.5), 'water_need': 'High'},
-    'soybean': {'avg_yield': 1200, 'optimal_n': 25, 'optimal_p': 60, 'optimal_k': 40, 'optimal_ph': (6.0, 7.0), 'water_need': 'Medium'},
-    'groundnut': {'avg_yield': 1500, 'optimal_n': 20, 'optimal_p': 40, 'optimal_k': 50, 'optimal_ph': (6.0, 6.5), 'water_need': 'Low'},
-    'potato': {'avg_yield': 22000, 'optimal_n': 180, 'optimal_p': 100, 'optimal_k': 150, 'optimal_ph': (5.5, 6.5), 'water_need': 'High'},
-    'tomato': {'avg_yield': 25000, 'optimal_n': 150, 'optimal_p': 80, 'optimal_k': 100, 'optimal_ph': (6.0, 7.0), 'water_need': 'High'},
-    'onion': {'avg_yield': 18000, 'optimal_n': 100, 'optimal_p': 50, 'optimal_k': 80, 'optimal_ph': (6.0, 7.0), 'water_need': 'Medium'},
-    'mustard': {'avg_yield': 1200, 'optimal_n': 80, 'optimal_p': 40, 'optimal_k': 40, 'optimal_ph': (6.0, 7.5), 'water_need': 'Low'},
-    'chickpea': {'avg_yield': 1000, 'optimal_n': 20, 'optimal_p': 50, 'optimal_k': 20, 'optimal_ph': (6.0, 8.0), 'water_need': 'Low'},
-    'bajra': {'avg_yield': 1200, 'optimal_n': 60, 'optimal_p': 30, 'optimal_k': 30, 'optimal_ph': (6.5, 7.5), 'water_need': 'Low'},
-    'jowar': {'avg_yield': 1100, 'optimal_n': 80, 'optimal_p': 40, 'optimal_k': 40, 'optimal_ph': (6.0, 7.5), 'water_need': 'Low'},
+    'rice': {'avg_yield': 2500, 'optimal_n': 120, 'optimal_p': 60, 'optimal_k': 40, 'optimal_ph': (5.5, 7.0), 'water_need': 'High', 'root_zone_mm': 100, 'base_temp': 10, 'gdd_maturity': 2000},
+    'wheat': {'avg_yield': 3200, 'optimal_n': 120, 'optimal_p': 60, 'optimal_k': 40, 'optimal_ph': (6.0, 7.5), 'water_need': 'Medium', 'root_zone_mm': 150, 'base_temp': 5, 'gdd_maturity': 1600},
+    'maize': {'avg_yield': 2800, 'optimal_n': 150, 'optimal_p': 75, 'optimal_k': 50, 'optimal_ph': (5.8, 7.0), 'water_need': 'Medium', 'root_zone_mm': 160, 'base_temp': 10, 'gdd_maturity': 1500},
+    'cotton': {'avg_yield': 500, 'optimal_n': 100, 'optimal_p': 50, 'optimal_k': 50, 'optimal_ph': (6.0, 8.0), 'water_need': 'Medium', 'root_zone_mm': 180, 'base_temp': 15, 'gdd_maturity': 1800},
+    'sugarcane': {'avg_yield': 70000, 'optimal_n': 250, 'optimal_p': 100, 'optimal_k': 120, 'optimal_ph': (6.0, 7.5), 'water_need': 'High', 'root_zone_mm': 180, 'base_temp': 12, 'gdd_maturity': 4000},
+    'soybean': {'avg_yield': 1200, 'optimal_n': 25, 'optimal_p': 60, 'optimal_k': 40, 'optimal_ph': (6.0, 7.0), 'water_need': 'Medium', 'root_zone_mm': 130, 'base_temp': 10, 'gdd_maturity': 1300},
+    'groundnut': {'avg_yield': 1500, 'optimal_n': 20, 'optimal_p': 40, 'optimal_k': 50, 'optimal_ph': (6.0, 6.5), 'water_need': 'Low', 'root_zone_mm': 110, 'base_temp': 10, 'gdd_maturity': 1600},
+    'potato': {'avg_yield': 22000, 'optimal_n': 180, 'optimal_p': 100, 'optimal_k': 150, 'optimal_ph': (5.5, 6.5), 'water_need': 'High', 'root_zone_mm': 80, 'base_temp': 7, 'gdd_maturity': 1200},
+    'tomato': {'avg_yield': 25000, 'optimal_n': 150, 'optimal_p': 80, 'optimal_k': 100, 'optimal_ph': (6.0, 7.0), 'water_need': 'High', 'root_zone_mm': 100, 'base_temp': 10, 'gdd_maturity': 1400},
+    'onion': {'avg_yield': 18000, 'optimal_n': 100, 'optimal_p': 50, 'optimal_k': 80, 'optimal_ph': (6.0, 7.0), 'water_need': 'Medium', 'root_zone_mm': 60, 'base_temp': 6, 'gdd_maturity': 1500},
+    'mustard': {'avg_yield': 1200, 'optimal_n': 80, 'optimal_p': 40, 'optimal_k': 40, 'optimal_ph': (6.0, 7.5), 'water_need': 'Low', 'root_zone_mm': 140, 'base_temp': 5, 'gdd_maturity': 1300},
+    'chickpea': {'avg_yield': 1000, 'optimal_n': 20, 'optimal_p': 50, 'optimal_k': 20, 'optimal_ph': (6.0, 8.0), 'water_need': 'Low', 'root_zone_mm': 130, 'base_temp': 5, 'gdd_maturity': 1200},
+    'bajra': {'avg_yield': 1200, 'optimal_n': 60, 'optimal_p': 30, 'optimal_k': 30, 'optimal_ph': (6.5, 7.5), 'water_need': 'Low', 'root_zone_mm': 150, 'base_temp': 10, 'gdd_maturity': 1400},
+    'jowar': {'avg_yield': 1100, 'optimal_n': 80, 'optimal_p': 40, 'optimal_k': 40, 'optimal_ph': (6.0, 7.5), 'water_need': 'Low', 'root_zone_mm': 160, 'base_temp': 10, 'gdd_maturity': 1500},
 }
 
+# The same table as contiguous arrays indexed by crop; the factor functions
+# and the batch endpoints read parameters from here
+CROP_REGISTRY = yield_vector.CropRegistry(CROP_YIELD_DATA)
+
 # State-wise yield adjustment factors
 STATE_FACTORS = {
     'Punjab': 1.25, 'Haryana': 1.20, 'Uttar Pradesh': 1.10,
@@ -234,22 +324,24 @@ STATE_FACTORS = {
 }
 
 
-def calculate_soil_factor(crop, n, p, k, ph):
-    """Calculate yield factor based on soil nutrients"""
-    if crop not in CROP_YIELD_DATA:
+def calculate_soil_factor(crop, n, p, k, ph, crop_row=None):
+    """Calculate yield factor based on soil nutrients
+
+    crop_row (a CROP_REGISTRY row) skips the lookup when the caller has it.
+    """
+    crop_row = crop_row or CROP_REGISTRY.row(crop)
+    if crop_row is None:
         return 1.0
     
-    crop_data = CROP_YIELD_DATA[crop]
-    
     # NPK factor (0.5 to 1.2)
-    n_ratio = min(n / crop_data['optimal_n'], 1.2) if crop_data['optimal_n'] > 0 else 1.0
-    p_ratio = min(p / crop_data['optimal_p'], 1.2) if crop_data['optimal_p'] > 0 else 1.0
-    k_ratio = min(k / crop_data['optimal_k'], 1.2) if crop_data['optimal_k'] > 0 else 1.0
+    n_ratio = min(n / crop_row.optimal_n, 1.2) if crop_row.optimal_n > 0 else 1.0
+    p_ratio = min(p / crop_row.optimal_p, 1.2) if crop_row.optimal_p > 0 else 1.0
+    k_ratio = min(k / crop_row.optimal_k, 1.2) if crop_row.optimal_k > 0 else 1.0
     
     npk_factor = (n_ratio * 0.4 + p_ratio * 0.3 + k_ratio * 0.3)
     
     # pH factor
-    optimal_ph_min, optimal_ph_max = crop_data['optimal_ph']
+    optimal_ph_min, optimal_ph_max = crop_row.ph_min, crop_row.ph_max
     if optimal_ph_min <= ph <= optimal_ph_max:
         ph_factor = 1.0
     elif ph < optimal_ph_min:
@@ -260,21 +352,21 @@ def calculate_soil_factor(crop, n, p, k, ph):
     return npk_factor * ph_factor
 
 
-def calculate_weather_factor(crop, rainfall, temperature, humidity):
-    """Calculate yield factor based on weather conditions"""
-    if crop not in CROP_YIELD_DATA:
+def calculate_weather_factor(crop, rainfall, temperature, humidity, water_stress=None, phenology_factor=None,
+                             crop_row=None):
+    """Calculate yield factor based on weather conditions
+
+    water_stress (0-1, from water_balance) replaces the single rainfall
+    figure when a simulated season is available, and phenology_factor
+    (stage-weighted heat/cold stress since sowing, 1.0 for none) multiplies
+    the current-temperature factor.
+    """
+    crop_row = crop_row or CROP_REGISTRY.row(crop)
+    if crop_row is None:
         return 1.0
     
-    crop_data = CROP_YIELD_DATA[crop]
-    water_need = crop_data['water_need']
-    
-    # Rainfall factor
-    if water_need == 'High':
-        optimal_rainfall = 1200
-    elif water_need == 'Medium':
-        optimal_rainfall = 800
-    else:
-        optimal_rainfall = 400
+    # Rainfall factor (1200 / 800 / 400 mm for High / Medium / Low water need)
+    optimal_rainfall = crop_row.optimal_rainfall
     
     rainfall_ratio = rainfall / optimal_rainfall if optimal_rainfall > 0 else 1.0
     if rainfall_ratio > 1.5:
@@ -284,6 +376,9 @@ def calculate_weather_factor(crop, rainfall, temperature, humidity):
     else:
         rainfall_factor = min(1.2, 0.8 + rainfall_ratio * 0.3)
     
+    if water_stress is not None:
+        rainfall_factor = max(0.5, 1.1 - water_stress * 0.8)
+    
     # Temperature factor (optimal 20-30°C for most crops)
     if 20 <= temperature <= 30:
         temp_factor = 1.0
@@ -292,6 +387,9 @@ def calculate_weather_factor(crop, rainfall, temperature, humidity):
     else:
         temp_factor = max(0.6, 1 - (temperature - 30) * 0.03)
     
+    if phenology_factor is not None:
+        temp_factor *= phenology_factor
+    
     # Humidity factor
     if 60 <= humidity <= 80:
         humidity_factor = 1.0
@@ -301,18 +399,21 @@ def calculate_weather_factor(crop, rainfall, temperature, humidity):
     return rainfall_factor * 0.4 + temp_factor * 0.35 + humidity_factor * 0.25
 
 
-def predict_yield(crop, state, n, p, k, ph, rainfall, temperature, humidity, area=1, nasa_factor=1.0):
+def predict_yield(crop, state, n, p, k, ph, rainfall, temperature, humidity, area=1, nasa_factor=1.0,
+                  water_stress=None, phenology_factor=None):
     """Main yield prediction function with NASA satellite data support"""
     crop = crop.lower()
     
-    if crop not in CROP_YIELD_DATA:
+    crop_row = CROP_REGISTRY.row(crop)
+    if crop_row is None:
         return None, "Crop not found in database"
     
-    base_yield = CROP_YIELD_DATA[crop]['avg_yield']
+    base_yield = int(crop_row.avg_yield)
     
     # Apply factors
-    soil_factor = calculate_soil_factor(crop, n, p, k, ph)
-    weather_factor = calculate_weather_factor(crop, rainfall, temperature, humidity)
+    soil_factor = calculate_soil_factor(crop, n, p, k, ph, crop_row)
+    weather_factor = calculate_weather_factor(crop, rainfall, temperature, humidity, water_stress, phenology_factor,
+                                              crop_row)
     state_factor = STATE_FACTORS.get(state, 1.0)
     
     # Calculate predicted yield with NASA satellite factor
@@ -334,8 +435,8 @@ def predict_yield(crop, state, n, p, k, ph, rainfall, temperature, humidity, are
         category = 'Low'
     
     # Generate insights
-    insights = generate_insights(crop, soil_factor, weather_factor, state_factor, n, p, k, ph, rainfall)
-    recommendations = generate_recommendations(crop, n, p, k, ph, rainfall, category)
+    insights = generate_insights(crop, soil_factor, weather_factor, state_factor, n, p, k, ph, rainfall, crop_row)
+    recommendations = generate_recommendations(crop, n, p, k, ph, rainfall, category, crop_row)
     
     return {
         'crop': crop.title(),
@@ -355,7 +456,7 @@ def predict_yield(crop, state, n, p, k, ph, rainfall, temperature, humidity, are
     }, None
 
 
-def generate_insights(crop, soil_factor, weather_factor, state_factor, n, p, k, ph, rainfall):
+def generate_insights(crop, soil_factor, weather_factor, state_factor, n, p, k, ph, rainfall, crop_row=None):
     """Generate AI-like insights"""
     insights = []
     
@@ -374,22 +475,22 @@ def generate_insights(crop, soil_factor, weather_factor, state_factor, n, p, k,
     elif state_factor < 0.9:
         insights.append(f"📊 Average yields for {crop} in your state are typically lower. Focus on best practices.")
     
-    crop_data = CROP_YIELD_DATA.get(crop.lower(), {})
-    if crop_data:
-        if n < crop_data.get('optimal_n', 0) * 0.7:
-            insights.append(f"💡 Nitrogen levels are low. Recommended: {crop_data['optimal_n']} kg/ha")
-        if p < crop_data.get('optimal_p', 0) * 0.7:
-            insights.append(f"💡 Phosphorus levels are low. Recommended: {crop_data['optimal_p']} kg/ha")
-        if k < crop_data.get('optimal_k', 0) * 0.7:
-            insights.append(f"💡 Potassium levels are low. Recommended: {crop_data['optimal_k']} kg/ha")
+    crop_row = crop_row or CROP_REGISTRY.row(crop.lower())
+    if crop_row:
+        if n < crop_row.optimal_n * 0.7:
+            insights.append(f"💡 Nitrogen levels are low. Recommended: {crop_row.optimal_n:g} kg/ha")
+        if p < crop_row.optimal_p * 0.7:
+            insights.append(f"💡 Phosphorus levels are low. Recommended: {crop_row.optimal_p:g} kg/ha")
+        if k < crop_row.optimal_k * 0.7:
+            insights.append(f"💡 Potassium levels are low. Recommended: {crop_row.optimal_k:g} kg/ha")
     
     return insights
 
 
-def generate_recommendations(crop, n, p, k, ph, rainfall, category):
+def generate_recommendations(crop, n, p, k, ph, rainfall, category, crop_row=None):
     """Generate actionable recommendations"""
     recommendations = []
-    crop_data = CROP_YIELD_DATA.get(crop.lower(), {})
+    crop_row = crop_row or CROP_REGISTRY.row(crop.lower())
     
     if category == 'Low':
         recommendations.append("🔴 Consider soil amendment and improved irrigation")
@@ -399,14 +500,13 @@ def generate_recommendations(crop, n, p, k, ph, rainfall, category):
     else:
         recommendations.append("🟢 Maintain current practices for optimal results")
     
-    if crop_data:
-        if crop_data.get('water_need') == 'High' and rainfall < 800:
+    if crop_row:
+        if yield_vector.WATER_NEED_LEVELS[int(crop_row.water_need)] == 'High' and rainfall < 800:
             recommendations.append("💧 This crop needs high water. Ensure adequate irrigation.")
         
-        optimal_ph = crop_data.get('optimal_ph', (6.0, 7.0))
-        if ph < optimal_ph[0]:
+        if ph < crop_row.ph_min:
             recommendations.append("🧪 Soil is too acidic. Consider lime application.")
-        elif ph > optimal_ph[1]:
+        elif ph > crop_row.ph_max:
             recommendations.append("🧪 Soil is too alkaline. Consider sulfur or organic matter.")
     
     recommendations.append("📅 Schedule a call with our agricultural expert for personalized advice")
@@ -468,8 +568,22 @@ def predict():
     crop = data.get('crop')
     state = data.get('state')
     
+    # Field coordinates resolve the state, NASA point and weather point
+    location = None
+    if data.get('lat') is not None and data.get('lon') is not None:
+        try:
+            lat, lon = float(data['lat']), float(data['lon'])
+        except (TypeError, ValueError):
+            return jsonify({'success': False, 'error': 'lat and lon must be numbers'}), 400
+        if not (-90 <= lat <= 90 and -180 <= lon <= 180):
+            return jsonify({'success': False, 'error': 'lat/lon out of range'}), 400
+        location = spatial_index.locate(lat, lon)
+        if location is None:
+            return jsonify({'success': False, 'error': 'Coordinates are outside the supported region (India)'}), 400
+        state = state or location['state']
+    
     if not crop or not state:
-        return jsonify({'success': False, 'error': 'Crop and state are required'}), 400
+        return jsonify({'success': False, 'error': 'Crop and state (or lat/lon) are required'}), 400
     
     # Get parameters with defaults
     n = float(data.get('nitrogen', 80))
@@ -479,17 +593,55 @@ def predict():
     rainfall = float(data.get('rainfall', 800))
     area = float(data.get('area', 1))
     
-    # Try to get NASA POWER satellite data
-    nasa_data = None
+    # Season window for the soil water balance (sowing date to latest NASA day)
+    try:
+        sowing_date, season = _sowing_season(data)
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    
+    # Probabilistic mode samples the season's weather from its NASA climatology
+    probabilistic = bool(data.get('probabilistic', False))
+    if probabilistic:
+        try:
+            samples = int(data.get('samples', yield_uncertainty.MC_SAMPLES))
+            season_days = int(data.get('season_days', yield_uncertainty.MC_SEASON_DAYS))
+            seed = int(data['seed']) if data.get('seed') is not None else None
+        except (TypeError, ValueError):
+            return jsonify({'success': False, 'error': 'samples, season_days and seed must be integers'}), 400
+        if not (1 <= samples <= yield_uncertainty.MC_MAX_SAMPLES) or not (1 <= season_days <= 366):
+            return jsonify({'success': False, 'error': f'samples must be 1-{yield_uncertainty.MC_MAX_SAMPLES} '
+                                                       'and season_days 1-366'}), 400
+        season_start = (sowing_date or datetime.now()).strftime('%m%d')
+    
+    # Fetch NASA POWER satellite data and live weather concurrently under one deadline
+    if location:
+        upstream_calls = {'OpenWeatherMap': (openweather.get_live_weather, location['weather_point'])}
+        if data.get('use_nasa_data', True):
+            upstream_calls['NASA POWER'] = (get_nasa_power_data_at, location['nasa_point'], state)
+    else:
+        upstream_calls = {'OpenWeatherMap': (get_live_weather, state)}
+        if data.get('use_nasa_data', True):
+            upstream_calls['NASA POWER'] = (get_nasa_power_data, state, 14, data.get('nasa_mode'))
+    if season:
+        point = location['nasa_point'] if location else STATE_CITIES.get(state)
+        if point:
+            upstream_calls['Water balance'] = (get_water_balance, crop, point['lat'], point['lon'], *season)
+            upstream_calls['Phenology'] = (get_phenology, crop, point['lat'], point['lon'], season[0])
+    if probabilistic:
+        point = location['nasa_point'] if location else STATE_CITIES.get(state)
+        if point:
+            upstream_calls['Season climate'] = (yield_uncertainty.season_climate, point['lat'], point['lon'],
+                                                season_start, season_days)
+    upstream, skipped_sources = http_client.fan_out(upstream_calls, PREDICT_DEADLINE)
+    
+    nasa_data = upstream.get('NASA POWER')
+    crop_stage = upstream.get('Phenology')
     nasa_factor = 1.0
     nasa_insights = []
-    if data.get('use_nasa_data', True):
-        nasa_data = get_nasa_power_data(state)
-        if nasa_data:
-            nasa_factor, nasa_insights = calculate_nasa_yield_factor(nasa_data, crop)
+    if nasa_data:
+        nasa_factor, nasa_insights = calculate_nasa_yield_factor(nasa_data, crop, crop_stage)
     
-    # Try to get live weather data
-    live_weather = get_live_weather(state)
+    live_weather = upstream.get('OpenWeatherMap')
     weather_source = 'live' if live_weather else 'user_input'
     
     if live_weather and data.get('use_live_weather', True):
@@ -499,7 +651,13 @@ def predict():
         temperature = float(data.get('temperature', 25))
         humidity = float(data.get('humidity', 70))
     
-    result, error = predict_yield(crop, state, n, p, k, ph, rainfall, temperature, humidity, area, nasa_factor)
+    water = upstream.get('Water balance')
+    water_stress = water['water_stress_index'] if water else None
+    
+    phenology_factor = crop_stage['temperature_factor'] if crop_stage else None
+    
+    result, error = predict_yield(crop, state, n, p, k, ph, rainfall, temperature, humidity, area, nasa_factor,
+                                  water_stress, phenology_factor)
     
     if error:
         return jsonify({'success': False, 'error': error}), 400
@@ -511,6 +669,46 @@ def predict():
     # Add NASA factor to result
     if nasa_data:
         result['factors']['nasa_satellite_factor'] = nasa_factor
+    if water:
+        result['factors']['water_stress_index'] = water_stress
+    if crop_stage:
+        result['factors']['phenology_temperature_factor'] = phenology_factor
+    
+    # Push the sampled seasons through the vectorized model
+    distribution = None
+    climate = upstream.get('Season climate')
+    if probabilistic and climate:
+        sampled_rainfall, sampled_temperature, sampled_humidity = yield_uncertainty.sample_weather(
+            climate, samples, seed)
+        inputs = {'nitrogen': n, 'phosphorus': p, 'potassium': k, 'ph': ph, 'area': area,
+                  'rainfall': sampled_rainfall, 'temperature': sampled_temperature, 'humidity': sampled_humidity}
+        crop_index = CROP_REGISTRY.index[crop.lower()]
+        # The simulated water stress would otherwise override the sampled rainfall
+        sampled_stress = None
+        if water_stress is not None:
+            sampled_stress = yield_uncertainty.perturb_water_stress(
+                climate, sampled_rainfall, CROP_REGISTRY.optimal_rainfall[crop_index], water_stress)
+        sampled = _score_vector(crop_index, inputs, STATE_FACTORS.get(state, 1.0),
+                                nasa_factor, sampled_stress, phenology_factor)
+        distribution = yield_uncertainty.summarize(sampled['predicted_yield'], sampled['category_code'],
+                                                   yield_vector.CATEGORIES.tolist(), area)
+        distribution.update({
+            'samples': samples,
+            'method': climate.method,
+            'seasons': climate.years,
+            'season': {'start': season_start, 'days': season_days},
+            'climate_mean': {'rainfall': round(float(climate.mean[0]), 1),
+                             'temperature': round(float(climate.mean[1]), 1),
+                             'humidity': round(float(climate.mean[2]), 1)},
+        })
+    elif probabilistic:
+        # No quiet fallback: the seasonal fit needs MC_MIN_YEARS archived seasons
+        distribution = {
+            'method': 'unavailable',
+            'error': f'Climatology unavailable - fewer than {yield_uncertainty.MC_MIN_YEARS} complete past '
+                     'seasons are archived for this location yet',
+            'season': {'start': season_start, 'days': season_days},
+        }
     
     response_data = {
         'success': True,
@@ -523,9 +721,23 @@ def predict():
             'weather': {'rainfall': rainfall, 'temperature': temperature, 'humidity': humidity}
         },
         'weather_source': weather_source,
-        'data_sources': ['user_input']
+        'data_sources': ['user_input'],
+        'skipped_sources': skipped_sources
     }
     
+    if location:
+        response_data['location'] = location
+    
+    if water:
+        response_data['water_balance'] = water
+    
+    if crop_stage:
+        response_data['phenology'] = crop_stage
+    
+    if distribution:
+        response_data['distribution'] = distribution
+        response_data['data_sources'].append('NASA POWER climatology')
+    
     if live_weather:
         response_data['live_weather'] = live_weather
         response_data['data_sources'].append('OpenWeatherMap')
@@ -537,13 +749,635 @@ def predict():
             'temperature': nasa_data.get('T2M', {}).get('average'),
             'humidity': nasa_data.get('RH2M', {}).get('average'),
             'solar_radiation': nasa_data.get('ALLSKY_SFC_SW_DWN', {}).get('average'),
-            'precipitation': nasa_data.get('PRECTOTCORR', {}).get('average')
+            'precipitation': nasa_data.get('PRECTOTCORR', {}).get('average'),
+            'mode': nasa_data.get('mode')
         }
+        if nasa_data.get('region'):
+            response_data['nasa_data']['region'] = nasa_data['region']
         response_data['data_sources'].append('NASA POWER')
     
     return jsonify(response_data), 200
 
 
+def _batch_columns(data):
+    """(crops, states, numeric columns) from a batch body
+
+    Accepts either 'fields', a list of per-field objects like /predict takes,
+    or 'columns', a dict of equal-length lists (cheaper to parse for large
+    batches). Missing or null values fall back to BATCH_DEFAULTS.
+    """
+    if data.get('columns') is not None:
+        columns = data['columns']
+        if not isinstance(columns, dict):
+            raise ValueError('columns must be an object of lists')
+        for key, values in columns.items():
+            if values is not None and not isinstance(values, list):
+                raise ValueError(f'columns.{key} must be a list')
+        crops = list(columns.get('crop') or [])
+        count = len(crops)
+        states = list(columns.get('state') or [None] * count)
+        raw = {key: columns.get(key) for key in BATCH_DEFAULTS}
+    else:
+        fields = data.get('fields') or []
+        if not isinstance(fields, list) or not all(isinstance(field, dict) for field in fields):
+            raise ValueError('fields must be a list of objects')
+        count = len(fields)
+        crops = [field.get('crop') for field in fields]
+        states = [field.get('state') for field in fields]
+        raw = {key: [field.get(key) for field in fields] for key in BATCH_DEFAULTS}
+
+    if len(states) != count:
+        raise ValueError('state must have one value per field')
+    numeric = {}
+    for key, default in BATCH_DEFAULTS.items():
+        if raw[key] is None:
+            numeric[key] = np.full(count, float(default))
+            continue
+        if len(raw[key]) != count:
+            raise ValueError(f'{key} must have one value per field')
+        values = np.array(raw[key], dtype=float)
+        numeric[key] = np.where(np.isnan(values), float(default), values)
+    return crops, states, numeric
+
+
+def _score_vector(crop_index, inputs, state_factor, nasa_factor, water_stress=None, phenology_factor=None):
+    """yield_vector.predict for registry crop indices over array (or broadcastable) inputs
+
+    inputs holds the BATCH_DEFAULTS keys; crop_index may be a scalar or an array.
+    """
+    if water_stress is not None:
+        water_stress = np.asarray(water_stress, dtype=float)
+    if phenology_factor is not None:
+        phenology_factor = np.asarray(phenology_factor, dtype=float)
+    registry = CROP_REGISTRY
+    soil = yield_vector.soil_factor(inputs['nitrogen'], inputs['phosphorus'], inputs['potassium'], inputs['ph'],
+                                    registry.optimal_n[crop_index], registry.optimal_p[crop_index],
+                                    registry.optimal_k[crop_index], registry.ph_min[crop_index],
+                                    registry.ph_max[crop_index])
+    weather = yield_vector.weather_factor(inputs['rainfall'], inputs['temperature'], inputs['humidity'],
+                                          registry.optimal_rainfall[crop_index], water_stress, phenology_factor)
+    return yield_vector.predict(registry.avg_yield[crop_index], soil, weather, state_factor, nasa_factor,
+                                inputs['area'])
+
+
+def _sowing_season(data):
+    """(sowing_date, season window) from a request body's optional sowing_date
+
+    The soil water balance only runs for a given sowing date; without one
+    the field's rainfall input is scored, in every endpoint alike. The season
+    is also None with NASA data off or a crop not sown yet. Raises ValueError
+    for a malformed date or a season longer than WATER_BALANCE_MAX_DAYS.
+    """
+    if not data.get('sowing_date'):
+        return None, None
+    try:
+        sowing_date = datetime.strptime(data['sowing_date'], '%Y-%m-%d')
+    except (TypeError, ValueError):
+        raise ValueError('sowing_date must be YYYY-MM-DD')
+    season = water_balance.season_window(sowing_date) if data.get('use_nasa_data', True) else None
+    return sowing_date, season
+
+
+def _state_conditions(states, use_live_weather, use_nasa_data, season=None):
+    """Live weather and NASA factor for each distinct state, fetched concurrently
+
+    With a season window, each state capital's archived water balance series
+    is fetched in the same fan-out; the last value returned maps state to
+    that payload.
+    """
+    upstream_calls = {}
+    for state in states:
+        if state not in STATE_CITIES:
+            continue
+        if use_live_weather:
+            upstream_calls[f'OpenWeatherMap:{state}'] = (get_live_weather, state)
+        if use_nasa_data:
+            upstream_calls[f'NASA POWER:{state}'] = (get_nasa_power_data, state)
+        if use_nasa_data and season:
+            upstream_calls[f'Water balance:{state}'] = (nasa_archive.nasa_archive.get_window,
+                                                        STATE_CITIES[state]['lat'], STATE_CITIES[state]['lon'],
+                                                        *season, water_balance.WATER_BALANCE_PARAMETERS)
+    upstream, skipped_sources = http_client.fan_out(upstream_calls, PREDICT_DEADLINE)
+
+    temperature = np.full(len(states), np.nan)
+    humidity = np.full(len(states), np.nan)
+    nasa_factor = np.ones(len(states))
+    for i, state in enumerate(states):
+        weather = upstream.get(f'OpenWeatherMap:{state}')
+        if weather:
+            temperature[i] = weather['temperature']
+            humidity[i] = weather['humidity']
+        nasa_data = upstream.get(f'NASA POWER:{state}')
+        if nasa_data:
+            nasa_factor[i] = calculate_nasa_yield_factor(nasa_data, None)[0]
+    sources = sorted({name.split(':')[0] for name in upstream})
+    water_payloads = {state: upstream[f'Water balance:{state}'] for state in states
+                      if f'Water balance:{state}' in upstream}
+    return temperature, humidity, nasa_factor, sources, skipped_sources, water_payloads
+
+
+def _batch_water_stress(crop_index, state_names, state_index, water_payloads):
+    """Water stress index per field, NaN where no series is available
+
+    Each distinct (state, crop) pair is simulated once, all pairs in one
+    vectorized water_balance run; rounded like /predict's water_balance.
+    """
+    stress = np.full(len(crop_index), np.nan)
+    covered = np.array([state in water_payloads for state in state_names.tolist()])[state_index] & (crop_index >= 0)
+    if not covered.any():
+        return stress
+    pairs, pair_index = np.unique(np.stack([state_index[covered], crop_index[covered]], axis=1),
+                                  axis=0, return_inverse=True)
+    payloads = [water_payloads[state_names[s]] for s, _ in pairs.tolist()]
+    capacities = CROP_REGISTRY.root_zone_mm[pairs[:, 1]]
+    result = water_balance.simulate_payloads(payloads, capacities)
+    stress[covered] = np.round(result['water_stress_index'], 3)[pair_index.ravel()]
+    return stress
+
+
+@yield_bp.route('/predict/batch', methods=['POST'])
+def predict_batch():
+    """Predict yield for many fields in one call
+
+    Every factor is evaluated over column arrays (yield_vector); live weather
+    and NASA data are looked up once per distinct state. An optional
+    sowing_date applies to every field and adds the soil water balance, as
+    in /predict. Results keep the input order. With "format": "columns" the
+    response holds one list per output instead of one object per field,
+    which is much cheaper to encode.
+    """
+    data = request.get_json()
+    if not data:
+        return jsonify({'success': False, 'error': 'Request data required'}), 400
+
+    try:
+        crops, states, columns = _batch_columns(data)
+    except (TypeError, ValueError, AttributeError) as e:
+        return jsonify({'success': False, 'error': f'Invalid batch: {e}'}), 400
+    if not crops:
+        return jsonify({'success': False, 'error': 'fields (or columns) must be a non-empty list'}), 400
+    if len(crops) > BATCH_MAX_FIELDS:
+        return jsonify({'success': False, 'error': f'At most {BATCH_MAX_FIELDS} fields per batch'}), 400
+
+    crop_index = CROP_REGISTRY.lookup([crop or '' for crop in crops])
+    known = crop_index >= 0
+    state_names, state_index = np.unique(np.array([state or '' for state in states], dtype=str),
+                                         return_inverse=True)
+    valid = known & (state_names[state_index] != '')
+
+    try:
+        _, season = _sowing_season(data)
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    live_temperature, live_humidity, state_nasa, sources, skipped_sources, water_payloads = _state_conditions(
+        state_names.tolist(), data.get('use_live_weather', True), data.get('use_nasa_data', True), season
+    )
+    live_temperature, live_humidity = live_temperature[state_index], live_humidity[state_index]
+    temperature = np.where(np.isnan(live_temperature), columns['temperature'], live_temperature)
+    humidity = np.where(np.isnan(live_humidity), columns['humidity'], live_humidity)
+    nasa_factor = state_nasa[state_index]
+    state_factor = np.array([STATE_FACTORS.get(state, 1.0) for state in state_names.tolist()])[state_index]
+
+    water_stress = _batch_water_stress(crop_index, state_names, state_index, water_payloads)
+
+    result = _score_vector(crop_index, dict(columns, temperature=temperature, humidity=humidity),
+                           state_factor, nasa_factor, water_stress)
+    del result['category_code']
+    result['nasa_satellite_factor'] = np.round(nasa_factor, 3)
+    result['water_stress_index'] = water_stress
+
+    errors = np.where(known, 'Crop and state are required', 'Crop not found in database')
+    response_data = {
+        'success': True,
+        'count': len(crops),
+        'failed': int((~valid).sum()),
+        'unit': 'kg/hectare',
+        'data_sources': ['user_input'] + sources,
+        'skipped_sources': skipped_sources
+    }
+
+    if data.get('format') == 'columns':
+        outputs = {key: values.tolist() for key, values in result.items()}
+        for key, values in outputs.items():
+            for i in np.flatnonzero(~valid):
+                values[i] = None
+        outputs['error'] = np.where(valid, None, errors).tolist()
+        response_data['columns'] = outputs
+        return jsonify(response_data), 200
+
+    predicted, total, confidence, category = (result[key].tolist() for key in
+                                              ('predicted_yield', 'total_yield', 'confidence', 'category'))
+    soil_f, weather_f, state_f, nasa_f, stress_f = (
+        result[key].tolist() for key in
+        ('soil_factor', 'weather_factor', 'state_factor', 'nasa_satellite_factor', 'water_stress_index')
+    )
+    valid_list = valid.tolist()
+    error_list = errors.tolist()
+    response_data['results'] = [
+        {
+            'success': True,
+            'predicted_yield': predicted[i],
+            'total_yield': total[i],
+            'confidence': confidence[i],
+            'category': category[i],
+            'factors': {'soil_factor': soil_f[i], 'weather_factor': weather_f[i],
+                        'state_factor': state_f[i], 'nasa_satellite_factor': nasa_f[i],
+                        'water_stress_index': None if np.isnan(stress_f[i]) else stress_f[i]}
+        } if valid_list[i] else {'success': False, 'error': error_list[i]}
+        for i in range(len(crops))
+    ]
+    return jsonify(response_data), 200
+
+
+def _field_conditions(state, data, inputs, crop_index, location=None, season=None):
+    """Apply live weather for one field to inputs
+
+    Returns (nasa_factor, water_stress, sources, skipped_sources). With a
+    spatial_index location the field's own nearest weather and NASA points
+    are used, as in /predict; otherwise the state capital's. With a season
+    (see _sowing_season) water_stress holds the simulated index for each
+    registry crop in crop_index (NaN where no series came back), else None.
+    """
+    if location is None:
+        live_temperature, live_humidity, nasa_factor, sources, skipped_sources, water_payloads = _state_conditions(
+            [state], data.get('use_live_weather', True), data.get('use_nasa_data', True), season
+        )
+        if not np.isnan(live_temperature[0]):
+            inputs['temperature'], inputs['humidity'] = float(live_temperature[0]), float(live_humidity[0])
+        nasa_factor = float(nasa_factor[0])
+    else:
+        upstream_calls = {}
+        if data.get('use_live_weather', True):
+            upstream_calls['OpenWeatherMap'] = (openweather.get_live_weather, location['weather_point'])
+        if data.get('use_nasa_data', True):
+            upstream_calls['NASA POWER'] = (get_nasa_power_data_at, location['nasa_point'], state)
+        if season:
+            upstream_calls['Water balance'] = (nasa_archive.nasa_archive.get_window, location['nasa_point']['lat'],
+                                               location['nasa_point']['lon'], *season,
+                                               water_balance.WATER_BALANCE_PARAMETERS)
+        upstream, skipped_sources = http_client.fan_out(upstream_calls, PREDICT_DEADLINE)
+        weather = upstream.get('OpenWeatherMap')
+        if weather:
+            inputs['temperature'], inputs['humidity'] = weather['temperature'], weather['humidity']
+        nasa_data = upstream.get('NASA POWER')
+        nasa_factor = float(calculate_nasa_yield_factor(nasa_data, None)[0]) if nasa_data else 1.0
+        sources = sorted(upstream)
+        water_payloads = {state: upstream['Water balance']} if 'Water balance' in upstream else {}
+
+    water_stress = None
+    if season:
+        crops = np.atleast_1d(crop_index)
+        water_stress = _batch_water_stress(crops, np.array([state]), np.zeros(len(crops), dtype=np.int64),
+                                           water_payloads)
+        if np.ndim(crop_index) == 0:
+            water_stress = water_stress[0]
+    return nasa_factor, water_stress, sources, skipped_sources
+
+
+def _stress_or_none(water_stress):
+    """A scalar water stress index for JSON: None when not simulated"""
+    if water_stress is None or np.isnan(water_stress):
+        return None
+    return float(water_stress)
+
+
+def _sweep_axis_length(spec):
+    """Validated length of one sweep axis, checked before any axis is built"""
+    if isinstance(spec, dict):
+        steps = spec.get('steps', SWEEP_DEFAULT_STEPS)
+        if isinstance(steps, bool) or not isinstance(steps, int) or steps < 1:
+            raise ValueError('steps must be a positive integer')
+        float(spec['min']), float(spec['max'])
+        return steps
+    if not isinstance(spec, list) or not spec:
+        raise ValueError('expected {"min", "max", "steps"} or a non-empty list of numbers')
+    return len(spec)
+
+
+def _sweep_axis(spec):
+    """Values along one sweep axis: {"min", "max", "steps"} or an explicit list"""
+    if isinstance(spec, dict):
+        return np.linspace(float(spec['min']), float(spec['max']), spec.get('steps', SWEEP_DEFAULT_STEPS))
+    values = np.array(spec, dtype=float)
+    if values.ndim != 1:
+        raise ValueError('expected {"min", "max", "steps"} or a non-empty list of numbers')
+    return values
+
+
+@yield_bp.route('/sweep', methods=['POST'])
+def sweep():
+    """Predicted yield over a grid of inputs for one crop and state
+
+    "ranges" maps any of nitrogen, phosphorus, potassium, ph, rainfall,
+    temperature and humidity to an axis; the other inputs take their value
+    from the body (or the /predict default). NASA and live weather are
+    fetched once, and live temperature/humidity apply only when not swept.
+    A sowing_date adds the soil water balance as in /predict; the simulated
+    season then stands in for rainfall, which can no longer be swept.
+    The grid is evaluated by broadcasting the axes, and yields come back as
+    a nested array in axis order, ready for a heatmap.
+    """
+    data = request.get_json()
+    if not data:
+        return jsonify({'success': False, 'error': 'Request data required'}), 400
+
+    crop = (data.get('crop') or '').lower()
+    state = data.get('state')
+    if not crop or not state:
+        return jsonify({'success': False, 'error': 'Crop and state are required'}), 400
+    crop_index = CROP_REGISTRY.index.get(crop)
+    if crop_index is None:
+        return jsonify({'success': False, 'error': 'Crop not found in database'}), 400
+
+    ranges = data.get('ranges')
+    if not isinstance(ranges, dict) or not ranges:
+        return jsonify({'success': False, 'error': 'ranges must map at least one input to an axis'}), 400
+    swept = [key for key in BATCH_DEFAULTS if key in ranges and key != 'area']
+    unknown = sorted(set(ranges) - set(swept))
+    if unknown:
+        return jsonify({'success': False, 'error': f'Cannot sweep: {", ".join(unknown)}'}), 400
+    try:
+        shape = tuple(_sweep_axis_length(ranges[key]) for key in swept)
+        if math.prod(shape) > SWEEP_MAX_POINTS:
+            return jsonify({'success': False, 'error': f'At most {SWEEP_MAX_POINTS} grid points per sweep'}), 400
+        axes = {key: _sweep_axis(ranges[key]) for key in swept}
+        inputs = {key: float(data.get(key, default)) for key, default in BATCH_DEFAULTS.items()}
+    except (TypeError, ValueError, KeyError) as e:
+        return jsonify({'success': False, 'error': f'Invalid sweep: {e}'}), 400
+    try:
+        _, season = _sowing_season(data)
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    if season and 'rainfall' in axes:
+        return jsonify({'success': False, 'error': 'rainfall cannot be swept with a sowing_date - '
+                                                   'the simulated season replaces it'}), 400
+
+    nasa_factor, water_stress, sources, skipped_sources = _field_conditions(state, data, inputs, crop_index,
+                                                                            season=season)
+
+    # Axis j varies along dimension j only; broadcasting builds the grid
+    for j, (key, values) in enumerate(axes.items()):
+        inputs[key] = values.reshape([-1 if i == j else 1 for i in range(len(axes))])
+    state_factor = STATE_FACTORS.get(state, 1.0)
+    result = _score_vector(crop_index, inputs, state_factor, nasa_factor, water_stress)
+    predicted = np.broadcast_to(result['predicted_yield'], shape)
+    category_code = np.broadcast_to(result['category_code'], shape)
+
+    best = np.unravel_index(int(np.argmax(predicted)), shape)
+    return jsonify({
+        'success': True,
+        'crop': crop.title(),
+        'state': state,
+        'unit': 'kg/hectare',
+        'axes': {key: values.tolist() for key, values in axes.items()},
+        'shape': list(shape),
+        'fixed_inputs': {key: value for key, value in inputs.items() if key not in axes},
+        'predicted_yield': predicted.tolist(),
+        'category_code': category_code.tolist(),
+        'categories': yield_vector.CATEGORIES.tolist(),
+        'best': dict({key: float(axes[key][i]) for key, i in zip(axes, best)},
+                     predicted_yield=float(predicted[best])),
+        'range': [float(predicted.min()), float(predicted.max())],
+        'factors': {'state_factor': state_factor, 'nasa_satellite_factor': round(nasa_factor, 3),
+                    'water_stress_index': _stress_or_none(water_stress)},
+        'data_sources': ['user_input'] + sources,
+        'skipped_sources': skipped_sources
+    }), 200
+
+
+@yield_bp.route('/fertilizer/optimize', methods=['POST'])
+def optimize_fertilizer():
+    """Best N/P/K dose for one field by predicted yield or profit
+
+    Every dose combination on a grid from zero to the caps (step kg/ha) is
+    scored at once: the doses add to the soil test values, the soil factor
+    is broadcast over the three dose axes and the weather factor (with the
+    season's water stress when a sowing_date is given) is computed once. "objective" is "yield" (cheapest dose reaching the highest yield)
+    or "profit" (needs crop_price in ₹/kg). An optional budget (₹/ha) and
+    per-nutrient caps (kg/ha) bound the search. The response includes the
+    marginal-return curve along each nutrient with the other two at their
+    optimum.
+    """
+    data = request.get_json()
+    if not data:
+        return jsonify({'success': False, 'error': 'Request data required'}), 400
+
+    crop = (data.get('crop') or '').lower()
+    state = data.get('state')
+    if not crop or not state:
+        return jsonify({'success': False, 'error': 'Crop and state are required'}), 400
+    crop_row = CROP_REGISTRY.row(crop)
+    if crop_row is None:
+        return jsonify({'success': False, 'error': 'Crop not found in database'}), 400
+
+    objective = data.get('objective', 'yield')
+    if objective not in ('yield', 'profit'):
+        return jsonify({'success': False, 'error': 'objective must be "yield" or "profit"'}), 400
+    try:
+        inputs = {key: float(data.get(key, default)) for key, default in BATCH_DEFAULTS.items()}
+        prices = {key: float((data.get('prices') or {}).get(key, price)) for key, price in FERTILIZER_PRICES.items()}
+        crop_price = float(data['crop_price']) if data.get('crop_price') is not None else None
+        budget = float(data['budget']) if data.get('budget') is not None else None
+        step = float(data.get('step', FERTILIZER_DOSE_STEP))
+        optimal = {'nitrogen': crop_row.optimal_n, 'phosphorus': crop_row.optimal_p, 'potassium': crop_row.optimal_k}
+        caps = {key: float((data.get('caps') or {}).get(key, optimal[key] * FERTILIZER_CAP_MULTIPLE))
+                for key in FERTILIZER_PRICES}
+    except (TypeError, ValueError, AttributeError) as e:
+        return jsonify({'success': False, 'error': f'Invalid input: {e}'}), 400
+    if objective == 'profit' and crop_price is None:
+        return jsonify({'success': False, 'error': 'crop_price (₹/kg) is required for the profit objective'}), 400
+    if (not math.isfinite(step) or step <= 0 or not all(0 <= cap < math.inf for cap in caps.values())
+            or (budget is not None and budget < 0)):
+        return jsonify({'success': False, 'error': 'step must be positive; caps and budget non-negative'}), 400
+    try:
+        _, season = _sowing_season(data)
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+
+    # Candidate counts per nutrient (0, step, ... up to the cap) are checked before any grid is built
+    shape = tuple(math.floor(cap / step + 1e-9) + 1 for cap in caps.values())
+    if math.prod(shape) > FERTILIZER_MAX_CANDIDATES:
+        return jsonify({'success': False, 'error': f'Too many candidates; use a step above {step} kg/ha'}), 400
+    doses = {key: np.arange(count) * step for key, count in zip(caps, shape)}
+
+    nasa_factor, water_stress, sources, skipped_sources = _field_conditions(
+        state, data, inputs, CROP_REGISTRY.index[crop], season=season)
+    state_factor = STATE_FACTORS.get(state, 1.0)
+
+    # Dose axes: nitrogen along dimension 0, phosphorus 1, potassium 2
+    dn = doses['nitrogen'][:, None, None]
+    dp = doses['phosphorus'][None, :, None]
+    dk = doses['potassium'][None, None, :]
+    soil = yield_vector.soil_factor(inputs['nitrogen'] + dn, inputs['phosphorus'] + dp, inputs['potassium'] + dk,
+                                    inputs['ph'], crop_row.optimal_n, crop_row.optimal_p, crop_row.optimal_k,
+                                    crop_row.ph_min, crop_row.ph_max)
+    weather = yield_vector.weather_factor(inputs['rainfall'], inputs['temperature'], inputs['humidity'],
+                                          crop_row.optimal_rainfall, water_stress)
+    predicted = crop_row.avg_yield * soil * float(weather) * state_factor * nasa_factor
+    cost = dn * prices['nitrogen'] + dp * prices['phosphorus'] + dk * prices['potassium']
+    cost = np.broadcast_to(cost, shape)
+    profit = predicted * crop_price - cost if crop_price is not None else None
+
+    feasible = cost <= budget + 1e-9 if budget is not None else np.ones(shape, dtype=bool)
+    if objective == 'profit':
+        score = np.where(feasible, profit, -np.inf)
+    else:
+        # Highest yield first, then the cheapest dose reaching it (within 0.01 kg/ha)
+        score = np.where(feasible, np.round(predicted, 2) - cost * 1e-9, -np.inf)
+    best = np.unravel_index(int(np.argmax(score)), shape)
+
+    def outcome(index):
+        result = {
+            'dose': {key: float(doses[key][i]) for key, i in zip(doses, index)},
+            'predicted_yield': round(float(predicted[index]), 2),
+            'total_yield': round(float(predicted[index]) * inputs['area'], 2),
+            'fertilizer_cost_per_ha': round(float(cost[index]), 2),
+        }
+        if profit is not None:
+            result['profit_per_ha'] = round(float(profit[index]), 2)
+        return result
+
+    # Yield (and profit) along each nutrient axis with the other two at the optimum
+    curves = {}
+    for axis, key in enumerate(doses):
+        line = list(best)
+        line[axis] = slice(None)
+        line = tuple(line)
+        curve_yield = predicted[line]
+        curves[key] = {
+            'dose': doses[key].tolist(),
+            'predicted_yield': np.round(curve_yield, 2).tolist(),
+            'marginal_yield_per_kg': np.round(np.gradient(curve_yield, step), 3).tolist() if len(curve_yield) > 1 else [0.0],
+        }
+        if profit is not None:
+            curve_profit = profit[line]
+            curves[key]['profit_per_ha'] = np.round(curve_profit, 2).tolist()
+            curves[key]['marginal_profit_per_kg'] = (np.round(np.gradient(curve_profit, step), 3).tolist()
+                                                     if len(curve_profit) > 1 else [0.0])
+
+    optimum = outcome(best)
+    baseline = outcome((0, 0, 0))
+    optimum['yield_gain'] = round(optimum['predicted_yield'] - baseline['predicted_yield'], 2)
+    return jsonify({
+        'success': True,
+        'crop': crop.title(),
+        'state': state,
+        'objective': objective,
+        'unit': 'kg/hectare',
+        'optimum': optimum,
+        'baseline': baseline,
+        'marginal_returns': curves,
+        'search': {
+            'candidates': int(np.prod(shape)),
+            'feasible': int(feasible.sum()),
+            'step': step,
+            'caps': caps,
+            'prices': prices,
+            'budget': budget,
+        },
+        'factors': {'state_factor': state_factor, 'nasa_satellite_factor': round(nasa_factor, 3),
+                    'water_stress_index': _stress_or_none(water_stress)},
+        'data_sources': ['user_input'] + sources,
+        'skipped_sources': skipped_sources
+    }), 200
+
+
+@yield_bp.route('/compare', methods=['POST'])
+def compare_crops():
+    """Score every crop (or a given list) for one field in a single vectorized pass
+
+    Takes the /predict inputs without a crop. Weather and NASA data are
+    fetched once and shared by all crops; with a sowing_date each crop's
+    root zone is run through the same season's water balance. Rows are ranked by "sort":
+    yield_ratio (predicted over the crop's average yield, the default, since
+    raw kg/ha is not comparable across crops) or predicted_yield.
+    """
+    data = request.get_json()
+    if not data:
+        return jsonify({'success': False, 'error': 'Request data required'}), 400
+
+    state = data.get('state')
+    location = None
+    if data.get('lat') is not None and data.get('lon') is not None:
+        try:
+            lat, lon = float(data['lat']), float(data['lon'])
+        except (TypeError, ValueError):
+            return jsonify({'success': False, 'error': 'lat and lon must be numbers'}), 400
+        if not (-90 <= lat <= 90 and -180 <= lon <= 180):
+            return jsonify({'success': False, 'error': 'lat/lon out of range'}), 400
+        location = spatial_index.locate(lat, lon)
+        if location is None:
+            return jsonify({'success': False, 'error': 'Coordinates are outside the supported region (India)'}), 400
+        state = state or location['state']
+    if not state:
+        return jsonify({'success': False, 'error': 'state (or lat/lon) is required'}), 400
+
+    sort = data.get('sort', 'yield_ratio')
+    if sort not in ('yield_ratio', 'predicted_yield'):
+        return jsonify({'success': False, 'error': 'sort must be "yield_ratio" or "predicted_yield"'}), 400
+    crops = data.get('crops')
+    if crops is not None:
+        if not isinstance(crops, list) or not crops or not all(isinstance(crop, str) and crop for crop in crops):
+            return jsonify({'success': False, 'error': 'crops must be a non-empty list of crop names'}), 400
+        crop_index = CROP_REGISTRY.lookup(crops)
+        if (crop_index < 0).any():
+            return jsonify({'success': False, 'error': 'Crop not found in database'}), 400
+        crop_index = np.unique(crop_index)
+    else:
+        crop_index = np.arange(len(CROP_REGISTRY))
+    try:
+        inputs = {key: float(data.get(key, default)) for key, default in BATCH_DEFAULTS.items()}
+        _, season = _sowing_season(data)
+    except (TypeError, ValueError) as e:
+        return jsonify({'success': False, 'error': f'Invalid input: {e}'}), 400
+
+    nasa_factor, water_stress, sources, skipped_sources = _field_conditions(state, data, inputs, crop_index,
+                                                                            location, season)
+    state_factor = STATE_FACTORS.get(state, 1.0)
+    result = _score_vector(crop_index, inputs, state_factor, nasa_factor, water_stress)
+    base_yield = CROP_REGISTRY.avg_yield[crop_index]
+    ratio = np.round(result['predicted_yield'] / base_yield, 3)
+
+    order = np.argsort(-(ratio if sort == 'yield_ratio' else result['predicted_yield']), kind='stable')
+    columns = {key: result[key][order].tolist() for key in
+               ('predicted_yield', 'total_yield', 'confidence', 'category', 'soil_factor', 'weather_factor')}
+    names = [CROP_REGISTRY.names[i].title() for i in crop_index[order].tolist()]
+    base_list, ratio_list = base_yield[order].astype(int).tolist(), ratio[order].tolist()
+    stress_list = (water_stress[order].tolist() if water_stress is not None else [np.nan] * len(names))
+    ranking = [
+        {
+            'rank': rank + 1,
+            'crop': names[rank],
+            'predicted_yield': columns['predicted_yield'][rank],
+            'total_yield': columns['total_yield'][rank],
+            'base_yield': base_list[rank],
+            'yield_ratio': ratio_list[rank],
+            'category': columns['category'][rank],
+            'confidence': columns['confidence'][rank],
+            'factors': {'soil_factor': columns['soil_factor'][rank],
+                        'weather_factor': columns['weather_factor'][rank],
+                        'water_stress_index': _stress_or_none(stress_list[rank])}
+        }
+        for rank in range(len(names))
+    ]
+
+    response_data = {
+        'success': True,
+        'state': state,
+        'area': inputs['area'],
+        'unit': 'kg/hectare',
+        'sort': sort,
+        'ranking': ranking,
+        'inputs': inputs,
+        'factors': {'state_factor': state_factor, 'nasa_satellite_factor': round(nasa_factor, 3)},
+        'data_sources': ['user_input'] + sources,
+        'skipped_sources': skipped_sources
+    }
+    if location:
+        response_data['location'] = location
+    return jsonify(response_data), 200
+
+
 @yield_bp.route('/nasa-data/<state>', methods=['GET'])
 def get_nasa_soil_data(state):
     """Get NASA POWER satellite data for a state - soil moisture, temperature, etc."""
@@ -590,6 +1424,19 @@ def get_nasa_soil_data(state):
     return jsonify({'success': False, 'error': 'NASA POWER data not available for this state'}), 404
 
 
+@yield_bp.route('/locate', methods=['GET'])
+def locate_field():
+    """Resolve field coordinates to a state, NASA point and weather point"""
+    lat = request.args.get('lat', type=float)
+    lon = request.args.get('lon', type=float)
+    if lat is None or lon is None:
+        return jsonify({'success': False, 'error': 'lat and lon query parameters are required'}), 400
+    location = spatial_index.locate(lat, lon)
+    if location is None:
+        return jsonify({'success': False, 'error': 'Coordinates are outside the supported region (India)'}), 400
+    return jsonify({'success': True, 'location': location})
+
+
 @yield_bp.route('/weather/<state>', methods=['GET'])
 def get_state_weather(state):
     """Get live weather for a state"""
@@ -0,0 +1,140 @@
+"""
+Yield Uncertainty
+Season weather climatology from the local NASA archive and Monte Carlo
+sampling of rainfall, temperature and humidity for probabilistic yield.
+
+For each past year the same calendar season (sowing date or today, for
+season_days) gives one sample of seasonal rainfall total, mean temperature
+and mean humidity. A multivariate normal fitted to those yearly samples
+keeps their correlation (dry seasons run hot), and is cached per location
+and season so a request only draws samples and runs the vectorized model.
+
+The years of history are synced into the archive on first use, outside the
+request budget (nasa_archive.sync_within_budget); a request waits for that
+sync only while its budget lasts. Until enough complete seasons are
+archived no climate is returned and /predict reports the distribution as
+unavailable.
+"""
+import os
+from collections import namedtuple
+from datetime import datetime, timedelta
+
+import numpy as np
+
+import nasa_archive
+import nasa_stats
+import yield_vector
+from nasa_power import recent_window
+from upstream_cache import TTLCache
+
+MC_SAMPLES = int(os.getenv('MC_SAMPLES', 10000))
+MC_MAX_SAMPLES = 100000
+
+# Season length (days) when the request gives none
+MC_SEASON_DAYS = int(os.getenv('MC_SEASON_DAYS', 120))
+
+# Years of archived history searched for past seasons, and the fewest
+# complete seasons needed before the seasonal fit is used
+MC_CLIMATOLOGY_YEARS = int(os.getenv('MC_CLIMATOLOGY_YEARS', 10))
+MC_MIN_YEARS = 5
+
+# A past season needs this share of valid days to count
+MC_MIN_COVERAGE = 0.8
+
+MC_PARAMETERS = ['PRECTOTCORR', 'T2M', 'RH2M']
+
+# Fitted climates are refit at most this often per location and season
+MC_CLIMATE_TTL = float(os.getenv('MC_CLIMATE_TTL', 86400))
+
+season_climates = TTLCache('season_climate', MC_CLIMATE_TTL)
+
+# method: 'seasonal' (fit to past seasons)
+SeasonClimate = namedtuple('SeasonClimate', 'method years mean cov as_of')
+
+
+def fit_climate(days, matrix, start_mmdd, season_days):
+    """SeasonClimate from archived daily rows (days: YYYYMMDD strings, matrix: days x MC_PARAMETERS)
+
+    Returns None when fewer than MC_MIN_YEARS complete seasons are covered.
+    """
+    dates = np.array([f'{d[:4]}-{d[4:6]}-{d[6:]}' for d in days], dtype='datetime64[D]')
+    month, day = int(start_mmdd[:2]), int(start_mmdd[2:])
+    if (month, day) == (2, 29):
+        day = 28
+
+    seasons = []
+    for year in range(int(days[0][:4]), int(days[-1][:4]) + 1):
+        start = np.datetime64(f'{year}-{month:02d}-{day:02d}')
+        end = start + np.timedelta64(season_days, 'D')
+        if start < dates[0] or end - 1 > dates[-1]:
+            continue
+        rows = matrix[(dates >= start) & (dates < end)]
+        valid = ~np.isnan(rows)
+        if valid.sum(axis=0).min() < MC_MIN_COVERAGE * season_days:
+            continue
+        means = np.nanmean(rows, axis=0)
+        seasons.append((means[0] * season_days, means[1], means[2]))
+
+    if len(seasons) < MC_MIN_YEARS:
+        return None
+    samples = np.array(seasons)
+    return SeasonClimate('seasonal', len(seasons), samples.mean(axis=0), np.cov(samples, rowvar=False), days[-1])
+
+
+def season_climate(lat, lon, start_mmdd, season_days=MC_SEASON_DAYS):
+    """Cached SeasonClimate for a location and season (start MMDD), or None
+
+    None means the archive does not hold MC_MIN_YEARS complete seasons yet.
+    """
+    key = (round(lat, 4), round(lon, 4), start_mmdd, season_days)
+
+    def load():
+        end = recent_window()[1]
+        begin = (datetime.strptime(end, '%Y%m%d') -
+                 timedelta(days=365 * MC_CLIMATOLOGY_YEARS + season_days + 366)).strftime('%Y%m%d')
+        nasa_archive.sync_within_budget(lat, lon, begin, end)
+        raw_data = nasa_archive.nasa_archive.load(lat, lon, begin, end, MC_PARAMETERS)
+        if not raw_data:
+            return None
+        days, _, matrix = nasa_stats.to_matrix(raw_data, MC_PARAMETERS)
+        return fit_climate(days, matrix, start_mmdd, season_days)
+
+    return season_climates.get_or_load(key, load)
+
+
+def sample_weather(climate, samples=MC_SAMPLES, seed=None):
+    """(rainfall, temperature, humidity) arrays drawn from a SeasonClimate"""
+    rng = np.random.default_rng(seed)
+    draws = rng.multivariate_normal(climate.mean, climate.cov, size=samples, method='eigh')
+    return np.maximum(draws[:, 0], 0.0), draws[:, 1], np.clip(draws[:, 2], 0.0, 100.0)
+
+
+def perturb_water_stress(climate, rainfall, optimal_rainfall, water_stress):
+    """Per-sample water stress for sampled seasons
+
+    The simulated water stress describes the season as observed so far and
+    would otherwise replace the sampled rainfall. Each sample scales it by
+    how much its rainfall factor departs from the climatological mean's, so
+    a dry draw is drier than the observed season and a wet draw wetter. (The
+    phenology factor multiplies the temperature factor, so sampled
+    temperatures reach it without help.)
+    """
+    scale = (yield_vector.rainfall_factor(rainfall, optimal_rainfall) /
+             yield_vector.rainfall_factor(climate.mean[0], optimal_rainfall))
+    factor = np.clip(yield_vector.water_stress_factor(water_stress) * scale, 0.5, 1.1)
+    return np.clip((1.1 - factor) / 0.8, 0.0, 1.0)
+
+
+def summarize(predicted, category_code, categories, area=1):
+    """Percentiles and category probabilities of sampled yields"""
+    p10, p50, p90 = np.percentile(predicted, (10, 50, 90))
+    shares = np.bincount(category_code, minlength=len(categories)) / len(predicted)
+    return {
+        'p10': round(float(p10), 2),
+        'p50': round(float(p50), 2),
+        'p90': round(float(p90), 2),
+        'mean': round(float(predicted.mean()), 2),
+        'total_p50': round(float(p50) * area, 2),
+        'category_probability': {name: round(float(share), 4) for name, share in zip(categories, shares)},
+        'probability_low': round(float(shares[0]), 4),
+    }
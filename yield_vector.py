@@ -0,0 +1,142 @@
+"""
+Vectorized Yield Model
+Column-array versions of the factor functions in yield_prediction, used to
+score many fields per call. Each function mirrors its scalar counterpart
+(calculate_soil_factor, calculate_weather_factor, predict_yield) exactly,
+and CropRegistry is the array form of the crop table both paths read.
+np.round and round() can disagree on the last (0.01) digit of a half-way
+value; nothing else differs.
+"""
+from collections import namedtuple
+
+import numpy as np
+
+# Water need levels (registry code = position) and their optimal seasonal rainfall (mm)
+WATER_NEED_LEVELS = ('Low', 'Medium', 'High')
+WATER_NEED_RAINFALL = np.array([400.0, 800.0, 1200.0])
+
+# Yield categories by code (predict's category_code)
+CATEGORIES = np.array(['Low', 'Medium', 'High'])
+
+CropRow = namedtuple('CropRow', 'avg_yield optimal_n optimal_p optimal_k ph_min ph_max water_need '
+                                'optimal_rainfall root_zone_mm base_temp gdd_maturity')
+
+
+class CropRegistry:
+    """CROP_YIELD_DATA compiled into one contiguous float array per parameter
+
+    Crop i's parameters sit at position i of every column (registry.avg_yield,
+    registry.optimal_n, ...); water_need holds a WATER_NEED_LEVELS code. One
+    extra all-NaN row at the end is what unknown crops (index -1) gather, so
+    batch callers can gather first and mask afterwards.
+    """
+
+    def __init__(self, crop_data):
+        self.names = list(crop_data)
+        self.index = {name: i for i, name in enumerate(self.names)}
+        rows = []
+        for data in crop_data.values():
+            code = WATER_NEED_LEVELS.index(data['water_need']) if data['water_need'] in WATER_NEED_LEVELS else 0
+            rows.append((data['avg_yield'], data['optimal_n'], data['optimal_p'], data['optimal_k'],
+                         *data['optimal_ph'], code, WATER_NEED_RAINFALL[code],
+                         data['root_zone_mm'], data['base_temp'], data['gdd_maturity']))
+        rows.append((np.nan,) * len(CropRow._fields))
+        # Column-major so each parameter column is contiguous
+        self.table = np.asfortranarray(np.array(rows, dtype=float))
+        for j, column in enumerate(CropRow._fields):
+            setattr(self, column, self.table[:, j])
+
+    def __len__(self):
+        return len(self.names)
+
+    def row(self, crop):
+        """CropRow of Python floats for one crop name, or None"""
+        i = self.index.get(crop)
+        if i is None:
+            return None
+        return CropRow(*self.table[i].tolist())
+
+    def lookup(self, crops):
+        """Registry index per crop name (case-insensitive), -1 when unknown
+
+        Each distinct name is resolved once, so the cost is one np.unique
+        plus a dict lookup per distinct crop.
+        """
+        names, inverse = np.unique(np.asarray(crops, dtype=str), return_inverse=True)
+        codes = np.array([self.index.get(name.lower(), -1) for name in names.tolist()], dtype=np.int64)
+        return codes[inverse]
+
+
+def _nutrient_ratio(amount, optimal):
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return np.where(optimal > 0, np.minimum(amount / optimal, 1.2), 1.0)
+
+
+def soil_factor(n, p, k, ph, optimal_n, optimal_p, optimal_k, ph_min, ph_max):
+    """calculate_soil_factor over arrays"""
+    npk = (_nutrient_ratio(n, optimal_n) * 0.4 +
+           _nutrient_ratio(p, optimal_p) * 0.3 +
+           _nutrient_ratio(k, optimal_k) * 0.3)
+    ph_factor = np.where(
+        ph < ph_min, np.maximum(0.7, 1 - (ph_min - ph) * 0.1),
+        np.where(ph > ph_max, np.maximum(0.7, 1 - (ph - ph_max) * 0.1), 1.0)
+    )
+    return npk * ph_factor
+
+
+def rainfall_factor(rainfall, optimal_rainfall):
+    with np.errstate(invalid='ignore', divide='ignore'):
+        ratio = np.where(optimal_rainfall > 0, rainfall / optimal_rainfall, 1.0)
+    return np.where(
+        ratio > 1.5, np.maximum(0.6, 1.5 - (ratio - 1.5) * 0.5),
+        np.where(ratio < 0.5, np.maximum(0.5, ratio * 1.5), np.minimum(1.2, 0.8 + ratio * 0.3))
+    )
+
+
+def water_stress_factor(water_stress):
+    """Rainfall factor implied by a water stress index"""
+    return np.maximum(0.5, 1.1 - water_stress * 0.8)
+
+
+def temperature_factor(temperature):
+    return np.where(
+        temperature < 20, np.maximum(0.6, 1 - (20 - temperature) * 0.03),
+        np.where(temperature > 30, np.maximum(0.6, 1 - (temperature - 30) * 0.03), 1.0)
+    )
+
+
+def humidity_factor(humidity):
+    return np.where(
+        (humidity >= 60) & (humidity <= 80), 1.0,
+        np.maximum(0.8, 1 - np.abs(humidity - 70) * 0.005)
+    )
+
+
+def weather_factor(rainfall, temperature, humidity, optimal_rainfall, water_stress=None, phenology_factor=None):
+    """calculate_weather_factor over arrays (water_stress and phenology_factor may contain NaN for 'not available')"""
+    rain = rainfall_factor(rainfall, optimal_rainfall)
+    if water_stress is not None:
+        rain = np.where(np.isnan(water_stress), rain, water_stress_factor(water_stress))
+    temp = temperature_factor(temperature)
+    if phenology_factor is not None:
+        temp = np.where(np.isnan(phenology_factor), temp, temp * phenology_factor)
+    return rain * 0.4 + temp * 0.35 + humidity_factor(humidity) * 0.25
+
+
+def predict(base_yield, soil, weather, state_factor, nasa_factor, area):
+    """predict_yield's yield, confidence and category over arrays"""
+    predicted = base_yield * soil * weather * state_factor * nasa_factor
+    confidence = np.minimum(95, 70 + soil * 10 + weather * 10 + np.where(nasa_factor != 1.0, 5, 0))
+    with np.errstate(invalid='ignore', divide='ignore'):
+        ratio = predicted / base_yield
+    category_code = (ratio >= 0.9).astype(np.int8) + (ratio >= 1.1).astype(np.int8)
+    return {
+        'predicted_yield': np.round(predicted, 2),
+        'total_yield': np.round(predicted * area, 2),
+        'confidence': np.round(confidence, 1),
+        'category': CATEGORIES[category_code],
+        'category_code': category_code,
+        'soil_factor': np.round(soil, 2),
+        'weather_factor': np.round(weather, 2),
+        'state_factor': np.round(state_factor, 2),
+    }